@@ -1,6 +1,7 @@
 #!/bin/sh
 
-# script to assign random values to feeds.next_fetch_attempt
+# script to assign random values to feed_state.next_fetch_attempt
+# (creating feed_state rows for feeds without one)
 # run by clone-database.sh
 # can also be run when your database hasn't been active
 
@@ -19,4 +20,4 @@ if ! dokku postgres:exists $DB >/dev/null 2>&1; then
     exit 2
 fi
 echo "randomizing $DB feeds"
-echo "update feeds set next_fetch_attempt = timezone('utc', now()) + (random() * '6 hours'::interval);" | dokku postgres:connect $DB
+echo "insert into feed_state (feed_id, next_fetch_attempt) select id, timezone('utc', now()) + (random() * '6 hours'::interval) from feeds on conflict (feed_id) do update set next_fetch_attempt = excluded.next_fetch_attempt;" | dokku postgres:connect $DB
@@ -0,0 +1,64 @@
+"""
+Build hour-of-week activity profiles (FeedState.activity) from story
+counts (see scripts/feed_activity.py, and schedule.stretch_minutes
+for how they're used).
+
+Pure functions on NumPy arrays: no database access.
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+from fetcher.schedule import ACTIVITY_HOURS, ACTIVITY_SCALE
+
+Counts = npt.NDArray[np.float64]  # (rows, ACTIVITY_HOURS)
+Profiles = npt.NDArray[np.uint8]  # (rows, ACTIVITY_HOURS)
+
+# stories spread evenly over the week added to each row,
+# so sparse counts don't make extreme profiles
+PRIOR_STORIES = 2 * ACTIVITY_HOURS
+
+# lowest profile byte: intervals at most ACTIVITY_SCALE/ACTIVITY_MIN
+# times longer in the quietest hours (before clamping)
+ACTIVITY_MIN = ACTIVITY_SCALE // 8
+
+# bisection steps solving for the scale that keeps the mean of
+# clipped profile bytes at ACTIVITY_SCALE
+SCALE_STEPS = 30
+
+
+def smooth(counts: Counts) -> Counts:
+    """
+    spread counts to neighboring hours (wrapping around the week),
+    since publishing times wander
+    """
+    return (np.roll(counts, 1, axis=1) + 2 * counts +
+            np.roll(counts, -1, axis=1)) / 4
+
+
+def profiles(counts: Counts) -> Profiles:
+    """
+    Return activity profile bytes for each row of story counts:
+    each hour's share of the week's (smoothed) stories, relative to
+    an even share, times a per-row scale chosen so that after clipping
+    to [ACTIVITY_MIN, 255], each row still averages ACTIVITY_SCALE
+    (so a profile reshapes a feed's fetches, without changing how many).
+    """
+    c = smooth(counts) + PRIOR_STORIES / ACTIVITY_HOURS
+    ratio = c * ACTIVITY_HOURS / c.sum(axis=1, keepdims=True)
+
+    # mean of clipped bytes grows with scale: from ACTIVITY_MIN
+    # (at zero) to 255 (when smallest ratio reaches 255), so bisect
+    low: Counts = np.zeros((len(ratio), 1))
+    high: Counts = 255 / ratio.min(axis=1, keepdims=True)
+    for _ in range(SCALE_STEPS):
+        mid = (low + high) / 2
+        mean = np.clip(ratio * mid, ACTIVITY_MIN, 255).mean(axis=1,
+                                                            keepdims=True)
+        under = mean < ACTIVITY_SCALE
+        low = np.where(under, mid, low)
+        high = np.where(under, high, mid)
+
+    scaled = np.rint(ratio * (low + high) / 2)
+    result: Profiles = np.clip(scaled, ACTIVITY_MIN, 255).astype(np.uint8)
+    return result
@@ -0,0 +1,139 @@
+"""
+Global fetch budget allocation: choose poll_minutes for all feeds at
+once, so that the expected fetch rate (the sum of 60/poll_minutes)
+fits a fetches/hour budget (see scripts/allocate_polls.py).
+
+A feed publishing r stories/hour, polled every T minutes, has r*T/60
+new stories per fetch, each fetched T/2 minutes (on average) after
+it appeared.  Minimizing total delay (the sum of r*T) with the total
+fetch rate fixed gives T proportional to 1/sqrt(r): busier feeds are
+fetched more often, and also return more new stories per fetch.
+
+Each feed's T is clamped between low and high bounds (see bounds),
+and the constant of proportionality is found by bisection (so feeds
+at a bound give their share to the others: "water filling").
+
+Pure functions on NumPy arrays: no database access.
+"""
+
+from typing import NamedTuple, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from fetcher.schedule import ARRIVAL_SIGMAS, Policy
+
+Array = npt.NDArray[np.float64]
+
+# bisection steps on log of proportionality constant
+# (interval shrinks by half each step)
+BISECT_STEPS = 100
+
+
+class Report(NamedTuple):
+    """
+    expected totals for a set of poll intervals
+    """
+    feeds: int
+    load: float                 # fetches/hour
+    stories: float              # new stories/hour
+    per_fetch: float            # new stories/fetch
+    delay: float                # mean minutes from story to fetch
+
+
+def bounds(policy: Policy,
+           rate: Array,
+           var: Array,
+           entries: Array,
+           update_minutes: Array,
+           maximum: int) -> Tuple[Array, Array]:
+    """
+    Return (low, high) poll_minutes arrays.  low is
+    AUTO_ADJUST_MIN_POLL_MINUTES (or update_minutes if larger), high
+    is `maximum`, or less if (as in schedule.predict_minutes) more
+    than (100 - AUTO_ADJUST_MIN_DUPLICATE_PERCENT)% of the feed's
+    window (`entries`, zero if unknown, limited by
+    MAX_STORIES_PER_FEED) could be new at the upper end of the
+    arrival rate estimate (never below low).
+    """
+    p = policy
+    low = np.maximum(update_minutes, p.AUTO_ADJUST_MIN_POLL_MINUTES)
+    low = low.astype(np.float64)
+
+    window = entries.astype(np.float64)
+    if p.MAX_STORIES_PER_FEED:
+        window = np.where((window <= 0) | (window > p.MAX_STORIES_PER_FEED),
+                          p.MAX_STORIES_PER_FEED, window)
+    top = rate + ARRIVAL_SIGMAS * np.sqrt(np.maximum(var, 0.0))
+    new_max = window * (100 - p.AUTO_ADJUST_MIN_DUPLICATE_PERCENT) / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fill = np.where((top > 0) & (window > 0), new_max / top * 60, np.inf)
+
+    high = np.maximum(np.minimum(fill, maximum), low)
+    return (low, high)
+
+
+def _minutes(c: float, root: Array, low: Array, high: Array) -> Array:
+    with np.errstate(divide='ignore'):
+        return np.clip(c / root, low, high)
+
+
+def load(minutes: Array) -> float:
+    """
+    return expected fetches per hour
+    """
+    return float(np.sum(60 / minutes))
+
+
+def allocate(rate: Array, low: Array, high: Array, budget: float) -> Array:
+    """
+    Return poll intervals (whole minutes, as float64) proportional to
+    1/sqrt(rate), between low and high, with (if possible) load no
+    more than `budget` fetches/hour.  Feeds with zero rate get high.
+    If the budget can't be met, all feeds get high (rounded down).
+    """
+    root = np.sqrt(np.maximum(rate, 0.0))
+
+    if load(low) <= budget:
+        return low
+    if load(high) >= budget:
+        return np.floor(high)
+
+    # range of constant that moves each (non-zero rate) feed
+    # between its bounds:
+    busy = root > 0
+    if not busy.any():
+        return np.floor(high)
+    lo = float(np.min(low[busy] * root[busy]))
+    hi = float(np.max(high[busy] * root[busy]))
+    for _ in range(BISECT_STEPS):
+        mid = np.sqrt(lo * hi)  # geometric mean
+        if load(_minutes(mid, root, low, high)) > budget:
+            lo = mid
+        else:
+            hi = mid
+        if hi - lo <= lo * 1e-9:
+            break
+
+    # round up (keeping load within budget), but not past high
+    # (low is whole minutes):
+    minutes = np.ceil(_minutes(hi, root, low, high))
+    return np.clip(minutes, low, np.floor(high))
+
+
+def report(rate: Array, minutes: Array) -> Report:
+    """
+    Return expected load and yield for `minutes`
+    (assumes no stories are lost to window overflow).
+    """
+    fetches = load(minutes)
+    stories = float(np.sum(rate))
+    if fetches > 0:
+        per_fetch = stories / fetches
+    else:
+        per_fetch = 0.0
+    if stories > 0:
+        delay = float(np.sum(rate * minutes)) / 2 / stories
+    else:
+        delay = 0.0
+    return Report(len(minutes), fetches, stories, per_fetch, delay)
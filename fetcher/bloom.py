@@ -0,0 +1,101 @@
+"""
+Bloom filter in shared memory, for story URL dedup.
+
+Most feed entries are for stories already in the database, and each
+one used to cost an indexed lookup.  scripts/fetcher.py builds a
+filter of all stories.normalized_url values BEFORE creating the
+Manager (so the anonymous shared mmap is inherited by all the forked
+Worker processes), and Workers add the URLs of stories they save.
+
+A filter miss proves a URL has never been saved (by this process
+tree), so the lookup can be skipped and the story inserted directly;
+tasks.py still uses INSERT ... ON CONFLICT, so stories saved by some
+other process are caught (and counted).  A hit falls through to the
+database to confirm.
+
+Readers take no locks: a bit set while another process is checking
+the filter can only turn a miss into a (confirmed) hit.
+"""
+
+import hashlib
+import logging
+import math
+import mmap
+import multiprocessing
+from typing import Iterable, List
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Bloom filter of strings in an anonymous shared memory mapping.
+    """
+
+    def __init__(self, nbytes: int, expected: int):
+        """
+        `nbytes` is the size of the bit array,
+        `expected` the number of entries to size the number of hashes for
+        """
+        self.nbits = nbytes * 8
+        self.nbytes = nbytes
+        # optimal number of hash functions:
+        k = round(self.nbits / max(expected, 1) * math.log(2))
+        self.nhashes = min(max(k, 1), 16)
+        self.bits = mmap.mmap(-1, nbytes)  # shared with forked processes
+        self.lock = multiprocessing.Lock()  # for writers
+        self._entries = multiprocessing.Value('Q', 0, lock=False)
+
+    def _positions(self, key: str) -> List[int]:
+        """
+        return bit numbers for key (using double hashing)
+        """
+        digest = hashlib.blake2b(key.encode('utf-8', 'replace'),
+                                 digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.nbits for i in range(self.nhashes)]
+
+    def _set(self, key: str) -> None:
+        bits = self.bits
+        for pos in self._positions(key):
+            byte = pos >> 3
+            bits[byte] |= 1 << (pos & 7)
+
+    def add(self, key: str) -> None:
+        with self.lock:
+            self._set(key)
+            self._entries.value += 1
+
+    def add_many(self, keys: Iterable[str]) -> int:
+        """
+        add keys, return number added
+        """
+        n = 0
+        with self.lock:
+            for key in keys:
+                self._set(key)
+                n += 1
+            self._entries.value += n
+        return n
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def entries(self) -> int:
+        """
+        number of keys added (including duplicates)
+        """
+        return int(self._entries.value)
+
+    def false_positive_rate(self) -> float:
+        """
+        return estimated false positive rate
+        """
+        fill = 1.0 - math.exp(-self.nhashes * self.entries / self.nbits)
+        return float(fill ** self.nhashes)
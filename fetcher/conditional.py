@@ -0,0 +1,92 @@
+"""
+Per-feed trust for conditional fetches (If-None-Match with the saved
+ETag, else If-Modified-Since with the saved Last-Modified value).
+
+Some servers return "304 Not Modified" when the feed HAS changed
+(ie; https://www.bizpacreview.com/feed), so conditional fetches are
+only made for feeds whose validators have been checked: each
+unconditional fetch of a document that parses compares the response
+validators with the saved ones:
+
+* "same": validators and entries unchanged (a 304 would have been right)
+* "changed": validators changed (a 304 would not have been sent)
+* "stale": validators unchanged, but entries changed (a 304 would
+  have lost stories)
+
+FeedState.http_trust counts consistent checks in a row (up to
+HTTP_CONDITIONAL_TRUST, when conditional fetches start), and is set
+to -STALE_PENALTY by a stale check.  HTTP_CONDITIONAL_CHECK_PERCENT of
+fetches of trusted feeds are made unconditional to keep checking.
+
+Pure functions: no database access.
+"""
+
+import random
+from typing import Optional
+
+from fetcher.config import conf
+
+# read at startup, for logging
+CHECK_PERCENT = conf.HTTP_CONDITIONAL_CHECK_PERCENT
+TRUST = conf.HTTP_CONDITIONAL_TRUST
+
+# extra consistent checks needed to trust a feed again
+# after it's been caught with stale validators
+STALE_PENALTY = 10
+
+SAME = 'same'
+CHANGED = 'changed'
+STALE = 'stale'
+
+
+def trusted(trust: Optional[int], level: int = TRUST) -> bool:
+    return level > 0 and (trust or 0) >= level
+
+
+def use_conditional(trust: Optional[int],
+                    level: int = TRUST,
+                    check_percent: int = CHECK_PERCENT) -> bool:
+    """
+    return True to make a conditional fetch: feed trusted,
+    and not picked for an (unconditional) check
+    """
+    return (trusted(trust, level) and
+            random.random() * 100 >= check_percent)  # low-fi random ok
+
+
+def check_validators(old_etag: Optional[str],
+                     old_lastmod: Optional[str],
+                     etag: Optional[str],
+                     lastmod: Optional[str],
+                     same_entries: bool) -> Optional[str]:
+    """
+    Check validators from an unconditional fetch against the saved
+    ones (only the one that would have been sent: ETag if saved).
+    Returns SAME, CHANGED, STALE or None if no validators to check.
+    """
+    if old_etag:
+        if not etag:
+            return None
+        unchanged = etag == old_etag
+    elif old_lastmod and lastmod:
+        unchanged = lastmod == old_lastmod
+    else:
+        return None
+
+    if not unchanged:
+        return CHANGED
+    if same_entries:
+        return SAME
+    return STALE
+
+
+def new_trust(trust: Optional[int], outcome: Optional[str],
+              level: int = TRUST) -> Optional[int]:
+    """
+    return FeedState.http_trust after a check
+    """
+    if outcome is None:
+        return trust
+    if outcome == STALE:
+        return -STALE_PENALTY
+    return min((trust or 0) + 1, level)
@@ -214,6 +214,35 @@ class _Config:                  # only instantiated in this file
     # config variable properties in alphabetical order
     # (maybe split up into section by script??)
 
+    # days of stories used by scripts.feed_activity
+    # to build feed activity profiles
+    ACTIVITY_DAYS = conf_int('ACTIVITY_DAYS', 28)
+
+    # minimum number of stories (in ACTIVITY_DAYS) for a feed to get
+    # its own activity profile (else its source's profile is used,
+    # if the source has enough stories)
+    ACTIVITY_MIN_STORIES = conf_int('ACTIVITY_MIN_STORIES', 100)
+
+    # if set, successful fetches stretch (or shrink) the interval to
+    # the next fetch by the feed's hour-of-week activity profile
+    # (built by scripts.feed_activity, which does nothing unless this
+    # is set), so fetches are more frequent at busy hours.  The
+    # average interval is still poll_minutes.  Not applied by
+    # RSS_FETCH_SQL_UPDATE.
+    ACTIVITY_SCHEDULE = conf_bool('ACTIVITY_SCHEDULE', False)
+
+    # weight (percent) given to the newest observation in each feed's
+    # moving average of new stories per hour (see fetcher/schedule.py)
+    ARRIVAL_EWMA_PERCENT = conf_int('ARRIVAL_EWMA_PERCENT', 30)
+
+    # if non-zero, successful fetches set poll_minutes from the feed's
+    # story arrival rate estimate, so that ARRIVAL_TARGET_STORIES new
+    # stories are expected per fetch (polling sooner if needed to see
+    # AUTO_ADJUST_MIN_DUPLICATE_PERCENT of the feed's entries again),
+    # rather than stepping by AUTO_ADJUST_MINUTES.  Not applied by
+    # RSS_FETCH_SQL_UPDATE.
+    ARRIVAL_TARGET_STORIES = conf_int('ARRIVAL_TARGET_STORIES', 0)
+
     # maximum absoulte deviation in minutes since last
     # successful poll under which to look at duplicate percentage
     # (needs to be larger than queue_feeds.py queuing interval)
@@ -261,23 +290,60 @@ class _Config:                  # only instantiated in this file
     # keep this above the number of workers (initially 2x)
     DB_POOL_SIZE = conf_int('DB_POOL_SIZE', 32)
 
+    # size of shared memory filter of saved story URLs built by
+    # fetcher at startup (to skip lookups for new stories).
+    # Zero disables.
+    DEDUP_FILTER_MBYTES = conf_int('DEDUP_FILTER_MBYTES', 0)
+
     # default requeue interval (if Feed.update_minutes not set)
     DEFAULT_INTERVAL_MINS = conf_int('DEFAULT_INTERVAL_MINS',
                                      _DEFAULT_DEFAULT_INTERVAL_MINS)
 
+    # maximum number of hostname lookups to cache in each Worker process
+    DNS_CACHE_ENTRIES = conf_int('DNS_CACHE_ENTRIES', 10000)
+
+    # seconds to cache successful hostname lookups in Worker processes
+    # (system resolver does not supply record TTLs).  Zero disables cache.
+    DNS_CACHE_SECS = conf_int('DNS_CACHE_SECS', 5 * 60)
+
+    # seconds to cache "Name or service not known" lookup failures
+    DNS_NEGATIVE_CACHE_SECS = conf_int('DNS_NEGATIVE_CACHE_SECS', 60)
+
     # poll interval for short, fast feeds (used by scripts.poll_update)
     FAST_POLL_MINUTES = conf_int('FAST_POLL_MINUTES', 120)
 
-    # number of fetch_event rows to keep for each feed
+    # total feed fetches per hour that scripts.allocate_polls fits
+    # poll_minutes of all active feeds into (allocated intervals are
+    # saved as FeedState.budget_minutes, a floor for poll_minutes).
+    # Zero disables.  Python (not RSS_FETCH_SQL_UPDATE) path only.
+    FETCH_BUDGET_PER_HOUR = conf_int('FETCH_BUDGET_PER_HOUR', 0)
+
+    # number of days of daily fetch event counts (fetch_event_days
+    # rows) to keep
+    FETCH_EVENT_DAYS = conf_int('FETCH_EVENT_DAYS', 90)
+
+    # number of fetch_event rows (ring slots) to keep for each feed
     FETCH_EVENT_ROWS = conf_int('FETCH_EVENT_ROWS', 30)
 
-    # Use saved ETag or Last-Modified for conditional feed fetch.
+    # percent of fetches of trusted feeds (see HTTP_CONDITIONAL_TRUST)
+    # made unconditional, to check the server's validators
+    HTTP_CONDITIONAL_CHECK_PERCENT = conf_int(
+        'HTTP_CONDITIONAL_CHECK_PERCENT', 10)
+
+    # Use saved ETag or Last-Modified for conditional fetch of ALL feeds.
     # Some feeds return same ETag and/or Last-Modified even
     # when feed has changed, so this is disabled by default!
-    # ETag may be useless, but could consider using Last-Modified
-    # if the value isn't too long ago????
+    # (see HTTP_CONDITIONAL_TRUST for per-feed use)
     HTTP_CONDITIONAL_FETCH = conf_bool('HTTP_CONDITIONAL_FETCH', False)
 
+    # number of unconditional fetches in a row showing a feed's
+    # ETag/Last-Modified changes whenever its entries change, before
+    # conditional fetches are made for the feed (when
+    # HTTP_CONDITIONAL_FETCH not set).  Feeds caught with unchanged
+    # validators and changed entries are demoted.  Zero disables.
+    # Python (not RSS_FETCH_SQL_UPDATE) path only.
+    HTTP_CONDITIONAL_TRUST = conf_int('HTTP_CONDITIONAL_TRUST', 3)
+
     # Number of failures before disabling feed. A surprising number of
     # feeds come back from what looks like death (including 404, host
     # not found, HTML).  Was originally 4, raised to 10, and then 30.
@@ -285,6 +351,11 @@ class _Config:                  # only instantiated in this file
     # last_fetch_failures by fractional values.
     MAX_FAILURES = conf_int('MAX_FAILURES', 30)
 
+    # maximum (decompressed) size in bytes of a feed document: larger
+    # documents are rejected as "document too large" (without reading
+    # the rest).  sitemaps.org limits sitemap files to 50MB.
+    MAX_DOCUMENT_BYTES = conf_int('MAX_DOCUMENT_BYTES', 50 * 1024 * 1024)
+
     # max number of URLs to accept from a feed document of any type.
     # Set to zero for no limit.  Google says that News Sitemaps should
     # have no more than 1000 entries.
@@ -317,6 +388,24 @@ class _Config:                  # only instantiated in this file
     # days back to check for duplicate story URLs/titles
     NORMALIZED_TITLE_DAYS = conf_int('NORMALIZED_TITLE_DAYS', 7)
 
+    # seconds after a Worker fetches from a host (fqdn) during which
+    # fetches from the same host are preferentially handed to that
+    # Worker (to reuse a kept-alive connection).  Zero disables.
+    RSS_FETCH_AFFINITY_SECS = conf_int('RSS_FETCH_AFFINITY_SECS', 30)
+
+    # maximum milliseconds to hold a feed waiting for the Worker that
+    # recently fetched from the same host to become idle, before
+    # handing it to any idle Worker.  Zero means never wait.
+    RSS_FETCH_AFFINITY_WAIT_MS = conf_int('RSS_FETCH_AFFINITY_WAIT_MS', 1000)
+
+    # if non-zero, fetch Workers return feed completions (Feed updates
+    # and fetch events) to the fetcher main process, which writes them
+    # in one transaction every RSS_FETCH_COMPLETION_MS ms (writer
+    # processes write all the completions in a batch together).
+    # Feeds remain marked queued until written; a crash loses at most
+    # one interval of completions (feeds are refetched).
+    RSS_FETCH_COMPLETION_MS = conf_int('RSS_FETCH_COMPLETION_MS', 0)
+
     # number of parallel fetches for feeds that have the same scoreboard entry.
     # with current (c)lock-step rate control, concurrency will only happen
     # when a fetch takes longer than RSS_FETCH_FEED_SECS.  This is likely
@@ -333,6 +422,19 @@ class _Config:                  # only instantiated in this file
     # (or change parameter to RSS_FETCH_FEED_PER_MINUTE?)
     RSS_FETCH_FEED_SECS = conf_int('RSS_FETCH_FEED_SECS', 5)  # 5s = 12/min
 
+    # if non-zero, when the 90th percentile delay in starting fetches
+    # (after next_fetch_attempt) stays above this many seconds (or
+    # database commits are slow, or the ready backlog keeps growing),
+    # scripts/fetcher.py stretches all rescheduling intervals by a
+    # growing multiplier, relaxed when load drops (see
+    # fetcher/overload.py).  Not applied by RSS_FETCH_SQL_UPDATE.
+    RSS_FETCH_OVERLOAD_DELAY_SECS = conf_int(
+        'RSS_FETCH_OVERLOAD_DELAY_SECS', 0)
+
+    # maximum overload interval multiplier (percent)
+    RSS_FETCH_OVERLOAD_MAX_PERCENT = conf_int('RSS_FETCH_OVERLOAD_MAX_PERCENT',
+                                              400)
+
     # ready items for fetch to keep "on hand": if too small could
     # return ONLY unissuable feeds.  more than can be fetched in
     # DB_READY_SEC wastes effort, *AND* the current algorithm is O(n^2)
@@ -342,12 +444,34 @@ class _Config:                  # only instantiated in this file
     # over 2K)!!
     RSS_FETCH_READY_LIMIT = conf_int('RSS_FETCH_READY_LIMIT', 2000)
 
+    # complete feed fetches (update feed/feed_state, save fetch event)
+    # with one call to the feed_complete SQL function (see
+    # fetcher/schedule.py) rather than several statements with the
+    # feed row locked.  Keeps feed_state columns and the arrival
+    # estimate up to date, but policies marked "Python path only"
+    # aren't applied.
+    RSS_FETCH_SQL_UPDATE = conf_bool('RSS_FETCH_SQL_UPDATE', False)
+
     # timeout in sec. for fetching an RSS file
     RSS_FETCH_TIMEOUT_SECS = conf_int('RSS_FETCH_TIMEOUT_SECS', 30)
 
+    # when more feeds are ready than RSS_FETCH_READY_LIMIT (backlogged),
+    # fetch feeds with the most expected new stories waiting (story
+    # arrival rate times time since last success) first, rather than
+    # in next_fetch_attempt order.
+    RSS_FETCH_VALUE_ORDER = conf_bool('RSS_FETCH_VALUE_ORDER', False)
+
     # number of worker processes
     RSS_FETCH_WORKERS = conf_int('RSS_FETCH_WORKERS', 2)  # raise in production
 
+    # number of writer processes (save stories and update feeds for
+    # fetch worker processes).  Zero means fetch workers do their
+    # own writes.
+    RSS_FETCH_WRITERS = conf_int('RSS_FETCH_WRITERS', 0)
+
+    # max number of feeds passed to a writer process at once
+    RSS_FETCH_WRITER_BATCH = conf_int('RSS_FETCH_WRITER_BATCH', 20)
+
     # user/password for Basic Authentication for rss-fetcher API service
     RSS_FETCHER_USER = conf_optional('RSS_FETCHER_USER', hidden=True)
     RSS_FETCHER_PASS = conf_optional('RSS_FETCHER_PASS', hidden=True)
@@ -372,9 +496,27 @@ class _Config:                  # only instantiated in this file
     # ms per story (no conf_float function):
     SAVE_STORY_MS = conf_int('SAVE_STORY_MS', 12)
 
+    # when non-zero, place each rescheduled fetch in the least loaded
+    # five minute slot within this percent of the feed's interval
+    # (also spreads first fetches of new feeds), to flatten peaks in
+    # fetch load.  Python (not RSS_FETCH_SQL_UPDATE) path, with
+    # RSS_FETCH_COMPLETION_MS set, only: each process writing
+    # completions (the fetcher, or each of RSS_FETCH_WRITERS) keeps
+    # its own histogram, reloaded every five minutes, and breaks ties
+    # at random, so more writers level less precisely.
+    SCHEDULE_LEVEL_PERCENT = conf_int('SCHEDULE_LEVEL_PERCENT', 0)
+
     SENTRY_DSN = conf_optional('SENTRY_DSN')
     SENTRY_ENV = conf_optional('SENTRY_ENV')
 
+    # after a successful fetch, don't refetch before this percent of
+    # the freshness lifetime the server gives (HTTP Cache-Control
+    # max-age or Expires, less Age, or RSS <ttl>, whichever is
+    # longer, up to MAXIMUM_INTERVAL_MINS), and skip RSS
+    # <skipHours>/<skipDays>.  100 makes it a floor, lower values a
+    # hint; zero disables.  Python (not RSS_FETCH_SQL_UPDATE) path only.
+    SERVER_FRESHNESS_PERCENT = conf_int('SERVER_FRESHNESS_PERCENT', 100)
+
     # skip all pages that look like "home pages"
     SKIP_HOME_PAGES = conf_bool('SKIP_HOME_PAGES', False)
 
@@ -383,12 +525,21 @@ class _Config:                  # only instantiated in this file
     # Display generated SQL
     SQLALCHEMY_ECHO = conf_bool('SQLALCHEMY_ECHO', False)
 
+    # number of days of (daily) stories table partitions to keep
+    # created ahead (by fetcher startup and db_archive)
+    STORY_PARTITION_DAYS = conf_int('STORY_PARTITION_DAYS', 7)
+
     # required if STATSD_URL set
     STATSD_PREFIX = conf_optional('STATSD_PREFIX')
 
     # set by dokku-graphite plugin
     STATSD_URL = conf_optional('STATSD_URL')
 
+    # number of (sources_id, normalized title hash) pairs (with
+    # latest published_at) kept by each fetcher Worker to avoid title
+    # dedup queries.  Zero disables.
+    TITLE_CACHE_ENTRIES = conf_int('TITLE_CACHE_ENTRIES', 100000)
+
     # rq default is 180 sec (3m)
     TASK_TIMEOUT_SECONDS = conf_int('TASK_TIMEOUT_SECONDS', 3 * 60)
 
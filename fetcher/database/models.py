@@ -3,8 +3,9 @@ from enum import Enum
 from typing import Any, Dict, Optional
 
 # PyPI:
-from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Float, Index,
-                        Integer, String, or_, select, text)
+from sqlalchemy import (BigInteger, Boolean, Column, Date, DateTime, Float,
+                        Index, Integer, Label, LargeBinary, String, Uuid,
+                        literal_column, or_, select, text)
 from sqlalchemy.orm import DeclarativeBase, mapped_column
 from sqlalchemy.sql._typing import _ColumnsClauseArgument
 from sqlalchemy.sql.selectable import Select
@@ -36,10 +37,11 @@ def utc(seconds: float = 0.0) -> dt.datetime:
 
 
 # The datetime of the start of each fetch  runis used in the following places:
-# * Feed.last_fetch_{attempt,success}, .last_new_stories
+# * FeedState.last_fetch_{attempt,success}, .last_new_stories
 # * FetchEvent.created_at for fetch run
 # * Story.created_at for all new stories in feed
-# * StoryRef.seen_at for all stories in feed
+# * StoryRef.seen_at for all stories in feed (when document changed)
+# * FeedGeneration.seen_at
 
 class Feed(Base):
     __tablename__ = 'feeds'
@@ -52,41 +54,22 @@ class Feed(Base):
         Boolean,
         nullable=False,
         server_default=text('true'))
-    last_fetch_attempt = mapped_column(DateTime)
-    last_fetch_success = mapped_column(DateTime)
-    last_fetch_hash = mapped_column(String)
-    last_fetch_failures = mapped_column(
-        Float,
-        nullable=False,
-        server_default=text('0'))
     created_at = mapped_column(DateTime)
-    http_etag = mapped_column(String)  # "Entity Tag"
-    http_last_modified = mapped_column(String)
-    next_fetch_attempt = mapped_column(DateTime)
-
-    # "queued" now means "currently being fetched"
-    # and is set in the main() function of scripts/fetcher.py
-    queued = mapped_column(
-        Boolean,
-        nullable=False,
-        server_default=text('false'))
     system_enabled = mapped_column(
         Boolean,
         nullable=False,
         server_default=text('true'))
     # sy:updatePeriod/sy:updateFrequency
     update_minutes = mapped_column(Integer)
-    http_304 = mapped_column(Boolean)        # sends HTTP 304 "Not Modified"
-    system_status = mapped_column(String)
-    last_new_stories = mapped_column(DateTime)
     rss_title = mapped_column(String)  # ONLY set from RSS feed title
     poll_minutes = mapped_column(Integer)  # poll period override
     # ^^^ _COULD_ be auto-adaptive (add bool adaptive(_poll)?)
 
+    # NOTE! columns written by every fetch are in FeedState
+
     __table_args__ = (
         Index('feeds_system_enabled', 'system_enabled'),
         Index('feeds_sources_id', 'sources_id'),
-        Index('feeds_next_fetch_attempt', 'last_fetch_attempt'),
         Index('feeds_active', 'active'),
     )
 
@@ -112,15 +95,105 @@ class Feed(Base):
         """
 
         now = utc()
+        # feeds without a FeedState row have never been fetched
         return cls.select_where_active(*entities)\
-                  .where(Feed.queued.is_(False),
-                         or_(Feed.next_fetch_attempt <= now,
-                             Feed.next_fetch_attempt.is_(None)))
+                  .outerjoin_from(Feed, FeedState,
+                                  FeedState.feed_id == Feed.id)\
+                  .where(FeedState.queued.is_not(True),
+                         or_(FeedState.next_fetch_attempt <= now,
+                             FeedState.next_fetch_attempt.is_(None)))
+
+    def as_dict_with_state(self,
+                           state: Optional['FeedState']) -> Dict[str, Any]:
+        """
+        return public Feed fields, plus those of
+        the Feed's FeedState (if any)
+        """
+        ret = self.as_dict_public()
+        if state:
+            for key, value in state.as_dict_public().items():
+                if key != 'feed_id':
+                    ret[key] = value
+        return ret
+
+
+# PostgreSQL row version of a feeds row (changes with every UPDATE,
+# by a human, scripts/update_feeds.py or tasks.update_feed):
+# read by HeadHunter.refill and checked by tasks.update_feed
+# to detect changes made while a feed was being fetched.
+FEED_VERSION: Label[int] = \
+    literal_column('feeds.xmin::text::bigint', BigInteger).label('version')
+
+
+class FeedState(Base):
+    """
+    Feed scheduling state: the columns written by every fetch
+    (and by scripts/fetcher.py when a fetch starts), split out of
+    the (wide) feeds table.
+
+    Created (by migration) with a low fillfactor and no indices other
+    than the primary key, so updates are "HOT" (Heap Only Tuple): new row
+    versions fit in the same page and no index entries are written.
+    The ready and refill queries scan this (narrow) table: an index
+    on next_fetch_attempt or queued would make every update non-HOT.
+
+    A Feed without a FeedState row has never been fetched (see
+    Feed.select_where_ready).
+    """
+    __tablename__ = 'feed_state'
+
+    feed_id = mapped_column(BigInteger, primary_key=True, nullable=False)
+
+    # "queued" now means "currently being fetched"
+    # and is set in the main() function of scripts/fetcher.py
+    queued = mapped_column(
+        Boolean,
+        nullable=False,
+        server_default=text('false'))
+    next_fetch_attempt = mapped_column(DateTime)
+    last_fetch_attempt = mapped_column(DateTime)
+    last_fetch_success = mapped_column(DateTime)
+    last_fetch_failures = mapped_column(
+        Float,
+        nullable=False,
+        server_default=text('0'))
+    system_status = mapped_column(String)
+    last_fetch_hash = mapped_column(String)
+    last_entries_hash = mapped_column(String)
+    http_etag = mapped_column(String)  # "Entity Tag"
+    http_last_modified = mapped_column(String)
+    http_304 = mapped_column(Boolean)        # sends HTTP 304 "Not Modified"
+    # consistent ETag/Last-Modified checks (see fetcher/conditional.py):
+    http_trust = mapped_column(Integer)
+    document_bytes = mapped_column(Integer)  # size of last full document
+    last_new_stories = mapped_column(DateTime)
+    # story arrival estimate (see fetcher/schedule.py):
+    arrival_rate = mapped_column(Float)  # new stories/hour (EWMA)
+    arrival_var = mapped_column(Float)   # variance of arrival_rate
+    entry_count = mapped_column(Integer)  # entries in last document
+    # minimum poll_minutes (see scripts/allocate_polls.py):
+    budget_minutes = mapped_column(Integer)
+    # hour-of-week activity profile (see scripts/feed_activity.py):
+    activity = mapped_column(LargeBinary)
+    # server freshness hints (see schedule.freshness_floor):
+    fresh_minutes = mapped_column(Integer)  # HTTP max-age/Expires less Age
+    ttl_minutes = mapped_column(Integer)    # RSS <ttl>
+    skip_hours = mapped_column(Integer)  # RSS <skipHours>: bit per UTC hour
+    skip_days = mapped_column(Integer)   # RSS <skipDays>: bit 0 is Monday
+
+    # NOTE: no additional indices (see above)
+
+    def __repr__(self) -> str:
+        return f"<FeedState feed_id={self.feed_id}>"
 
 
 class Story(Base):
     __tablename__ = 'stories'
 
+    # NOTE! table is partitioned by fetched_at by migration 7a2e4c1f9b35
+    # (see fetcher/database/partitions.py): the primary key and unique
+    # url_md5 index exist only on each partition.  Declared here as if
+    # unpartitioned (so metadata.create_all makes a usable table).
     id = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     feed_id = mapped_column(BigInteger)
     sources_id = mapped_column(BigInteger)
@@ -133,10 +206,16 @@ class Story(Base):
     title = mapped_column(String)
     normalized_title = mapped_column(String)
     normalized_title_hash = mapped_column(String)
+    # fixed width dedup keys (see tasks.url_md5, tasks.hash64):
+    url_md5 = mapped_column(Uuid)  # MD5 of normalized_url
+    title_hash = mapped_column(BigInteger)  # 64 bits of normalized_title_hash
 
     __table_args__ = (
-        Index('unique_story_url', 'normalized_url', unique=True),
-        Index('unique_story_title', 'normalized_title_hash', 'sources_id'),
+        # per-partition in database:
+        Index('unique_story_url_md5', 'url_md5', unique=True),
+        # for tasks.normalized_titles_exist (covers published_at window):
+        Index('stories_title_hash_window', 'sources_id', 'title_hash',
+              'published_at'),
         Index('stories_sources_id', 'sources_id'),
         Index('stories_published_at', 'published_at'),
         Index('stories_fetched_at', 'fetched_at'),
@@ -164,23 +243,70 @@ class StoryRef(Base):
     story_id = mapped_column(BigInteger, primary_key=True, nullable=False)
     feed_id = mapped_column(BigInteger, primary_key=True, nullable=False)
 
-    # MUST match the Story.last_fetch_success time at which the story was last seen
-    # in order to update the row if the feed document hash hasn't changed.
+    # time ref was last written
+    # (only used for expiration of refs without a gen)
     seen_at = mapped_column(DateTime)
 
+    # FeedGeneration (of feed_id) in which story was last seen
+    gen = mapped_column(Integer)
+
     __table_args__ = (
         # primary key can be used for finding Stories by story_id
         # (used in db_archive.py to expire refs)
         Index('story_refs_seen_at', 'seen_at'),  # for expiration
-        Index('story_refs_feed_id', 'feed_id'),  # for static feed doc
+        Index('story_refs_feed_id_gen', 'feed_id', 'gen'),
+    )
+
+
+class FeedGeneration(Base):
+    """
+    A feed document that saved stories (referenced by StoryRef.gen),
+    and the last time that document (or one with the same entries)
+    was seen.
+
+    When the document hasn't changed, only seen_at of the feed's
+    current (highest) generation is updated, rather than every
+    StoryRef for the feed.  db_archive.py expires StoryRefs by the
+    seen_at of their generation.
+    """
+    __tablename__ = 'feed_generations'
+
+    feed_id = mapped_column(BigInteger, primary_key=True, nullable=False)
+    gen = mapped_column(Integer, primary_key=True, nullable=False)
+    seen_at = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index('feed_generations_seen_at', 'seen_at'),  # for expiration
     )
 
 
+class SeenEntries(Base):
+    """
+    Entries from the last fetch of a feed that saved stories:
+    packed (entry URL hash, story id) pairs (see tasks.py), so that
+    entries seen last time can skip the per-entry dedup queries.
+
+    One row per feed, replaced when the set of entries changes.
+    """
+    __tablename__ = 'seen_entries'
+
+    feed_id = mapped_column(BigInteger, primary_key=True, nullable=False)
+    fetched_at = mapped_column(DateTime)
+    entries = mapped_column(LargeBinary)
+
+
 class FetchEvent(Base):
+    """
+    Recent fetch history for a feed: a ring of FETCH_EVENT_ROWS slots
+    (slot is seq modulo FETCH_EVENT_ROWS) overwritten in place (see
+    tasks.save_fetch_events), so neither writes nor pruning grow with
+    fetch rate.  Longer term counts are in FetchEventDay.
+    """
     __tablename__ = 'fetch_events'
 
-    id = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    feed_id = mapped_column(BigInteger)
+    feed_id = mapped_column(BigInteger, primary_key=True, nullable=False)
+    slot = mapped_column(Integer, primary_key=True, nullable=False)
+    seq = mapped_column(BigInteger)    # feed's event number
     event = mapped_column(String)      # Event enum
     note = mapped_column(String)
     created_at = mapped_column(DateTime)
@@ -192,24 +318,28 @@ class FetchEvent(Base):
         # disabled due to excessive failures:
         FETCH_FAILED_DISABLED = 'fetch_disabled'
 
-    __table_args__ = (
-        Index('fetch_events_feeds_id', 'feed_id'),
-        Index('fetch_events_created_at', 'created_at'),
-    )
+    # NOTE: no additional indices: primary key is feed_id + slot
+    # (and overwriting a slot doesn't change any indexed column)
 
     def __repr__(self) -> str:
-        return f"<FetchEvent id={self.id}>"
+        return f"<FetchEvent feed_id={self.feed_id} seq={self.seq}>"
 
-    @staticmethod
-    def from_info(feed_id: int, event: Event,
-                  created_at: Optional[dt.datetime],
-                  note: Optional[str] = None) -> 'FetchEvent':
-        fe = FetchEvent()
-        fe.feed_id = feed_id
-        fe.event = event.value  # shorter, lower case
-        fe.note = note
-        fe.created_at = created_at
-        return fe
+
+class FetchEventDay(Base):
+    """
+    Daily count of each FetchEvent.Event for a feed,
+    kept for FETCH_EVENT_DAYS (see scripts/db_archive.py)
+    """
+    __tablename__ = 'fetch_event_days'
+
+    feed_id = mapped_column(BigInteger, primary_key=True, nullable=False)
+    day = mapped_column(Date, primary_key=True, nullable=False)
+    event = mapped_column(String, primary_key=True, nullable=False)
+    count = mapped_column(Integer)
+
+    __table_args__ = (
+        Index('fetch_event_days_day', 'day'),
+    )
 
 
 class Property(Base):
@@ -0,0 +1,95 @@
+"""
+stories table partition maintenance.
+
+stories is range partitioned by fetched_at (see migration
+20261019_1722_partition_stories), with one partition per (UTC) day,
+named stories_pYYYYMMDD, plus stories_legacy holding all rows
+from before partitioning.
+
+Partitions must exist BEFORE stories are fetched into them (there is
+no default partition, since a default partition would have to be
+scanned each time a new partition is created), so scripts/fetcher.py
+and scripts/db_archive.py both call create_story_partitions.
+
+Uniqueness can only be enforced within a partition (the partition key
+would have to be part of a global unique index), so each partition has
+its own primary key and unique url_md5 index, and inserts use ON
+CONFLICT DO NOTHING without a conflict target.  To keep URLs unique
+across partitions, tasks._lock_urls takes an advisory lock on each
+new url_md5 (and looks again) before inserting.  Lookups by url_md5
+against the parent table probe each partition's index.
+"""
+
+import datetime as dt
+import logging
+import re
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+PARENT = 'stories'
+PREFIX = 'stories_p'            # followed by YYYYMMDD
+
+# upper bound from pg_get_expr(relpartbound): FOR VALUES FROM (...) TO (...)
+_UPPER_RE = re.compile(r"TO \((?:'([^']*)'|MAXVALUE)\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    upper: Optional[dt.datetime]  # exclusive; None for MAXVALUE
+
+
+def partition_name(day: dt.date) -> str:
+    return f"{PREFIX}{day.strftime('%Y%m%d')}"
+
+
+def story_partitions(conn: Connection) -> List[Partition]:
+    """
+    return stories partitions, in order of upper bound
+    """
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)"
+        " FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+        " WHERE i.inhparent = CAST(:parent AS regclass)"),
+        {'parent': PARENT})
+    parts = []
+    for name, bound in rows:
+        m = _UPPER_RE.search(bound or '')
+        if not m:
+            logger.warning("%s: unexpected bound %s", name, bound)
+            continue
+        upper = dt.datetime.fromisoformat(m.group(1)) if m.group(1) else None
+        parts.append(Partition(name, upper))
+    parts.sort(key=lambda p: p.upper or dt.datetime.max)
+    return parts
+
+
+def create_story_partitions(conn: Connection, first: dt.date,
+                            days: int) -> int:
+    """
+    create daily partitions for `days` days starting with `first`
+    (skipping any days already covered).  returns number created.
+    """
+    covered = max((p.upper for p in story_partitions(conn) if p.upper),
+                  default=None)
+    created = 0
+    for i in range(days):
+        day = first + dt.timedelta(days=i)
+        if covered and dt.datetime.combine(day, dt.time()) < covered:
+            continue
+        name = partition_name(day)
+        # creation takes a brief lock on stories, so keep it short
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {PARENT}"
+            f" FOR VALUES FROM ('{day.isoformat()}')"
+            f" TO ('{(day + dt.timedelta(days=1)).isoformat()}')"))
+        conn.execute(text(f"ALTER TABLE {name} ADD PRIMARY KEY (id)"))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX {name}_url_md5 ON {name} (url_md5)"))
+        conn.commit()
+        logger.info("created %s", name)
+        created += 1
+    return created
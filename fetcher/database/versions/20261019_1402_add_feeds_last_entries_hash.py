@@ -0,0 +1,24 @@
+"""add feeds.last_entries_hash
+
+Revision ID: 3f1c9d2e7b10
+Revises: a6b7fce60801
+Create Date: 2026-10-19 14:02:11.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9d2e7b10'
+down_revision = 'a6b7fce60801'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('feeds', sa.Column('last_entries_hash', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feeds', 'last_entries_hash')
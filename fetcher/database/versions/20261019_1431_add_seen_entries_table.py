@@ -0,0 +1,29 @@
+"""add seen_entries table
+
+Revision ID: 9e4b0a7c52d3
+Revises: 3f1c9d2e7b10
+Create Date: 2026-10-19 14:31:47.902315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b0a7c52d3'
+down_revision = '3f1c9d2e7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('seen_entries',
+    sa.Column('feed_id', sa.BigInteger(), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(), nullable=True),
+    sa.Column('entries', sa.LargeBinary(), nullable=True),
+    sa.PrimaryKeyConstraint('feed_id')
+    )
+
+
+def downgrade():
+    op.drop_table('seen_entries')
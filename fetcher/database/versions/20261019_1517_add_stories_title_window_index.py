@@ -0,0 +1,37 @@
+"""add stories_title_window index
+
+Replaces unique_story_title (normalized_title_hash, sources_id)
+with an index that also covers the published_at window predicate.
+
+Revision ID: c27d8e5a9f41
+Revises: 9e4b0a7c52d3
+Create Date: 2026-10-19 15:17:03.665102
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27d8e5a9f41'
+down_revision = '9e4b0a7c52d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # stories is large: don't lock out fetchers while building index
+    with op.get_context().autocommit_block():
+        op.create_index('stories_title_window', 'stories',
+                        ['sources_id', 'normalized_title_hash', 'published_at'],
+                        postgresql_concurrently=True)
+        op.drop_index('unique_story_title', 'stories',
+                      postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('unique_story_title', 'stories',
+                        ['normalized_title_hash', 'sources_id'],
+                        postgresql_concurrently=True)
+        op.drop_index('stories_title_window', 'stories',
+                      postgresql_concurrently=True)
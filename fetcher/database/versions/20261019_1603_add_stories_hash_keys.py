@@ -0,0 +1,67 @@
+"""add stories url_md5, title_hash dedup keys
+
+Replaces the B-tree indices on normalized_url text (up to 2K bytes
+per entry) and hex normalized_title_hash with indices on fixed width
+binary hashes.
+
+The backfill updates every story row (in batches, each committed
+separately); the fetcher should be stopped while it runs.
+
+Revision ID: 5d8a3b61e0c7
+Revises: c27d8e5a9f41
+Create Date: 2026-10-19 16:03:52.110894
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8a3b61e0c7'
+down_revision = 'c27d8e5a9f41'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000000                 # story ids per backfill UPDATE
+
+
+def upgrade():
+    op.add_column('stories', sa.Column('url_md5', sa.Uuid(), nullable=True))
+    op.add_column('stories', sa.Column('title_hash', sa.BigInteger(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        max_id = conn.execute(sa.text("SELECT MAX(id) FROM stories")).scalar() or 0
+        for low in range(0, max_id + 1, BATCH):
+            # see fetcher.tasks.url_md5 and hash64
+            conn.execute(sa.text(
+                "UPDATE stories"
+                " SET url_md5 = md5(normalized_url)::uuid,"
+                "  title_hash = ('x' || substr(normalized_title_hash, 1, 16))::bit(64)::bigint"
+                " WHERE id >= :low AND id < :high"),
+                {'low': low, 'high': low + BATCH})
+
+        op.create_index('unique_story_url_md5', 'stories', ['url_md5'],
+                        unique=True, postgresql_concurrently=True)
+        op.create_index('stories_title_hash_window', 'stories',
+                        ['sources_id', 'title_hash', 'published_at'],
+                        postgresql_concurrently=True)
+        op.drop_index('unique_story_url', 'stories',
+                      postgresql_concurrently=True)
+        op.drop_index('stories_title_window', 'stories',
+                      postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('unique_story_url', 'stories', ['normalized_url'],
+                        unique=True, postgresql_concurrently=True)
+        op.create_index('stories_title_window', 'stories',
+                        ['sources_id', 'normalized_title_hash', 'published_at'],
+                        postgresql_concurrently=True)
+        op.drop_index('stories_title_hash_window', 'stories',
+                      postgresql_concurrently=True)
+        op.drop_index('unique_story_url_md5', 'stories',
+                      postgresql_concurrently=True)
+    op.drop_column('stories', 'title_hash')
+    op.drop_column('stories', 'url_md5')
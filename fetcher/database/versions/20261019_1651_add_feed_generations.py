@@ -0,0 +1,38 @@
+"""add feed_generations table, story_refs.gen
+
+Revision ID: 0b6f2c9d4a18
+Revises: 5d8a3b61e0c7
+Create Date: 2026-10-19 16:51:20.734510
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6f2c9d4a18'
+down_revision = '5d8a3b61e0c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('feed_generations',
+    sa.Column('feed_id', sa.BigInteger(), nullable=False),
+    sa.Column('gen', sa.Integer(), nullable=False),
+    sa.Column('seen_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('feed_id', 'gen')
+    )
+    op.create_index('feed_generations_seen_at', 'feed_generations', ['seen_at'], unique=False)
+    # existing refs have NULL gen (and are expired by seen_at)
+    op.add_column('story_refs', sa.Column('gen', sa.Integer(), nullable=True))
+    op.create_index('story_refs_feed_id_gen', 'story_refs', ['feed_id', 'gen'], unique=False)
+    op.drop_index('story_refs_feed_id', 'story_refs')
+
+
+def downgrade():
+    op.create_index('story_refs_feed_id', 'story_refs', ['feed_id'], unique=False)
+    op.drop_index('story_refs_feed_id_gen', 'story_refs')
+    op.drop_column('story_refs', 'gen')
+    op.drop_index('feed_generations_seen_at', 'feed_generations')
+    op.drop_table('feed_generations')
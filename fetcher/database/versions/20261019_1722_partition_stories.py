@@ -0,0 +1,106 @@
+"""partition stories table by fetched_at
+
+The existing stories table (and its indices) are renamed with a
+_legacy suffix and attached as the first partition of a new stories
+table, range partitioned by fetched_at, covering everything fetched
+before tomorrow (UTC).  Daily partitions (stories_pYYYYMMDD) are
+created ahead by fetcher.database.partitions.create_story_partitions
+(called from scripts/fetcher.py and scripts/db_archive.py), so
+scripts/db_archive.py can drop whole partitions of expired stories.
+
+Unique indices can only be enforced per-partition (the partition key
+would have to be included), so the parent table has no primary key
+or unique url_md5 index; each partition has its own.
+
+Validating the legacy partition range CHECK constraint scans the
+table; the fetcher should be stopped while this runs.
+
+Revision ID: 7a2e4c1f9b35
+Revises: 0b6f2c9d4a18
+Create Date: 2026-10-19 17:22:41.406218
+
+"""
+import datetime as dt
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2e4c1f9b35'
+down_revision = '0b6f2c9d4a18'
+branch_labels = None
+depends_on = None
+
+DAYS = 7                        # daily partitions to create
+
+
+def upgrade():
+    conn = op.get_bind()
+    cutover = dt.datetime.utcnow().date() + dt.timedelta(days=1)
+
+    # partition key cannot be NULL
+    op.execute("UPDATE stories SET fetched_at = '1970-01-01' WHERE fetched_at IS NULL")
+
+    op.rename_table('stories', 'stories_legacy')
+    indices = conn.execute(sa.text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'stories_legacy'")).scalars().all()
+    for name in indices:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+
+    op.execute(
+        "ALTER TABLE stories_legacy ADD CONSTRAINT stories_legacy_range"
+        f" CHECK (fetched_at IS NOT NULL AND fetched_at < '{cutover}') NOT VALID")
+    op.execute("ALTER TABLE stories_legacy VALIDATE CONSTRAINT stories_legacy_range")
+
+    op.execute(
+        "CREATE TABLE stories (LIKE stories_legacy INCLUDING DEFAULTS)"
+        " PARTITION BY RANGE (fetched_at)")
+    op.execute("ALTER SEQUENCE stories_id_seq OWNED BY stories.id")
+
+    # partitioned (non-unique) indices; matching legacy indices are
+    # attached by ATTACH PARTITION (building any that are missing)
+    op.create_index('stories_title_hash_window', 'stories',
+                    ['sources_id', 'title_hash', 'published_at'])
+    op.create_index('stories_sources_id', 'stories', ['sources_id'])
+    op.create_index('stories_published_at', 'stories', ['published_at'])
+    op.create_index('stories_fetched_at', 'stories', ['fetched_at'])
+    op.create_index('stories_feed_id', 'stories', ['feed_id'])
+    op.create_index('stories_domain', 'stories', ['domain'])
+
+    op.execute(
+        "ALTER TABLE stories ATTACH PARTITION stories_legacy"
+        f" FOR VALUES FROM (MINVALUE) TO ('{cutover}')")
+    # no longer needed (implied by partition bound)
+    op.execute("ALTER TABLE stories_legacy DROP CONSTRAINT stories_legacy_range")
+
+    # see fetcher.database.partitions.create_story_partitions
+    for i in range(DAYS):
+        day = cutover + dt.timedelta(days=i)
+        name = f"stories_p{day.strftime('%Y%m%d')}"
+        op.execute(
+            f"CREATE TABLE {name} PARTITION OF stories"
+            f" FOR VALUES FROM ('{day}') TO ('{day + dt.timedelta(days=1)}')")
+        op.execute(f"ALTER TABLE {name} ADD PRIMARY KEY (id)")
+        op.execute(f"CREATE UNIQUE INDEX {name}_url_md5 ON {name} (url_md5)")
+
+
+def downgrade():
+    # copy rows from daily partitions back into the legacy table
+    # (url_md5 duplicates across partitions are discarded)
+    conn = op.get_bind()
+    parts = conn.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+        " WHERE i.inhparent = 'stories'::regclass AND c.relname <> 'stories_legacy'")).scalars().all()
+    op.execute("ALTER TABLE stories DETACH PARTITION stories_legacy")
+    for name in parts:
+        op.execute(f"INSERT INTO stories_legacy SELECT * FROM {name} ON CONFLICT DO NOTHING")
+    op.execute("ALTER SEQUENCE stories_id_seq OWNED BY stories_legacy.id")
+    op.execute("DROP TABLE stories")  # drops daily partitions too
+
+    op.rename_table('stories_legacy', 'stories')
+    indices = conn.execute(sa.text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'stories'")).scalars().all()
+    for name in indices:
+        if name.endswith('_legacy'):
+            op.execute(f"ALTER INDEX {name} RENAME TO {name[:-len('_legacy')]}")
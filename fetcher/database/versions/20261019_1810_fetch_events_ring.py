@@ -0,0 +1,85 @@
+"""replace fetch_events with per-feed ring, add fetch_event_days
+
+fetch_events becomes a ring of FETCH_EVENT_ROWS slots per feed
+(keeping the most recent events), and fetch_event_days holds daily
+counts of each event (rolled up from all existing events).
+
+Revision ID: e41c7b2a9d06
+Revises: 7a2e4c1f9b35
+Create Date: 2026-10-19 18:10:05.527731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41c7b2a9d06'
+down_revision = '7a2e4c1f9b35'
+branch_labels = None
+depends_on = None
+
+ROWS = 30                       # default FETCH_EVENT_ROWS
+
+
+def upgrade():
+    op.rename_table('fetch_events', 'fetch_events_old')
+    op.execute("ALTER INDEX fetch_events_pkey RENAME TO fetch_events_old_pkey")
+
+    op.create_table('fetch_events',
+    sa.Column('feed_id', sa.BigInteger(), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.BigInteger(), nullable=True),
+    sa.Column('event', sa.String(), nullable=True),
+    sa.Column('note', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('feed_id', 'slot')
+    )
+    op.create_table('fetch_event_days',
+    sa.Column('feed_id', sa.BigInteger(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('event', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('feed_id', 'day', 'event')
+    )
+    op.create_index('fetch_event_days_day', 'fetch_event_days', ['day'], unique=False)
+
+    # most recent events for each feed (see tasks.save_fetch_events)
+    op.execute(
+        "INSERT INTO fetch_events (feed_id, slot, seq, event, note, created_at)"
+        f" SELECT feed_id, seq % {ROWS}, seq, event, note, created_at"
+        " FROM (SELECT feed_id, event, note, created_at,"
+        "        ROW_NUMBER() OVER (PARTITION BY feed_id ORDER BY id) AS seq,"
+        "        COUNT(1) OVER (PARTITION BY feed_id) AS n"
+        "       FROM fetch_events_old WHERE feed_id IS NOT NULL) e"
+        f" WHERE seq > n - {ROWS}")
+    op.execute(
+        "INSERT INTO fetch_event_days (feed_id, day, event, count)"
+        " SELECT feed_id, created_at::date, event, COUNT(1)"
+        " FROM fetch_events_old"
+        " WHERE feed_id IS NOT NULL AND created_at IS NOT NULL"
+        "  AND event IS NOT NULL"
+        " GROUP BY 1, 2, 3")
+    op.drop_table('fetch_events_old')
+
+
+def downgrade():
+    op.rename_table('fetch_events', 'fetch_events_ring')
+    op.execute("ALTER INDEX fetch_events_pkey RENAME TO fetch_events_ring_pkey")
+    op.create_table('fetch_events',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('feed_id', sa.BigInteger(), nullable=True),
+    sa.Column('event', sa.String(), nullable=True),
+    sa.Column('note', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        "INSERT INTO fetch_events (feed_id, event, note, created_at)"
+        " SELECT feed_id, event, note, created_at FROM fetch_events_ring"
+        " ORDER BY feed_id, seq")
+    op.create_index('fetch_events_feeds_id', 'fetch_events', ['feed_id'])
+    op.create_index('fetch_events_created_at', 'fetch_events', ['created_at'])
+    op.drop_table('fetch_events_ring')
+    op.drop_index('fetch_event_days_day', 'fetch_event_days')
+    op.drop_table('fetch_event_days')
@@ -0,0 +1,75 @@
+"""move feed scheduling columns to feed_state table
+
+Columns written by every fetch move from feeds to a narrow
+feed_state table with a low fillfactor and only a primary key index,
+so that the updates can be HOT (heap only tuple) updates.
+
+Revision ID: 3b9d5e7f1a24
+Revises: e41c7b2a9d06
+Create Date: 2026-10-19 18:52:37.914052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d5e7f1a24'
+down_revision = 'e41c7b2a9d06'
+branch_labels = None
+depends_on = None
+
+FILLFACTOR = 50                 # percent of each page filled by INSERTs
+
+# columns moved (in feed_state order):
+COLUMNS = ['queued', 'next_fetch_attempt', 'last_fetch_attempt',
+           'last_fetch_success', 'last_fetch_failures', 'system_status',
+           'last_fetch_hash', 'last_entries_hash', 'http_etag',
+           'http_last_modified', 'http_304', 'last_new_stories']
+
+
+def upgrade():
+    op.create_table('feed_state',
+    sa.Column('feed_id', sa.BigInteger(), nullable=False),
+    sa.Column('queued', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+    sa.Column('next_fetch_attempt', sa.DateTime(), nullable=True),
+    sa.Column('last_fetch_attempt', sa.DateTime(), nullable=True),
+    sa.Column('last_fetch_success', sa.DateTime(), nullable=True),
+    sa.Column('last_fetch_failures', sa.Float(), server_default=sa.text('0'), nullable=False),
+    sa.Column('system_status', sa.String(), nullable=True),
+    sa.Column('last_fetch_hash', sa.String(), nullable=True),
+    sa.Column('last_entries_hash', sa.String(), nullable=True),
+    sa.Column('http_etag', sa.String(), nullable=True),
+    sa.Column('http_last_modified', sa.String(), nullable=True),
+    sa.Column('http_304', sa.Boolean(), nullable=True),
+    sa.Column('last_new_stories', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('feed_id')
+    )
+    op.execute(f"ALTER TABLE feed_state SET (fillfactor = {FILLFACTOR})")
+
+    cols = ', '.join(COLUMNS)
+    op.execute(f"INSERT INTO feed_state (feed_id, {cols}) SELECT id, {cols} FROM feeds")
+
+    op.drop_index('feeds_next_fetch_attempt', 'feeds')  # on last_fetch_attempt!
+    for col in COLUMNS:
+        op.drop_column('feeds', col)
+
+
+def downgrade():
+    op.add_column('feeds', sa.Column('queued', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    op.add_column('feeds', sa.Column('next_fetch_attempt', sa.DateTime(), nullable=True))
+    op.add_column('feeds', sa.Column('last_fetch_attempt', sa.DateTime(), nullable=True))
+    op.add_column('feeds', sa.Column('last_fetch_success', sa.DateTime(), nullable=True))
+    op.add_column('feeds', sa.Column('last_fetch_failures', sa.Float(), server_default=sa.text('0'), nullable=False))
+    op.add_column('feeds', sa.Column('system_status', sa.String(), nullable=True))
+    op.add_column('feeds', sa.Column('last_fetch_hash', sa.String(), nullable=True))
+    op.add_column('feeds', sa.Column('last_entries_hash', sa.String(), nullable=True))
+    op.add_column('feeds', sa.Column('http_etag', sa.String(), nullable=True))
+    op.add_column('feeds', sa.Column('http_last_modified', sa.String(), nullable=True))
+    op.add_column('feeds', sa.Column('http_304', sa.Boolean(), nullable=True))
+    op.add_column('feeds', sa.Column('last_new_stories', sa.DateTime(), nullable=True))
+
+    sets = ', '.join(f"{col} = s.{col}" for col in COLUMNS)
+    op.execute(f"UPDATE feeds SET {sets} FROM feed_state s WHERE s.feed_id = feeds.id")
+    op.create_index('feeds_next_fetch_attempt', 'feeds', ['last_fetch_attempt'])
+    op.drop_table('feed_state')
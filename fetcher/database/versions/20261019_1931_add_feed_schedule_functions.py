@@ -0,0 +1,291 @@
+"""add feed_schedule and feed_complete SQL functions
+
+Used by tasks.update_feed_sql when RSS_FETCH_SQL_UPDATE is set
+(see fetcher/schedule.py).
+
+Revision ID: 5c8a1d3e7b62
+Revises: 3b9d5e7f1a24
+Create Date: 2026-10-19 19:31:12.408376
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5c8a1d3e7b62'
+down_revision = '3b9d5e7f1a24'
+branch_labels = None
+depends_on = None
+
+# frozen copies of fetcher/schedule.py SCHEDULE_SQL and COMPLETE_SQL
+# as of this revision (later versions are created by later revisions)
+SCHEDULE_SQL = """
+CREATE OR REPLACE FUNCTION feed_schedule(
+    p jsonb, status text, failures float8, poll_minutes int,
+    update_minutes int, since_success_min float8, since_new_days int,
+    saved int, dup int, retry_after_min float8,
+    OUT o_failures float8, OUT o_disable boolean, OUT o_poll_minutes int,
+    OUT o_next_minutes float8, OUT o_adjust text)
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    next_minutes float8;
+    next_min int;
+    delta_min float8;
+    dup_pct float8;
+    minimum int;
+    how text;
+    mult float8;
+    max_mins float8;
+    ram float8;
+BEGIN
+    o_adjust := NULL;
+    o_disable := false;
+    next_minutes := coalesce(nullif(poll_minutes, 0), nullif(update_minutes, 0),
+                             (p->>'DEFAULT_INTERVAL_MINS')::int);
+
+    IF status = 'Success' THEN
+        failures := 0;
+    ELSE
+        failures := failures + CASE status WHEN 'Hard error' THEN 1.0
+                                           WHEN 'Soft error' THEN 0.5
+                                           ELSE 0.25 END;
+        IF failures >= (p->>'MAX_FAILURES')::int
+           AND NOT (p->>'UNDEAD_FEEDS')::boolean THEN
+            o_disable := true;
+            next_minutes := NULL;
+        END IF;
+    END IF;
+    o_failures := failures;
+
+    IF next_minutes IS NULL THEN
+        o_poll_minutes := poll_minutes;
+        o_next_minutes := NULL;
+        RETURN;
+    END IF;
+
+    IF status = 'Success' AND since_success_min IS NOT NULL THEN
+        next_min := next_minutes::int;
+        delta_min := since_success_min - next_min;
+
+        IF saved IS NULL OR dup IS NULL THEN
+            dup_pct := 101.0;
+        ELSIF saved + dup > 0 THEN
+            dup_pct := 100.0 * dup / (saved + dup);
+        ELSE
+            dup_pct := 102.0;
+        END IF;
+
+        IF dup_pct >= (p->>'AUTO_ADJUST_MAX_DUPLICATE_PERCENT')::int THEN
+            IF delta_min < -(p->>'AUTO_ADJUST_MAX_DELTA_MIN')::int THEN
+                o_adjust := 'early';
+            ELSIF since_new_days IS NULL THEN
+                o_adjust := 'no_last';
+            ELSE
+                IF since_new_days <= (p->>'AUTO_ADJUST_SMALL_DAYS')::int
+                   OR dup_pct < 100 THEN
+                    next_min := next_min + (p->>'AUTO_ADJUST_SMALL_MINS')::int;
+                ELSE
+                    next_min := next_min + (p->>'AUTO_ADJUST_MINUTES')::int;
+                END IF;
+                IF next_min > (p->>'AUTO_ADJUST_MAX_POLL_MINUTES')::int THEN
+                    next_min := (p->>'AUTO_ADJUST_MAX_POLL_MINUTES')::int;
+                    o_adjust := 'max';
+                ELSIF poll_minutes IS DISTINCT FROM next_min THEN
+                    o_adjust := 'up';
+                END IF;
+            END IF;
+        ELSIF dup_pct < (p->>'AUTO_ADJUST_MIN_DUPLICATE_PERCENT')::int THEN
+            IF delta_min > (p->>'AUTO_ADJUST_MAX_DELTA_MIN')::int THEN
+                o_adjust := 'late';
+            ELSE
+                IF next_min > (p->>'DEFAULT_INTERVAL_MINS')::int THEN
+                    next_min := (p->>'DEFAULT_INTERVAL_MINS')::int;
+                    how := 'reset';
+                ELSE
+                    next_min := next_min - (p->>'AUTO_ADJUST_MINUTES')::int;
+                    how := 'down';
+                END IF;
+                IF coalesce(update_minutes, 0) <> 0 THEN
+                    minimum := greatest(update_minutes,
+                                        (p->>'AUTO_ADJUST_MIN_POLL_MINUTES')::int);
+                ELSE
+                    minimum := (p->>'AUTO_ADJUST_MIN_POLL_MINUTES')::int;
+                END IF;
+                IF next_min < minimum THEN
+                    next_min := minimum;
+                    o_adjust := 'min';
+                ELSIF poll_minutes IS DISTINCT FROM next_min THEN
+                    o_adjust := how;
+                END IF;
+            END IF;
+        END IF;
+        next_minutes := next_min;
+    END IF;
+
+    o_poll_minutes := next_minutes::int;
+
+    mult := failures;
+    IF mult >= 1 THEN
+        next_minutes := next_minutes * mult;
+        IF (p->>'UNDEAD_FEEDS')::boolean
+           AND failures > (p->>'MAX_FAILURES')::int THEN
+            max_mins := (p->>'UNDEAD_FEED_MAX_DAYS')::int * 1440;
+        ELSE
+            max_mins := (p->>'MAXIMUM_BACKOFF_MINS')::int;
+        END IF;
+        IF next_minutes > max_mins THEN
+            next_minutes := max_mins;
+        END IF;
+    END IF;
+
+    ram := retry_after_min;
+    IF coalesce(ram, 0) <> 0 AND ram > next_minutes THEN
+        IF ram > 1440 THEN
+            ram := 1440;
+        END IF;
+        next_minutes := ram;
+    END IF;
+
+    o_next_minutes := next_minutes;
+END
+$$;
+"""
+
+COMPLETE_SQL = """
+CREATE OR REPLACE FUNCTION feed_complete(
+    p jsonb, p_feed_id bigint, p_start timestamp, p_status text,
+    p_sys_status text, p_note text, p_saved int, p_dup int,
+    p_retry_after_min float8, p_randomize boolean, p_no_change boolean,
+    p_cols jsonb,
+    OUT next_fetch_attempt timestamp, OUT failures float8,
+    OUT disabled boolean, OUT poll_minutes int, OUT adjust text,
+    OUT updated_refs int)
+RETURNS SETOF record
+LANGUAGE plpgsql AS $$
+DECLARE
+    f feeds%ROWTYPE;
+    st feed_state%ROWTYPE;
+    s record;
+    now_utc timestamp := timezone('utc', clock_timestamp());
+    update_minutes int;
+    last_new timestamp;
+    event text;
+    seq bigint;
+BEGIN
+    SELECT * INTO f FROM feeds WHERE id = p_feed_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    INSERT INTO feed_state (feed_id) VALUES (p_feed_id)
+        ON CONFLICT DO NOTHING;
+    SELECT * INTO st FROM feed_state WHERE feed_id = p_feed_id FOR UPDATE;
+
+    -- feed_col_updates apply before policy
+    update_minutes := CASE WHEN p_cols ? 'update_minutes'
+                           THEN (p_cols->>'update_minutes')::int
+                           ELSE f.update_minutes END;
+    last_new := CASE WHEN p_cols ? 'last_new_stories'
+                     THEN (p_cols->>'last_new_stories')::timestamp
+                     ELSE st.last_new_stories END;
+
+    SELECT * INTO s FROM feed_schedule(
+        p, p_status, st.last_fetch_failures, f.poll_minutes, update_minutes,
+        extract(epoch FROM now_utc - st.last_fetch_success) / 60,
+        floor(extract(epoch FROM now_utc - coalesce(last_new, f.created_at))
+              / 86400)::int,
+        p_saved, p_dup, p_retry_after_min);
+
+    next_fetch_attempt := st.next_fetch_attempt;
+    IF s.o_next_minutes IS NOT NULL THEN
+        next_fetch_attempt := now_utc + make_interval(
+            secs => (s.o_next_minutes +
+                     CASE WHEN p_randomize THEN random() * 60 ELSE 0 END) * 60);
+    END IF;
+
+    UPDATE feed_state SET
+        queued = false,
+        last_fetch_attempt = p_start,
+        last_fetch_success = CASE WHEN p_status = 'Success' THEN p_start
+                                  ELSE st.last_fetch_success END,
+        system_status = p_sys_status,
+        last_fetch_failures = s.o_failures,
+        next_fetch_attempt = feed_complete.next_fetch_attempt,
+        last_fetch_hash = CASE WHEN p_cols ? 'last_fetch_hash'
+            THEN p_cols->>'last_fetch_hash' ELSE st.last_fetch_hash END,
+        last_entries_hash = CASE WHEN p_cols ? 'last_entries_hash'
+            THEN p_cols->>'last_entries_hash' ELSE st.last_entries_hash END,
+        http_etag = CASE WHEN p_cols ? 'http_etag'
+            THEN p_cols->>'http_etag' ELSE st.http_etag END,
+        http_last_modified = CASE WHEN p_cols ? 'http_last_modified'
+            THEN p_cols->>'http_last_modified' ELSE st.http_last_modified END,
+        http_304 = CASE WHEN p_cols ? 'http_304'
+            THEN (p_cols->>'http_304')::boolean ELSE st.http_304 END,
+        last_new_stories = last_new
+    WHERE feed_state.feed_id = p_feed_id;
+
+    -- only write feeds row if something changed
+    UPDATE feeds SET
+        poll_minutes = s.o_poll_minutes,
+        system_enabled = f.system_enabled AND NOT s.o_disable,
+        update_minutes = feed_complete.update_minutes,
+        rss_title = CASE WHEN p_cols ? 'rss_title'
+                         THEN p_cols->>'rss_title' ELSE f.rss_title END
+    WHERE feeds.id = p_feed_id
+      AND (feeds.poll_minutes, feeds.system_enabled, feeds.update_minutes,
+           feeds.rss_title)
+          IS DISTINCT FROM
+          (s.o_poll_minutes, f.system_enabled AND NOT s.o_disable,
+           feed_complete.update_minutes,
+           CASE WHEN p_cols ? 'rss_title'
+                THEN p_cols->>'rss_title' ELSE f.rss_title END);
+
+    -- see tasks.save_fetch_event
+    -- (constraint names: column names are ambiguous with variables)
+    event := CASE WHEN p_status = 'Success' THEN 'fetch_succeeded'
+                  WHEN s.o_disable THEN 'fetch_disabled'
+                  ELSE 'fetch_failed' END;
+    SELECT coalesce(max(e.seq), 0) + 1 INTO seq
+        FROM fetch_events e WHERE e.feed_id = p_feed_id;
+    INSERT INTO fetch_events (feed_id, slot, seq, event, note, created_at)
+        VALUES (p_feed_id, seq % (p->>'FETCH_EVENT_ROWS')::int, seq,
+                event, p_note, p_start)
+        ON CONFLICT ON CONSTRAINT fetch_events_pkey DO UPDATE
+        SET seq = excluded.seq, event = excluded.event,
+            note = excluded.note, created_at = excluded.created_at;
+    INSERT INTO fetch_event_days (feed_id, day, event, count)
+        VALUES (p_feed_id, p_start::date, event, 1)
+        ON CONFLICT ON CONSTRAINT fetch_event_days_pkey DO UPDATE
+        SET count = fetch_event_days.count + 1;
+
+    updated_refs := NULL;
+    IF st.last_fetch_success IS NOT NULL AND p_no_change THEN
+        UPDATE feed_generations g SET seen_at = p_start
+            WHERE g.feed_id = p_feed_id
+              AND g.gen = (SELECT max(gen) FROM feed_generations
+                           WHERE feed_generations.feed_id = p_feed_id);
+        IF NOT FOUND THEN
+            UPDATE story_refs r SET seen_at = p_start
+                WHERE r.feed_id = p_feed_id AND r.gen IS NULL
+                  AND r.seen_at = st.last_fetch_success;
+            GET DIAGNOSTICS updated_refs = ROW_COUNT;
+        END IF;
+    END IF;
+
+    failures := s.o_failures;
+    disabled := s.o_disable;
+    poll_minutes := s.o_poll_minutes;
+    adjust := s.o_adjust;
+    RETURN NEXT;
+END
+$$;
+"""
+
+
+def upgrade():
+    op.execute(SCHEDULE_SQL)
+    op.execute(COMPLETE_SQL)
+
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS feed_complete")
+    op.execute("DROP FUNCTION feed_schedule")
@@ -0,0 +1,178 @@
+"""feed_complete checks feeds row version
+
+feed_complete takes the feeds row version read by HeadHunter.refill,
+and returns "changed" (see tasks.update_feed).  The argument list and
+result columns changed, so the old function is dropped.
+
+Revision ID: 9e3f6a0b2c47
+Revises: 5c8a1d3e7b62
+Create Date: 2026-10-19 20:14:50.113890
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3f6a0b2c47'
+down_revision = '5c8a1d3e7b62'
+branch_labels = None
+depends_on = None
+
+# frozen copy of fetcher/schedule.py COMPLETE_SQL as of this revision
+COMPLETE_SQL = """
+CREATE OR REPLACE FUNCTION feed_complete(
+    p jsonb, p_feed_id bigint, p_start timestamp, p_status text,
+    p_sys_status text, p_note text, p_saved int, p_dup int,
+    p_retry_after_min float8, p_randomize boolean, p_no_change boolean,
+    p_cols jsonb, p_version bigint,
+    OUT next_fetch_attempt timestamp, OUT failures float8,
+    OUT disabled boolean, OUT poll_minutes int, OUT adjust text,
+    OUT updated_refs int, OUT changed boolean)
+RETURNS SETOF record
+LANGUAGE plpgsql AS $$
+DECLARE
+    f feeds%ROWTYPE;
+    st feed_state%ROWTYPE;
+    s record;
+    now_utc timestamp := timezone('utc', clock_timestamp());
+    update_minutes int;
+    last_new timestamp;
+    event text;
+    seq bigint;
+BEGIN
+    SELECT * INTO f FROM feeds WHERE id = p_feed_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    INSERT INTO feed_state (feed_id) VALUES (p_feed_id)
+        ON CONFLICT DO NOTHING;
+    SELECT * INTO st FROM feed_state WHERE feed_id = p_feed_id FOR UPDATE;
+
+    -- feeds row changed since read by HeadHunter.refill?
+    -- (see tasks.update_feed)
+    changed := p_version IS NOT NULL AND p_version IS DISTINCT FROM
+        (SELECT feeds.xmin::text::bigint FROM feeds WHERE feeds.id = p_feed_id);
+    IF changed THEN
+        UPDATE feed_state SET queued = false
+            WHERE feed_state.feed_id = p_feed_id;
+        next_fetch_attempt := st.next_fetch_attempt;
+        failures := st.last_fetch_failures;
+        disabled := false;
+        poll_minutes := f.poll_minutes;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    -- feed_col_updates apply before policy
+    update_minutes := CASE WHEN p_cols ? 'update_minutes'
+                           THEN (p_cols->>'update_minutes')::int
+                           ELSE f.update_minutes END;
+    last_new := CASE WHEN p_cols ? 'last_new_stories'
+                     THEN (p_cols->>'last_new_stories')::timestamp
+                     ELSE st.last_new_stories END;
+
+    SELECT * INTO s FROM feed_schedule(
+        p, p_status, st.last_fetch_failures, f.poll_minutes, update_minutes,
+        extract(epoch FROM now_utc - st.last_fetch_success) / 60,
+        floor(extract(epoch FROM now_utc - coalesce(last_new, f.created_at))
+              / 86400)::int,
+        p_saved, p_dup, p_retry_after_min);
+
+    next_fetch_attempt := st.next_fetch_attempt;
+    IF s.o_next_minutes IS NOT NULL THEN
+        next_fetch_attempt := now_utc + make_interval(
+            secs => (s.o_next_minutes +
+                     CASE WHEN p_randomize THEN random() * 60 ELSE 0 END) * 60);
+    END IF;
+
+    UPDATE feed_state SET
+        queued = false,
+        last_fetch_attempt = p_start,
+        last_fetch_success = CASE WHEN p_status = 'Success' THEN p_start
+                                  ELSE st.last_fetch_success END,
+        system_status = p_sys_status,
+        last_fetch_failures = s.o_failures,
+        next_fetch_attempt = feed_complete.next_fetch_attempt,
+        last_fetch_hash = CASE WHEN p_cols ? 'last_fetch_hash'
+            THEN p_cols->>'last_fetch_hash' ELSE st.last_fetch_hash END,
+        last_entries_hash = CASE WHEN p_cols ? 'last_entries_hash'
+            THEN p_cols->>'last_entries_hash' ELSE st.last_entries_hash END,
+        http_etag = CASE WHEN p_cols ? 'http_etag'
+            THEN p_cols->>'http_etag' ELSE st.http_etag END,
+        http_last_modified = CASE WHEN p_cols ? 'http_last_modified'
+            THEN p_cols->>'http_last_modified' ELSE st.http_last_modified END,
+        http_304 = CASE WHEN p_cols ? 'http_304'
+            THEN (p_cols->>'http_304')::boolean ELSE st.http_304 END,
+        last_new_stories = last_new
+    WHERE feed_state.feed_id = p_feed_id;
+
+    -- only write feeds row if something changed
+    UPDATE feeds SET
+        poll_minutes = s.o_poll_minutes,
+        system_enabled = f.system_enabled AND NOT s.o_disable,
+        update_minutes = feed_complete.update_minutes,
+        rss_title = CASE WHEN p_cols ? 'rss_title'
+                         THEN p_cols->>'rss_title' ELSE f.rss_title END
+    WHERE feeds.id = p_feed_id
+      AND (feeds.poll_minutes, feeds.system_enabled, feeds.update_minutes,
+           feeds.rss_title)
+          IS DISTINCT FROM
+          (s.o_poll_minutes, f.system_enabled AND NOT s.o_disable,
+           feed_complete.update_minutes,
+           CASE WHEN p_cols ? 'rss_title'
+                THEN p_cols->>'rss_title' ELSE f.rss_title END);
+
+    -- see tasks.save_fetch_event
+    -- (constraint names: column names are ambiguous with variables)
+    event := CASE WHEN p_status = 'Success' THEN 'fetch_succeeded'
+                  WHEN s.o_disable THEN 'fetch_disabled'
+                  ELSE 'fetch_failed' END;
+    SELECT coalesce(max(e.seq), 0) + 1 INTO seq
+        FROM fetch_events e WHERE e.feed_id = p_feed_id;
+    INSERT INTO fetch_events (feed_id, slot, seq, event, note, created_at)
+        VALUES (p_feed_id, seq % (p->>'FETCH_EVENT_ROWS')::int, seq,
+                event, p_note, p_start)
+        ON CONFLICT ON CONSTRAINT fetch_events_pkey DO UPDATE
+        SET seq = excluded.seq, event = excluded.event,
+            note = excluded.note, created_at = excluded.created_at;
+    INSERT INTO fetch_event_days (feed_id, day, event, count)
+        VALUES (p_feed_id, p_start::date, event, 1)
+        ON CONFLICT ON CONSTRAINT fetch_event_days_pkey DO UPDATE
+        SET count = fetch_event_days.count + 1;
+
+    updated_refs := NULL;
+    IF st.last_fetch_success IS NOT NULL AND p_no_change THEN
+        UPDATE feed_generations g SET seen_at = p_start
+            WHERE g.feed_id = p_feed_id
+              AND g.gen = (SELECT max(gen) FROM feed_generations
+                           WHERE feed_generations.feed_id = p_feed_id);
+        IF NOT FOUND THEN
+            UPDATE story_refs r SET seen_at = p_start
+                WHERE r.feed_id = p_feed_id AND r.gen IS NULL
+                  AND r.seen_at = st.last_fetch_success;
+            GET DIAGNOSTICS updated_refs = ROW_COUNT;
+        END IF;
+    END IF;
+
+    failures := s.o_failures;
+    disabled := s.o_disable;
+    poll_minutes := s.o_poll_minutes;
+    adjust := s.o_adjust;
+    RETURN NEXT;
+END
+$$;
+"""
+
+OLD_ARGS = ("jsonb, bigint, timestamp, text, text, text, int, int, float8,"
+            " boolean, boolean, jsonb")
+
+
+def upgrade():
+    op.execute(f"DROP FUNCTION IF EXISTS feed_complete({OLD_ARGS})")
+    op.execute(COMPLETE_SQL)
+
+
+def downgrade():
+    # previous version not recreated: do not set
+    # RSS_FETCH_SQL_UPDATE after downgrading!
+    op.execute(f"DROP FUNCTION IF EXISTS feed_complete({OLD_ARGS}, bigint)")
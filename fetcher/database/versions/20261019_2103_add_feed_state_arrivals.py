@@ -0,0 +1,28 @@
+"""add feed_state story arrival estimate columns
+
+Revision ID: 2d7b4e9a1c53
+Revises: 9e3f6a0b2c47
+Create Date: 2026-10-19 21:03:27.561902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d7b4e9a1c53'
+down_revision = '9e3f6a0b2c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('feed_state', sa.Column('arrival_rate', sa.Float(), nullable=True))
+    op.add_column('feed_state', sa.Column('arrival_var', sa.Float(), nullable=True))
+    op.add_column('feed_state', sa.Column('entry_count', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feed_state', 'entry_count')
+    op.drop_column('feed_state', 'arrival_var')
+    op.drop_column('feed_state', 'arrival_rate')
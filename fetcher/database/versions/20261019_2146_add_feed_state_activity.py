@@ -0,0 +1,24 @@
+"""add feed_state activity profile column
+
+Revision ID: 7f2c4a9d1e85
+Revises: 2d7b4e9a1c53
+Create Date: 2026-10-19 21:46:12.308417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2c4a9d1e85'
+down_revision = '2d7b4e9a1c53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('feed_state', sa.Column('activity', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feed_state', 'activity')
@@ -0,0 +1,30 @@
+"""add feed_state server freshness columns
+
+Revision ID: 3b9d5e1f7a20
+Revises: 7f2c4a9d1e85
+Create Date: 2026-10-19 22:12:37.540211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d5e1f7a20'
+down_revision = '7f2c4a9d1e85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('feed_state', sa.Column('fresh_minutes', sa.Integer(), nullable=True))
+    op.add_column('feed_state', sa.Column('ttl_minutes', sa.Integer(), nullable=True))
+    op.add_column('feed_state', sa.Column('skip_hours', sa.Integer(), nullable=True))
+    op.add_column('feed_state', sa.Column('skip_days', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feed_state', 'skip_days')
+    op.drop_column('feed_state', 'skip_hours')
+    op.drop_column('feed_state', 'ttl_minutes')
+    op.drop_column('feed_state', 'fresh_minutes')
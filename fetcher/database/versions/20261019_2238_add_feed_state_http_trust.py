@@ -0,0 +1,26 @@
+"""add feed_state conditional fetch trust columns
+
+Revision ID: 6a1c8e4f2b93
+Revises: 3b9d5e1f7a20
+Create Date: 2026-10-19 22:38:05.914362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1c8e4f2b93'
+down_revision = '3b9d5e1f7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('feed_state', sa.Column('http_trust', sa.Integer(), nullable=True))
+    op.add_column('feed_state', sa.Column('document_bytes', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feed_state', 'document_bytes')
+    op.drop_column('feed_state', 'http_trust')
@@ -0,0 +1,24 @@
+"""add feed_state budget_minutes column
+
+Revision ID: 8d2f4b6a0c31
+Revises: 6a1c8e4f2b93
+Create Date: 2026-10-19 22:51:44.207816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4b6a0c31'
+down_revision = '6a1c8e4f2b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('feed_state', sa.Column('budget_minutes', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feed_state', 'budget_minutes')
@@ -0,0 +1,234 @@
+"""feed_complete writes all fetch-maintained feed_state columns
+
+feed_complete applies every feed_state column in feed_col_updates
+(http_trust, document_bytes, entry_count, fresh_minutes, ...) and
+updates the story arrival estimate (new feed_arrivals function),
+so those columns don't freeze with RSS_FETCH_SQL_UPDATE set.
+
+Revision ID: 2e7c9a4d6f18
+Revises: 8d2f4b6a0c31
+Create Date: 2026-10-19 23:19:05.640271
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2e7c9a4d6f18'
+down_revision = '8d2f4b6a0c31'
+branch_labels = None
+depends_on = None
+
+# frozen copies of fetcher/schedule.py ARRIVALS_SQL and COMPLETE_SQL
+# as of this revision
+ARRIVALS_SQL = """
+CREATE OR REPLACE FUNCTION feed_arrivals(
+    p jsonb, rate float8, var float8, new_stories int, hours float8,
+    overflow boolean,
+    OUT o_rate float8, OUT o_var float8)
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    obs float8;
+    alpha float8;
+    diff float8;
+    incr float8;
+BEGIN
+    o_rate := rate;
+    o_var := var;
+    IF hours < 1.0 / 60 THEN        -- ARRIVAL_MIN_HOURS
+        RETURN;
+    END IF;
+
+    obs := new_stories / hours;
+    IF rate IS NULL OR var IS NULL THEN
+        o_rate := obs;
+        o_var := 0.0;
+        RETURN;
+    END IF;
+
+    alpha := (p->>'ARRIVAL_EWMA_PERCENT')::int / 100.0;
+    diff := obs - rate;
+    incr := alpha * diff;
+    o_rate := rate + incr;
+    o_var := (1 - alpha) * (var + diff * incr);
+    IF overflow AND obs > o_rate THEN
+        o_rate := obs;
+    END IF;
+END
+$$;
+"""
+
+COMPLETE_SQL = """
+CREATE OR REPLACE FUNCTION feed_complete(
+    p jsonb, p_feed_id bigint, p_start timestamp, p_status text,
+    p_sys_status text, p_note text, p_saved int, p_dup int,
+    p_retry_after_min float8, p_randomize boolean, p_no_change boolean,
+    p_cols jsonb, p_version bigint,
+    OUT next_fetch_attempt timestamp, OUT failures float8,
+    OUT disabled boolean, OUT poll_minutes int, OUT adjust text,
+    OUT updated_refs int, OUT changed boolean)
+RETURNS SETOF record
+LANGUAGE plpgsql AS $$
+DECLARE
+    f feeds%ROWTYPE;
+    st feed_state%ROWTYPE;
+    s record;
+    a record;
+    now_utc timestamp := timezone('utc', clock_timestamp());
+    update_minutes int;
+    new_stories int;
+    event text;
+    seq bigint;
+BEGIN
+    SELECT * INTO f FROM feeds WHERE id = p_feed_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    INSERT INTO feed_state (feed_id) VALUES (p_feed_id)
+        ON CONFLICT DO NOTHING;
+    SELECT * INTO st FROM feed_state WHERE feed_id = p_feed_id FOR UPDATE;
+
+    -- feeds row changed since read by HeadHunter.refill?
+    -- (see tasks.update_feed)
+    changed := p_version IS NOT NULL AND p_version IS DISTINCT FROM
+        (SELECT feeds.xmin::text::bigint FROM feeds WHERE feeds.id = p_feed_id);
+    IF changed THEN
+        UPDATE feed_state SET queued = false
+            WHERE feed_state.feed_id = p_feed_id;
+        next_fetch_attempt := st.next_fetch_attempt;
+        failures := st.last_fetch_failures;
+        disabled := false;
+        poll_minutes := f.poll_minutes;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    -- feed_col_updates apply before policy: keys naming feed_state
+    -- columns go to st (written back below), the rest are feeds columns
+    update_minutes := CASE WHEN p_cols ? 'update_minutes'
+                           THEN (p_cols->>'update_minutes')::int
+                           ELSE f.update_minutes END;
+    st := jsonb_populate_record(st, p_cols);
+
+    -- update story arrival rate estimate (see schedule.update_arrivals)
+    IF p_status = 'Success' AND st.last_fetch_success IS NOT NULL THEN
+        new_stories := CASE WHEN p_no_change THEN 0 ELSE p_saved END;
+        IF new_stories IS NOT NULL THEN
+            SELECT * INTO a FROM feed_arrivals(
+                p, st.arrival_rate, st.arrival_var, new_stories,
+                extract(epoch FROM now_utc - st.last_fetch_success) / 3600,
+                new_stories > 0 AND coalesce(p_dup = 0, false));
+            st.arrival_rate := a.o_rate;
+            st.arrival_var := a.o_var;
+        END IF;
+    END IF;
+
+    SELECT * INTO s FROM feed_schedule(
+        p, p_status, st.last_fetch_failures, f.poll_minutes, update_minutes,
+        extract(epoch FROM now_utc - st.last_fetch_success) / 60,
+        floor(extract(epoch FROM now_utc -
+                      coalesce(st.last_new_stories, f.created_at))
+              / 86400)::int,
+        p_saved, p_dup, p_retry_after_min);
+
+    next_fetch_attempt := st.next_fetch_attempt;
+    IF s.o_next_minutes IS NOT NULL THEN
+        next_fetch_attempt := now_utc + make_interval(
+            secs => (s.o_next_minutes +
+                     CASE WHEN p_randomize THEN random() * 60 ELSE 0 END) * 60);
+    END IF;
+
+    UPDATE feed_state SET
+        queued = false,
+        last_fetch_attempt = p_start,
+        last_fetch_success = CASE WHEN p_status = 'Success' THEN p_start
+                                  ELSE st.last_fetch_success END,
+        system_status = p_sys_status,
+        last_fetch_failures = s.o_failures,
+        next_fetch_attempt = feed_complete.next_fetch_attempt,
+        -- every column fetches maintain (not those set by scripts):
+        last_fetch_hash = st.last_fetch_hash,
+        last_entries_hash = st.last_entries_hash,
+        http_etag = st.http_etag,
+        http_last_modified = st.http_last_modified,
+        http_304 = st.http_304,
+        http_trust = st.http_trust,
+        document_bytes = st.document_bytes,
+        last_new_stories = st.last_new_stories,
+        arrival_rate = st.arrival_rate,
+        arrival_var = st.arrival_var,
+        entry_count = st.entry_count,
+        fresh_minutes = st.fresh_minutes,
+        ttl_minutes = st.ttl_minutes,
+        skip_hours = st.skip_hours,
+        skip_days = st.skip_days
+    WHERE feed_state.feed_id = p_feed_id;
+
+    -- only write feeds row if something changed
+    UPDATE feeds SET
+        poll_minutes = s.o_poll_minutes,
+        system_enabled = f.system_enabled AND NOT s.o_disable,
+        update_minutes = feed_complete.update_minutes,
+        rss_title = CASE WHEN p_cols ? 'rss_title'
+                         THEN p_cols->>'rss_title' ELSE f.rss_title END
+    WHERE feeds.id = p_feed_id
+      AND (feeds.poll_minutes, feeds.system_enabled, feeds.update_minutes,
+           feeds.rss_title)
+          IS DISTINCT FROM
+          (s.o_poll_minutes, f.system_enabled AND NOT s.o_disable,
+           feed_complete.update_minutes,
+           CASE WHEN p_cols ? 'rss_title'
+                THEN p_cols->>'rss_title' ELSE f.rss_title END);
+
+    -- see tasks.save_fetch_events
+    -- (constraint names: column names are ambiguous with variables)
+    event := CASE WHEN p_status = 'Success' THEN 'fetch_succeeded'
+                  WHEN s.o_disable THEN 'fetch_disabled'
+                  ELSE 'fetch_failed' END;
+    SELECT coalesce(max(e.seq), 0) + 1 INTO seq
+        FROM fetch_events e WHERE e.feed_id = p_feed_id;
+    INSERT INTO fetch_events (feed_id, slot, seq, event, note, created_at)
+        VALUES (p_feed_id, seq % (p->>'FETCH_EVENT_ROWS')::int, seq,
+                event, p_note, p_start)
+        ON CONFLICT ON CONSTRAINT fetch_events_pkey DO UPDATE
+        SET seq = excluded.seq, event = excluded.event,
+            note = excluded.note, created_at = excluded.created_at;
+    INSERT INTO fetch_event_days (feed_id, day, event, count)
+        VALUES (p_feed_id, p_start::date, event, 1)
+        ON CONFLICT ON CONSTRAINT fetch_event_days_pkey DO UPDATE
+        SET count = fetch_event_days.count + 1;
+
+    updated_refs := NULL;
+    IF st.last_fetch_success IS NOT NULL AND p_no_change THEN
+        UPDATE feed_generations g SET seen_at = p_start
+            WHERE g.feed_id = p_feed_id
+              AND g.gen = (SELECT max(gen) FROM feed_generations
+                           WHERE feed_generations.feed_id = p_feed_id);
+        IF NOT FOUND THEN
+            UPDATE story_refs r SET seen_at = p_start
+                WHERE r.feed_id = p_feed_id AND r.gen IS NULL
+                  AND r.seen_at = st.last_fetch_success;
+            GET DIAGNOSTICS updated_refs = ROW_COUNT;
+        END IF;
+    END IF;
+
+    failures := s.o_failures;
+    disabled := s.o_disable;
+    poll_minutes := s.o_poll_minutes;
+    adjust := s.o_adjust;
+    RETURN NEXT;
+END
+$$;
+"""
+
+
+def upgrade():
+    op.execute(ARRIVALS_SQL)
+    op.execute(COMPLETE_SQL)   # same arguments: replaces
+
+
+def downgrade():
+    # previous feed_complete not recreated: do not set
+    # RSS_FETCH_SQL_UPDATE after downgrading!
+    op.execute("DROP FUNCTION IF EXISTS feed_complete")
+    op.execute("DROP FUNCTION IF EXISTS feed_arrivals")
@@ -14,11 +14,17 @@ Possible improvements:
 COULD create extra Worker processes on demand (up to some limit), and
 retire excess Workers when not needed.
 
-Manager is written as a class for encapsulation/extension, it is not
-currenly possible to have two active Manager objects (depends on
-exclusive use/access to SIGALRM); this _could_ be fixed by creating
-(or likely finding) a timeout manager that provides timed callouts,
-but that's not necessary.
+Work can be steered towards the Worker that last handled a given
+"affinity" key (ie; a host name, so that a kept-alive connection in
+the Worker process can be reused), see Manager.find_available_worker.
+
+Manager is written as a class for encapsulation/extension.  Job
+timeouts use SIGALRM in the Worker processes only, so more than one
+Manager (each with its own type of Worker) can be active; use the
+poll function to wait for results from all of them.
+
+Messages (in both directions) are pickled, and sent with a length
+prefix, so there is no limit on the size of arguments or results.
 """
 
 # Python
@@ -29,9 +35,11 @@ import pickle
 import select
 import signal
 import socket
+import struct
 import sys
+import time
 from types import FrameType
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 
 # PyPI:
 from setproctitle import setproctitle
@@ -40,12 +48,51 @@ from setproctitle import setproctitle
 from fetcher import APP
 from fetcher.config import conf
 
-MAXDATA = 32 * 1024             # max request/response
 TIMEOUT = conf.TASK_TIMEOUT_SECONDS
 
+# message length prefix
+_LENGTH = struct.Struct('!I')
+
 logger = logging.getLogger(__name__)
 
 
+def _send_msg(sock: socket.socket, obj: Any) -> None:
+    """
+    send pickled object, with length prefix
+    """
+    data = pickle.dumps(obj)
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    """
+    return n bytes (or fewer on EOF)
+    """
+    chunks = []
+    while n > 0:
+        chunk = sock.recv(n)
+        if not chunk:
+            break               # EOF
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_msg(sock: socket.socket) -> Optional[Any]:
+    """
+    receive message sent by _send_msg;
+    returns None on EOF (messages are never None)
+    """
+    hdr = _recv_exactly(sock, _LENGTH.size)
+    if len(hdr) < _LENGTH.size:
+        return None
+    (length,) = _LENGTH.unpack(hdr)
+    data = _recv_exactly(sock, length)
+    if len(data) < length:
+        return None
+    return pickle.loads(data)
+
+
 class JobTimeoutException(BaseException):
     """
     class for job timeout exception
@@ -123,12 +170,12 @@ class Worker:
         while True:
             setproctitle(f"{APP} {n}: idle")
             try:
-                msg = csock.recv(MAXDATA)
+                msg = _recv_msg(csock)
             except ConnectionResetError:  # remote fully closed?
                 break
-            if not msg:
+            if msg is None:
                 break       # EOF
-            method_name, args, kw = pickle.loads(msg)  # see Manager.send
+            method_name, args, kw = msg  # see Worker.call
             ret = {'method': method_name,
                    'args': args,
                    'kw': kw}
@@ -154,7 +201,7 @@ class Worker:
             # XXX do pickle.dumps under separate try (so can send error!)?
 
             try:
-                csock.send(pickle.dumps(ret))
+                _send_msg(csock, ret)
             except BrokenPipeError:  # remote closed for read
                 break
             except TypeError:   # pickle encoding error?
@@ -179,9 +226,8 @@ class Worker:
         assert not self.wactive
         self.manager.idle_workers.remove(self)
         # XXX verify method_name exists w/ hasattr(self, name)???
-        msg = pickle.dumps([method_name, args, kw])
         # XXX wrap in try?
-        self.sock.send(msg)
+        _send_msg(self.sock, [method_name, args, kw])
         self.wactive = True
         self.manager.active_workers += 1
 
@@ -190,11 +236,11 @@ class Worker:
         call ONLY after a "call" to wait for result (or on EOF)
         """
         # XXX use buffered I/O?
-        msg = self.sock.recv(MAXDATA)
-        if msg:
+        msg = _recv_msg(self.sock)
+        if msg is not None:
             # print(self.fileno(), '->', msg)
             # book keeping done in Manager.poll
-            return True, pickle.loads(msg)
+            return True, msg
         # XXX mark as closed
         return False, None
 
@@ -222,7 +268,8 @@ class Manager:
     def __init__(self,
                  nworkers: int,
                  worker_class: type[Worker],
-                 timeout: float = TIMEOUT):
+                 timeout: float = TIMEOUT,
+                 affinity_secs: float = 0.0):
         self.nworkers = nworkers  # desired number of workers
         self.worker_class = worker_class
         self.timeout = timeout
@@ -231,6 +278,10 @@ class Manager:
         self.active_workers = 0   # workers w/ work
         self.worker_by_fd: Dict[int, Worker] = {}
         self.idle_workers = collections.deque[Worker]()
+
+        # affinity key -> (Worker, time.monotonic() of last use)
+        self.affinity_secs = affinity_secs
+        self.affinity: Dict[Hashable, Tuple[Worker, float]] = {}
         for i in range(0, nworkers):
             self._create_worker(i)
 
@@ -245,38 +296,90 @@ class Manager:
         return w
 
     def poll(self, timeout: Optional[float] = None) -> None:
-        r, w_, x_ = select.select(self.worker_by_fd.keys(), [], [], timeout)
-        # print("r:", r)
-        for fd in r:
-            w: Worker = self.worker_by_fd[fd]
-            ok, ret = w.recv()
-            if wactive := w.wactive:
-                self.active_workers -= 1
-                w.wactive = False
-                self.idle_workers.append(w)
-
-            if ok:
-                if (m := ret.get('method')):
-                    # if Worker <method>_done method exists,
-                    # call it (in Manager process)
-                    if (done := getattr(w, m + '_done', None)):
-                        done(ret)
-            else:               # saw EOF (from child exit)
-                n = w.n         # get slot
-                logger.info(f"saw EOF on fd {fd} (worker {n})")  # XXX warning?
-                del self.worker_by_fd[fd]
-                if not wactive:
-                    self.idle_workers.remove(w)
-                self.cworkers -= 1
-                w.close()
-                del w
-                self._create_worker(n)  # (unless shutting down)!!
-
-    def find_available_worker(self) -> Optional[Worker]:
+        poll([self], timeout)
+
+    def _handle(self, fd: int) -> None:
+        """
+        called from poll when Worker socket fd is readable
+        """
+        w: Worker = self.worker_by_fd[fd]
+        ok, ret = w.recv()
+        if wactive := w.wactive:
+            self.active_workers -= 1
+            w.wactive = False
+            self.idle_workers.append(w)
+
+        if ok:
+            if (m := ret.get('method')):
+                # if Worker <method>_done method exists,
+                # call it (in Manager process)
+                if (done := getattr(w, m + '_done', None)):
+                    done(ret)
+        else:               # saw EOF (from child exit)
+            n = w.n         # get slot
+            logger.info(f"saw EOF on fd {fd} (worker {n})")  # XXX warning?
+            del self.worker_by_fd[fd]
+            if not wactive:
+                self.idle_workers.remove(w)
+            self.cworkers -= 1
+            self._forget_affinity(w)
+            w.close()
+            del w
+            self._create_worker(n)  # (unless shutting down)!!
+
+    def find_available_worker(self,
+                              affinity: Hashable = None) -> Optional[Worker]:
+        """
+        return an idle Worker, or None.
+        If `affinity` is passed, and the Worker that last did work
+        for that key (see set_affinity) is idle, return it.
+        """
         if len(self.idle_workers) == 0:
             return None
+        if affinity is not None:
+            w = self.affine_worker(affinity)
+            if w is not None and not w.wactive:
+                return w
         return self.idle_workers[0]  # removed by Worker.call
 
+    def affine_worker(self, affinity: Hashable) -> Optional[Worker]:
+        """
+        return the (live) Worker that did work for key `affinity`
+        within the last affinity_secs seconds (or None).
+        """
+        if affinity is None or self.affinity_secs <= 0:
+            return None
+        entry = self.affinity.get(affinity)
+        if entry is None:
+            return None
+        w, last = entry
+        if time.monotonic() - last > self.affinity_secs:
+            del self.affinity[affinity]
+            return None
+        return w
+
+    def set_affinity(self, affinity: Hashable, w: Worker) -> None:
+        """
+        record that Worker `w` is doing work for key `affinity`
+        """
+        if affinity is None or self.affinity_secs <= 0:
+            return
+        self.affinity[affinity] = (w, time.monotonic())
+        if len(self.affinity) > 4 * self.nworkers * self.affinity_secs:
+            # keep from growing without bound (generous limit,
+            # only reached if Workers average over 4 keys/second)
+            self._expire_affinity()
+
+    def _expire_affinity(self) -> None:
+        oldest = time.monotonic() - self.affinity_secs
+        self.affinity = {key: entry for key, entry in self.affinity.items()
+                         if entry[1] >= oldest}
+
+    def _forget_affinity(self, w: Worker) -> None:
+        """called when Worker w has exited"""
+        self.affinity = {key: entry for key, entry in self.affinity.items()
+                         if entry[0] is not w}
+
     def close_all(self, timeout: Optional[float] = None) -> None:
         for w in self.worker_by_fd.values():
             w.shut_wr()         # close for write
@@ -288,6 +391,21 @@ class Manager:
         self.close_all(timeout)
 
 
+def poll(managers: List[Manager], timeout: Optional[float] = None) -> None:
+    """
+    wait up to timeout seconds for results (or EOF) from the Workers
+    of any of the Managers, calling back <method>_done methods
+    """
+    fds: Dict[int, Manager] = {}
+    for m in managers:
+        for fd in m.worker_by_fd:
+            fds[fd] = m
+    r, w_, x_ = select.select(fds.keys(), [], [], timeout)
+    # print("r:", r)
+    for fd in r:
+        fds[fd]._handle(fd)
+
+
 if __name__ == '__main__':
     import time
 
@@ -0,0 +1,119 @@
+"""
+Per-process DNS (getaddrinfo) cache for Worker processes.
+
+Every fetch used to resolve its hostname from scratch, and failing
+hosts were looked up again on every retry.  install() replaces
+socket.getaddrinfo (used by urllib3, and hence requests) with a
+caching wrapper.
+
+The system resolver interface does not return record TTLs, so
+successful lookups are kept for a configured time (DNS_CACHE_SECS),
+which should be no more than typical TTLs.  "Name or service not
+known" (NXDOMAIN) results are cached for DNS_NEGATIVE_CACHE_SECS, and
+re-raised as the same socket.gaierror (so the error is categorized
+the same way by tasks.request_exception_to_status).  Temporary
+failures (EAI_AGAIN) are never cached.
+
+Each Worker keeps its own cache; with fetches steered to the Worker
+that last fetched from a host (see scripts/fetcher.py) that's where
+the repeat lookups happen.
+"""
+
+import logging
+import socket
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+from fetcher.config import conf
+from fetcher.stats import Stats
+
+logger = logging.getLogger(__name__)
+
+# getaddrinfo return type:
+AddrInfo = List[Tuple[Any, ...]]
+
+
+class _Entry(NamedTuple):
+    expires: float              # time.monotonic()
+    result: Optional[AddrInfo]  # None for negative entry
+    errno: int = 0              # for negative entry
+    strerror: str = ''          # for negative entry
+
+
+class DNSCache:
+    """
+    LRU cache of getaddrinfo results with positive and negative
+    expiration times.
+    """
+
+    def __init__(self,
+                 getaddrinfo: Callable[..., AddrInfo],
+                 secs: float,
+                 negative_secs: float,
+                 max_entries: int):
+        self.getaddrinfo = getaddrinfo
+        self.secs = secs
+        self.negative_secs = negative_secs
+        self.max_entries = max_entries
+        self.cache: OrderedDict[Tuple[Any, ...], _Entry] = OrderedDict()
+
+    def _stat(self, status: str) -> None:
+        Stats.get().incr('dns.lookups', labels=[('stat', status)])
+
+    def lookup(self, host: Any, port: Any, family: int = 0,
+               type: int = 0, proto: int = 0, flags: int = 0) -> AddrInfo:
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.expires > now:
+                self.cache.move_to_end(key)
+                if entry.result is None:
+                    self._stat('neg_hit')
+                    raise socket.gaierror(entry.errno, entry.strerror)
+                self._stat('hit')
+                return entry.result
+            del self.cache[key]
+
+        t0 = time.monotonic()
+        try:
+            result = self.getaddrinfo(host, port, family, type, proto, flags)
+        except socket.gaierror as e:
+            Stats.get().timing('dns.time', time.monotonic() - t0)
+            if e.errno == socket.EAI_NONAME and self.negative_secs > 0:
+                self._stat('neg_miss')
+                self._store(key, _Entry(now + self.negative_secs, None,
+                                        e.errno, e.strerror or ''))
+            else:
+                self._stat('fail')  # not cached
+            raise
+        Stats.get().timing('dns.time', time.monotonic() - t0)
+        self._stat('miss')
+        self._store(key, _Entry(now + self.secs, result))
+        return result
+
+    def _store(self, key: Tuple[Any, ...], entry: _Entry) -> None:
+        self.cache[key] = entry
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)  # discard least recently used
+
+
+_cache: Optional[DNSCache] = None
+
+
+def install() -> None:
+    """
+    Install caching getaddrinfo in the current process.
+    Call in Worker process only (safe to call more than once).
+    """
+    global _cache
+    secs = conf.DNS_CACHE_SECS
+    if _cache is not None or secs <= 0:
+        return
+
+    _cache = DNSCache(socket.getaddrinfo, secs,
+                      conf.DNS_NEGATIVE_CACHE_SECS,
+                      conf.DNS_CACHE_ENTRIES)
+    setattr(socket, 'getaddrinfo', _cache.lookup)
+    logger.debug("DNS cache installed")
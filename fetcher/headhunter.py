@@ -22,26 +22,34 @@ fetcher.py can sleep an appropriate amount of time).
 Keep Items between "refills" so that scoreboard.py can track
 dependencies!!!
 
+When more feeds are ready than are fetched (queried) at once
+(backlogged), and RSS_FETCH_VALUE_ORDER is set, refill orders feeds
+by "value" (expected new stories waiting) rather than by
+next_fetch_attempt, so that when capacity is short, it goes to
+productive feeds first.
+
 See scoreboard.py for more!
 """
 
+import datetime as dt
 import logging
 import time
-from typing import Dict, List, NamedTuple, Optional
+from typing import Any, Dict, List, NamedTuple, Optional
 
 # PyPI
-from sqlalchemy import func, select
+from sqlalchemy import ColumnElement, case, func, null, select
 
 # app:
 from fetcher.config import conf
 from fetcher.database import Session, SessionType
-from fetcher.database.models import Feed
+from fetcher.database.models import FEED_VERSION, Feed, FeedState, utc
 from fetcher.scoreboard import ScoreBoard
 from fetcher.stats import Stats
 
 # read at startup, for logging
 RSS_FETCH_FEED_CONCURRENCY = conf.RSS_FETCH_FEED_CONCURRENCY
 RSS_FETCH_FEED_SECS = conf.RSS_FETCH_FEED_SECS
+RSS_FETCH_VALUE_ORDER = conf.RSS_FETCH_VALUE_ORDER
 
 logger = logging.getLogger(__name__)
 
@@ -57,8 +65,18 @@ DB_READY_SEC = 60
 
 DB_READY_LIMIT = conf.RSS_FETCH_READY_LIMIT
 
-ITEM_COL_NAMES = ['id', 'sources_id', 'url']
-ITEM_COLS = [getattr(Feed, col) for col in ITEM_COL_NAMES]
+# everything fetch_and_process_feed needs from the feed
+# (so Workers start fetching without a database query):
+FEED_ITEM_COL_NAMES = ['id', 'sources_id', 'url', 'rss_title',
+                       'update_minutes']
+STATE_ITEM_COL_NAMES = ['next_fetch_attempt', 'last_fetch_hash',
+                        'last_entries_hash', 'http_etag',
+                        'http_last_modified', 'http_trust',
+                        'document_bytes']
+ITEM_COL_NAMES = FEED_ITEM_COL_NAMES + STATE_ITEM_COL_NAMES + ['version']
+ITEM_COLS = ([getattr(Feed, col) for col in FEED_ITEM_COL_NAMES] +
+             [getattr(FeedState, col) for col in STATE_ITEM_COL_NAMES] +
+             [FEED_VERSION])
 
 
 class Item(NamedTuple):
@@ -66,8 +84,20 @@ class Item(NamedTuple):
     id: int
     sources_id: int
     url: str
+    rss_title: Optional[str]
+    update_minutes: Optional[int]
+    next_fetch_attempt: Optional[dt.datetime]  # FeedState columns NULL
+    last_fetch_hash: Optional[str]             # if never fetched
+    last_entries_hash: Optional[str]
+    http_etag: Optional[str]
+    http_last_modified: Optional[str]
+    http_trust: Optional[int]
+    document_bytes: Optional[int]
+    version: int                # Feed row version (checked by update_feed)
     # calculated (for scoreboards):
     fqdn: Optional[str]         # None if bad URL
+    # set by scripts/fetcher.py (see fetcher/overload.py):
+    load_factor: float = 1.0    # rescheduling interval multiplier
 
 
 def ready_feeds(session: SessionType) -> int:
@@ -77,7 +107,22 @@ def ready_feeds(session: SessionType) -> int:
 def running_feeds(session: SessionType) -> int:
     return int(
         session.scalar(select(func.count())
-                       .where(Feed.queued.is_(True))))
+                       .where(FeedState.queued.is_(True))))
+
+
+def feed_value(now: dt.datetime) -> ColumnElement[Any]:
+    """
+    expected new stories waiting for a ready feed: story arrival rate
+    estimate (zero if none) times hours since the last successful
+    fetch, lowered for feeds that have been failing.  NULL for feeds
+    never fetched (no FeedState row, or no fetch attempt: new feeds
+    can have a row with a leveled first fetch time).
+    """
+    hours = func.extract('epoch', now - FeedState.last_fetch_success) / 3600
+    return case((FeedState.last_fetch_attempt.is_(None), null()),
+                else_=(func.coalesce(FeedState.arrival_rate, 0.0) *
+                       func.coalesce(hours, 0.0) /
+                       (1 + FeedState.last_fetch_failures)))
 
 
 def fqdn(url: str) -> Optional[str]:
@@ -102,6 +147,7 @@ class HeadHunter:
 
         # make all private?
         self.ready_list: List[Item] = []
+        self.ready: Optional[int] = None  # last db.ready count
         self.next_db_check = 0
         self.fixed = False      # fixed length (command line list)
         self.scoreboards: ScoreBoardsDict = {
@@ -116,39 +162,57 @@ class HeadHunter:
         """
         self.stats.incr('hunter.refill')
 
-        # start DB query
-        nfa = Feed.next_fetch_attempt.asc().nullsfirst()
-        if feeds:
-            q = Feed.select_where_active(*ITEM_COLS)\
-                    .where(Feed.id.in_(feeds),
-                           Feed.queued.is_(False))
-            q = q.order_by(nfa)
-            self.fixed = True
-        else:
-            rank_col = func.row_number()\
-                           .over(partition_by=Feed.sources_id, order_by=nfa)\
-                           .label('rank')
-
-            # Subquery for "rank" from legacy crawler_provider/__init__.py
-            # XXX include next_fetch_attempt for outer query ORDER BY?
-            #   for more accurate ordereding between feeds? does it matter???
-            subq = Feed.select_where_ready(*ITEM_COLS, rank_col)
-            # print("subq", subq)
-            subq_cols = [getattr(subq.c, col) for col in ITEM_COL_NAMES]
-            max_rank = (DB_READY_SEC // RSS_FETCH_FEED_SECS *
-                        RSS_FETCH_FEED_CONCURRENCY)
-            q = select(*subq_cols, subq.c.rank)\
-                .where(subq.c.rank <= max_rank)\
-                .order_by(subq.c.rank)\
-                .limit(DB_READY_LIMIT)
-            # print("q", q)
         self.ready_list = []
         with Session() as session:
-            self.get_ready(session)  # send stats
+            ready = self.get_ready(session)  # send stats
+
+            # start DB query
+            nfa = FeedState.next_fetch_attempt.asc().nullsfirst()
+            if feeds:
+                q = Feed.select_where_active(*ITEM_COLS)\
+                        .outerjoin_from(Feed, FeedState,
+                                        FeedState.feed_id == Feed.id)\
+                        .where(Feed.id.in_(feeds),
+                               FeedState.queued.is_not(True))
+                q = q.order_by(nfa)
+                self.fixed = True
+            else:
+                # more feeds ready than will be fetched from this refill?
+                backlog = ready > DB_READY_LIMIT
+                self.stats.gauge('hunter.backlog', int(backlog))
+                value_order = backlog and RSS_FETCH_VALUE_ORDER
+                value_col = feed_value(utc()).label('value')
+                if value_order:
+                    # never fetched first, then most valuable
+                    order = [value_col.desc().nullsfirst(), nfa]
+                else:
+                    order = [nfa]
+
+                rank_col = func.row_number()\
+                               .over(partition_by=Feed.sources_id,
+                                     order_by=order)\
+                               .label('rank')
+
+                # Subquery for "rank" from legacy crawler_provider/__init__.py
+                # XXX include next_fetch_attempt for outer query ORDER BY?
+                #   for more accurate ordereding between feeds? does it matter???
+                subq = Feed.select_where_ready(*ITEM_COLS, rank_col, value_col)
+                # print("subq", subq)
+                subq_cols = [getattr(subq.c, col) for col in ITEM_COL_NAMES]
+                max_rank = (DB_READY_SEC // RSS_FETCH_FEED_SECS *
+                            RSS_FETCH_FEED_CONCURRENCY)
+                q = select(*subq_cols, subq.c.rank)\
+                    .where(subq.c.rank <= max_rank)
+                if value_order:
+                    q = q.order_by(subq.c.rank,
+                                   subq.c.value.desc().nullsfirst())
+                else:
+                    q = q.order_by(subq.c.rank)
+                q = q.limit(DB_READY_LIMIT)
+                # print("q", q)
 
             for feed in session.execute(q):
-                # NOTE! columns here needs to be in FEED_COL_NAMES!!!
-                d = Item(id=feed.id, sources_id=feed.sources_id, url=feed.url,
+                d = Item(**{col: getattr(feed, col) for col in ITEM_COL_NAMES},
                          # calculated:
                          fqdn=fqdn(feed.url))
                 self.ready_list.append(d)
@@ -248,17 +312,21 @@ class HeadHunter:
             logger.debug(f"  completed {sbname} {itemval}")
             sb.completed(itemval)
 
-    def get_ready(self, session: SessionType) -> None:
+    def get_ready(self, session: SessionType) -> int:
+        """
+        send ready and running stats; returns ready count
+        """
         # XXX keep timer to avoid querying too often??
         self.stats.incr('hunter.get_ready')
 
-        ready = ready_feeds(session)
+        self.ready = ready = ready_feeds(session)
         self.stats.gauge('db.ready', ready)
         # print("db.ready", ready)
 
         running = running_feeds(session)
         self.stats.gauge('db.running', running)
         # print("db.running", running)
+        return ready
 
     def on_hand_stats(self) -> None:
         self.stats.gauge('on_hand', x := self.on_hand())
@@ -0,0 +1,118 @@
+"""
+Load leveling of feed fetch times.
+
+Rescheduling at exactly now + next_minutes preserves clumps (from
+imports, mass "fetch soon" requests, outage recovery) that recur
+every poll period.  A Leveler keeps a coarse histogram of scheduled
+fetches (FeedState.next_fetch_attempt) in BUCKET_MINS buckets, and
+places each new fetch time in the least loaded bucket within a
+tolerance window around the ideal time, so peaks flatten over time.
+
+Each process that reschedules feeds has its own Leveler: the
+histogram is reloaded from the database every REFRESH_SECS, and
+between reloads, only counts that process's own placements, so
+processes placing in parallel all see the same least loaded bucket.
+Ties are broken at random (the random module is reseeded in forked
+children) so they don't all pile into it, and tasks only levels in
+the (one or few) processes that write batched completions
+(RSS_FETCH_COMPLETION_MS).
+
+Used by tasks._apply_update (when SCHEDULE_LEVEL_PERCENT is set), and
+to spread first fetches of new feeds (admit).
+"""
+
+import datetime as dt
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import func, select
+
+from fetcher.database import Session
+from fetcher.database.models import FeedState
+
+# histogram bucket size
+BUCKET_MINS = 5
+
+# seconds between reloads of histogram from database
+REFRESH_SECS = 5 * 60
+
+# extract('epoch') of a timestamp without time zone
+# counts from here (treating value as UTC):
+EPOCH = dt.datetime(1970, 1, 1)
+
+logger = logging.getLogger(__name__)
+
+
+class Leveler:
+    def __init__(self, bucket_mins: int = BUCKET_MINS):
+        self.bucket_secs = bucket_mins * 60
+        self.counts: Dict[int, int] = {}  # bucket number to fetches
+        self.next_refresh = 0.0
+
+    def bucket(self, when: dt.datetime) -> int:
+        return int((when - EPOCH).total_seconds() // self.bucket_secs)
+
+    def bucket_start(self, bucket: int) -> dt.datetime:
+        return EPOCH + dt.timedelta(seconds=bucket * self.bucket_secs)
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        reload histogram of future fetches from database
+        (if REFRESH_SECS have passed, or `force`)
+        """
+        now = time.monotonic()
+        if not force and now < self.next_refresh:
+            return
+        self.next_refresh = now + REFRESH_SECS
+
+        nfa = FeedState.next_fetch_attempt
+        bucket = func.floor(func.extract('epoch', nfa) / self.bucket_secs)
+        with Session() as session:
+            rows = session.execute(
+                select(bucket, func.count())
+                .where(nfa > dt.datetime.utcnow())
+                .group_by(bucket))
+            self.counts = {int(b): count for b, count in rows}
+        logger.debug("leveler: %d buckets, %d fetches",
+                     len(self.counts), sum(self.counts.values()))
+
+    def place(self, ideal: dt.datetime, tolerance: dt.timedelta,
+              earliest: Optional[dt.datetime] = None) -> dt.datetime:
+        """
+        Return a time within `tolerance` of `ideal` (and not before
+        `earliest`) in the least loaded bucket (`ideal` itself if its
+        bucket is one, else a random one), and count it.
+        """
+        low = ideal - tolerance
+        if earliest is not None and low < earliest:
+            low = earliest
+        high = ideal + tolerance
+        if ideal < low:
+            ideal = low
+
+        ib = self.bucket(ideal)
+        buckets = range(self.bucket(low), self.bucket(high) + 1)
+        least = min(self.counts.get(b, 0) for b in buckets)
+        if self.counts.get(ib, 0) == least:
+            best = ib
+        else:
+            best = random.choice(
+                [b for b in buckets if self.counts.get(b, 0) == least])
+        self.counts[best] = self.counts.get(best, 0) + 1
+
+        if best == ib:
+            return ideal
+        if best < ib:
+            # end of the earlier bucket
+            return self.bucket_start(best + 1) - dt.timedelta(seconds=1)
+        return self.bucket_start(best)
+
+    def admit(self, now: dt.datetime, minutes: float) -> dt.datetime:
+        """
+        first fetch time for a new feed: least loaded bucket
+        in the next `minutes`
+        """
+        half = dt.timedelta(minutes=minutes / 2)
+        return self.place(now + half, half, earliest=now)
@@ -0,0 +1,136 @@
+"""
+Overload controller for scripts/fetcher.py: when fetches fall
+behind schedule, stretch all rescheduling intervals by a global
+multiplier (passed to Workers in Item.load_factor), and relax it as
+load drops, so that the fetcher degrades predictably (every feed
+fetched a bit less often) rather than every feed going late.
+
+Signals (collected by the Manager):
+* start delay (issue time minus next_fetch_attempt) of issued feeds
+* latency of the Manager's own database commits
+* db.ready backlog (ready feeds beyond RSS_FETCH_READY_LIMIT)
+
+Once a CONTROL_SECS interval, if the fetcher is overloaded (90th
+percentile start delay over RSS_FETCH_OVERLOAD_DELAY_SECS, slow
+commits, or a growing backlog) for SUSTAIN intervals in a row, the
+multiplier is raised by INCREASE (up to
+RSS_FETCH_OVERLOAD_MAX_PERCENT); when comfortably under (90th
+percentile under half the delay limit, and no backlog) for SUSTAIN
+intervals, it's lowered by RELAX (down to 1).
+"""
+
+import time
+from typing import List, Optional
+
+from fetcher.config import conf
+
+# read at startup, for logging
+DELAY_LIMIT = conf.RSS_FETCH_OVERLOAD_DELAY_SECS
+MAX_PERCENT = conf.RSS_FETCH_OVERLOAD_MAX_PERCENT
+READY_LIMIT = conf.RSS_FETCH_READY_LIMIT
+
+# seconds between evaluations
+CONTROL_SECS = 60
+
+# consecutive intervals in a state before changing the multiplier
+SUSTAIN = 3
+
+# multiplier steps
+INCREASE = 1.25
+RELAX = 0.9
+
+# 90th percentile Manager commit seconds considered slow
+COMMIT_LIMIT_SECS = 1.0
+
+# percentile of samples checked
+PERCENTILE = 90
+
+
+def percentile(samples: List[float], pct: int) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) * pct // 100, len(samples) - 1)]
+
+
+class LoadController:
+    """
+    keeps the multiplier (factor); fed samples by the Manager,
+    check called once per main loop iteration
+    """
+
+    def __init__(self,
+                 delay_limit: float = DELAY_LIMIT,
+                 max_factor: float = MAX_PERCENT / 100,
+                 ready_limit: int = READY_LIMIT):
+        self.delay_limit = delay_limit  # zero disables
+        self.max_factor = max(max_factor, 1.0)
+        self.ready_limit = ready_limit
+
+        self.factor = 1.0
+        self.delays: List[float] = []
+        self.commits: List[float] = []
+        self.last_ready: Optional[int] = None
+        self.over = 0           # consecutive overloaded intervals
+        self.under = 0          # consecutive underloaded intervals
+        self.next_check = time.monotonic() + CONTROL_SECS
+
+        # from last check (for stats):
+        self.delay_pct: Optional[float] = None
+        self.commit_pct: Optional[float] = None
+
+    def enabled(self) -> bool:
+        return self.delay_limit > 0
+
+    def delay(self, secs: float) -> None:
+        """record start delay of an issued feed"""
+        if self.enabled():
+            self.delays.append(secs)
+
+    def commit(self, secs: float) -> None:
+        """record time taken by a database commit"""
+        if self.enabled():
+            self.commits.append(secs)
+
+    def check(self, ready: Optional[int], now: Optional[float] = None) -> bool:
+        """
+        called from Manager loop with last db.ready count;
+        returns True if an evaluation was done
+        (once per CONTROL_SECS)
+        """
+        if now is None:
+            now = time.monotonic()
+        if not self.enabled() or now < self.next_check:
+            return False
+        self.next_check = now + CONTROL_SECS
+
+        self.delay_pct = percentile(self.delays, PERCENTILE)
+        self.commit_pct = percentile(self.commits, PERCENTILE)
+        self.delays = []
+        self.commits = []
+
+        slow_commits = (self.commit_pct is not None and
+                        self.commit_pct > COMMIT_LIMIT_SECS)
+        backlog = ready is not None and ready > self.ready_limit
+        growing = (backlog and self.last_ready is not None and
+                   ready is not None and ready > self.last_ready)
+        self.last_ready = ready
+
+        if ((self.delay_pct is not None and self.delay_pct > self.delay_limit)
+                or slow_commits or growing):
+            self.over += 1
+            self.under = 0
+        elif ((self.delay_pct is None or self.delay_pct < self.delay_limit / 2)
+              and not slow_commits and not backlog):
+            self.under += 1
+            self.over = 0
+        else:                   # holding steady
+            self.over = self.under = 0
+
+        if self.over >= SUSTAIN:
+            self.factor = min(self.factor * INCREASE, self.max_factor)
+            self.over = 0
+        elif self.under >= SUSTAIN:
+            self.factor = max(self.factor * RELAX, 1.0)
+            self.under = 0
+        return True
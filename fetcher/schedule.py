@@ -0,0 +1,782 @@
+"""
+Feed rescheduling policy: failure counting and backoff,
+auto-adjust of poll_minutes, and HTTP Retry-After.
+
+schedule() is a pure function (no database access, no clock, no
+logging) used by tasks.update_feed.  The same policy is implemented
+in SQL as the feed_schedule function (SCHEDULE_SQL, below), used by
+the feed_complete function, which does all of update_feed in one
+statement (with the feed locked for only as long as the statement
+runs) when RSS_FETCH_SQL_UPDATE is set.
+
+fetcher/test/test_schedule.py checks that the Python and SQL versions
+agree.  NOTE! Changes to SCHEDULE_SQL or COMPLETE_SQL need a new
+migration (with a frozen copy of the SQL, since migrations must not
+change when this file does) to (re)create the functions!
+
+update_arrivals and predict_minutes maintain a per-feed estimate of
+the story arrival rate, and the poll interval it implies (used when
+ARRIVAL_TARGET_STORIES is set: Python only).  update_arrivals is also
+implemented in SQL (feed_arrivals: ARRIVALS_SQL) for feed_complete.
+
+stretch_minutes applies a feed's hour-of-week activity profile to
+the interval to the next fetch (when ACTIVITY_SCHEDULE is set:
+Python only).
+"""
+
+import datetime as dt
+import math
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from fetcher.config import conf
+
+# make soft errors back off more slowly
+# (not disabling if UNDEAD_FEEDS set)
+SOFT_FAILURE_INCREMENT = 0.5
+
+# non-zero, in case permanent!
+TEMP_FAILURE_INCREMENT = 0.25
+
+# tasks.Status values:
+SUCC = 'Success'
+SOFT = 'Soft error'
+HARD = 'Hard error'
+TEMP = 'Temporary error'
+
+DAY_MINS = 24 * 60
+
+# standard deviations above the estimated arrival rate
+# to allow for when keeping new stories within a feed's window
+ARRIVAL_SIGMAS = 2
+
+# ignore arrival rate observations over shorter intervals
+# (ie; fetch triggered from web UI right after a fetch)
+ARRIVAL_MIN_HOURS = 1 / 60
+
+# FeedState.activity profiles have a byte for each hour of the week
+# (Monday 00:00 UTC first): relative story activity, with
+# ACTIVITY_SCALE as the average for the feed.
+ACTIVITY_HOURS = 7 * 24
+ACTIVITY_SCALE = 64
+
+
+class DupPct:
+    """
+    synthetic dup_pct values for auto-adjust longer
+    (All above 100%)
+
+    Values **NOT** intended to be used for comparison (ie; as "magic"
+    values), which could lead to lots of special case checks.  Add
+    additional args to schedule instead!!!
+    """
+    NO_CHANGE = 101.0
+    NO_STORIES = 102.0
+
+
+class Policy(NamedTuple):
+    """
+    configuration used by schedule
+    (passed to SQL functions as a JSON object)
+    """
+    ACTIVITY_SCHEDULE: bool
+    ARRIVAL_EWMA_PERCENT: int
+    ARRIVAL_TARGET_STORIES: int
+    AUTO_ADJUST_MAX_DELTA_MIN: int
+    AUTO_ADJUST_MAX_DUPLICATE_PERCENT: int
+    AUTO_ADJUST_MAX_POLL_MINUTES: int
+    AUTO_ADJUST_MIN_DUPLICATE_PERCENT: int
+    AUTO_ADJUST_MIN_POLL_MINUTES: int
+    AUTO_ADJUST_MINUTES: int
+    AUTO_ADJUST_SMALL_DAYS: int
+    AUTO_ADJUST_SMALL_MINS: int
+    DEFAULT_INTERVAL_MINS: int
+    FETCH_EVENT_ROWS: int
+    MAX_FAILURES: int
+    MAX_STORIES_PER_FEED: int
+    MAXIMUM_BACKOFF_MINS: int
+    MAXIMUM_INTERVAL_MINS: int
+    SERVER_FRESHNESS_PERCENT: int
+    UNDEAD_FEEDS: bool
+    UNDEAD_FEED_MAX_DAYS: int
+
+    @classmethod
+    def from_conf(cls) -> 'Policy':
+        return cls(**{field: getattr(conf, field) for field in cls._fields})
+
+
+class Schedule(NamedTuple):
+    failures: float                # new last_fetch_failures
+    disable: bool                  # set system_enabled False
+    poll_minutes: Optional[int]    # new poll_minutes
+    next_minutes: Optional[float]  # None if not rescheduled
+    adjust: Optional[str]          # auto-adjust stat (if any)
+
+
+def schedule(policy: Policy,
+             status: str,
+             failures: float,
+             poll_minutes: Optional[int],
+             update_minutes: Optional[int],
+             since_success_min: Optional[float],
+             since_new_days: Optional[int],
+             saved: Optional[int],
+             dup: Optional[int],
+             retry_after_min: Optional[float],
+             predicted_minutes: Optional[int] = None,
+             min_poll_minutes: Optional[int] = None) -> Schedule:
+    """
+    `status` is a tasks.Status value,
+    `failures`, `poll_minutes` and `update_minutes` are current
+    Feed/FeedState values (update_minutes after any update from the
+    fetched document), `since_success_min` is minutes since the
+    previous successful fetch, `since_new_days` is (whole) days since
+    new stories were last seen (or the feed was created), `saved` and
+    `dup` are story counts (None if no change), and `retry_after_min`
+    comes from an HTTP Retry-After header.  If `predicted_minutes`
+    (from predict_minutes) is passed, a successful fetch sets
+    poll_minutes to it (in place of duplicate percentage based
+    auto-adjust: not implemented in feed_schedule).  poll_minutes is
+    never set below `min_poll_minutes` (FeedState.budget_minutes, from
+    scripts/allocate_polls.py: not implemented in feed_schedule).
+
+    Caller adds any randomization to next_minutes.
+    """
+    p = policy
+    adjust = None
+    disable = False
+
+    # get normal feed update period in minutes, one of:
+    # 0. poll_minutes field, if non-NULL
+    # 1. update_minutes value being passed in to update Feed row (from RSS)
+    # 2. update_minutes stored in feed row (if fetch or parse failed)
+    # 3. default
+    # (update_minutes is either a value from feed, or NULL)
+    next_minutes: Optional[float]
+    next_minutes = poll_minutes or update_minutes or p.DEFAULT_INTERVAL_MINS
+
+    if status == SUCC:
+        failures = 0
+    else:
+        if status == HARD:
+            incr = 1.
+        elif status == SOFT:
+            incr = SOFT_FAILURE_INCREMENT
+        else:               # TEMP
+            incr = TEMP_FAILURE_INCREMENT
+        failures += incr
+        if failures >= p.MAX_FAILURES and not p.UNDEAD_FEEDS:
+            disable = True
+            next_minutes = None  # don't reschedule
+
+    if next_minutes is None:
+        return Schedule(failures, disable, poll_minutes, None, None)
+
+    # check if auto-adjust needed, before backoff, or
+    # retry-after, and update poll_minutes.
+
+    if status == SUCC and predicted_minutes is not None:
+        if poll_minutes != predicted_minutes:
+            adjust = 'predict'
+        next_minutes = predicted_minutes
+
+    # Only want to look at results after TWO successful polls IN A ROW,
+    # where second poll happened close to on time (about "next_min" ago),
+    # and so is representative.
+    elif status == SUCC and since_success_min is not None:
+        next_min = int(next_minutes)
+
+        # get delta in minutes from expected/current poll period
+        # negative means polled early, positive means late.
+        # polls tend to be one queue scan period late.
+        delta_min = since_success_min - next_min
+
+        # Original version of auto-adjust only adjusted poll rate
+        # up/shorter/faster to make sure we got enough duplicates to
+        # ensure that there was good duplication/overlap (no missing
+        # stories) between polls, so it calculated the percentage of
+        # duplicates (and not the new/added percentage), and the dup_pct
+        # variable has persisted.
+        if saved is None or dup is None:
+            dup_pct = DupPct.NO_CHANGE
+        else:
+            total = saved + dup  # ignoring "skipped" (bad) urls
+            if total > 0:
+                dup_pct = 100 * dup / total
+            else:
+                dup_pct = DupPct.NO_STORIES
+
+        if dup_pct >= p.AUTO_ADJUST_MAX_DUPLICATE_PERCENT:
+            # too many dups: make poll period longer,
+            # limiting consideration of early polls, but late is ok.
+            if delta_min < -p.AUTO_ADJUST_MAX_DELTA_MIN:
+                adjust = 'early'
+            elif since_new_days is None:
+                adjust = 'no_last'  # should not happen!
+            else:
+                # adjust by smaller increment if:
+                # 1. stories seen in last AUTO_ADJUST_SMALL_DAYS (AASD)
+                # 2. or if no stories ever seen, feed is younger than AASD
+                # 3. or just fetched some stories (should trigger case 1).
+                if since_new_days <= p.AUTO_ADJUST_SMALL_DAYS or dup_pct < 100:
+                    next_min += p.AUTO_ADJUST_SMALL_MINS
+                else:
+                    next_min += p.AUTO_ADJUST_MINUTES
+
+                if next_min > p.AUTO_ADJUST_MAX_POLL_MINUTES:
+                    next_min = p.AUTO_ADJUST_MAX_POLL_MINUTES
+                    adjust = 'max'
+                elif poll_minutes != next_min:
+                    adjust = 'up'
+        elif dup_pct < p.AUTO_ADJUST_MIN_DUPLICATE_PERCENT:
+            # too few dups: make poll period shorter;
+            # early is ok, but too late is not
+            if delta_min > p.AUTO_ADJUST_MAX_DELTA_MIN:
+                adjust = 'late'
+            else:
+                if next_min > p.DEFAULT_INTERVAL_MINS:
+                    # here to bring long poll intervals back to earth quickly
+                    next_min = p.DEFAULT_INTERVAL_MINS
+                    how = 'reset'
+                else:
+                    next_min -= p.AUTO_ADJUST_MINUTES
+                    how = 'down'
+
+                # Saw adjustment down to two minutes for feed 6231
+                # (denverpost top news stories which advertises an update
+                # period of two minutes!), so apply a lower bound!!
+                if update_minutes:
+                    minimum = max(update_minutes,
+                                  p.AUTO_ADJUST_MIN_POLL_MINUTES)
+                else:
+                    minimum = p.AUTO_ADJUST_MIN_POLL_MINUTES
+
+                if next_min < minimum:
+                    next_min = minimum
+                    adjust = 'min'
+                elif poll_minutes != next_min:
+                    adjust = how
+        next_minutes = next_min
+
+    if min_poll_minutes and next_minutes < min_poll_minutes:
+        # keep within fetch budget
+        next_minutes = min_poll_minutes
+        adjust = 'budget' if poll_minutes != min_poll_minutes else None
+
+    poll_minutes = int(next_minutes)
+
+    # kind to servers: with large intervals exponential
+    # backoff (mult = N**failures) is extreme (1x, 2x, 4x, 8x)
+    # so using linear backoff (1x, 2x, 3x, 4x)
+    mult = failures
+
+    # backoff result MUST NOT be less than next_minutes!!
+    # so only apply multiplier when >= 1!
+    if mult >= 1:
+        next_minutes *= mult
+        # cap interval...
+
+        # if never killing feeds, allow larger max once a feed
+        # reaches the point where it would have been disabled.
+        if p.UNDEAD_FEEDS and failures > p.MAX_FAILURES:
+            max_mins = p.UNDEAD_FEED_MAX_DAYS * DAY_MINS
+        else:
+            max_mins = p.MAXIMUM_BACKOFF_MINS
+
+        if next_minutes > max_mins:
+            next_minutes = max_mins
+
+    # Always honor HTTP Retry-After: header if longer
+    # Only passed w/ non-success
+    ram = retry_after_min
+    if ram and ram > next_minutes:
+        # 24 hours not uncommon; saw 317100 sec (88h!) once
+        if ram > DAY_MINS:
+            ram = DAY_MINS  # limit to one day
+        next_minutes = ram
+
+    return Schedule(failures, disable, poll_minutes, next_minutes, adjust)
+
+
+def update_arrivals(policy: Policy,
+                    rate: Optional[float],
+                    var: Optional[float],
+                    new: int,
+                    hours: float,
+                    overflow: bool) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Update a feed's estimate of new stories per hour (an exponentially
+    weighted moving average, and its variance) with `new` stories seen
+    `hours` after the previous successful fetch.  `overflow` means no
+    stories were seen again (some may have been missed), so the
+    observed rate is a lower bound, and the estimate is raised to it.
+
+    Returns (rate, var).
+    """
+    if hours < ARRIVAL_MIN_HOURS:
+        return (rate, var)
+
+    obs = new / hours
+    if rate is None or var is None:
+        return (obs, 0.0)
+
+    alpha = policy.ARRIVAL_EWMA_PERCENT / 100
+    diff = obs - rate
+    incr = alpha * diff
+    rate += incr
+    var = (1 - alpha) * (var + diff * incr)
+    if overflow and obs > rate:
+        rate = obs
+    return (rate, var)
+
+
+def predict_minutes(policy: Policy,
+                    rate: float,
+                    var: float,
+                    entries: Optional[int],
+                    update_minutes: Optional[int]) -> int:
+    """
+    Return poll interval (minutes) at which ARRIVAL_TARGET_STORIES new
+    stories are expected, but (at the upper end of the estimate) no
+    more than (100 - AUTO_ADJUST_MIN_DUPLICATE_PERCENT)% of the feed's
+    window (`entries`, limited by MAX_STORIES_PER_FEED) would be new,
+    between AUTO_ADJUST_MIN_POLL_MINUTES (or update_minutes if larger)
+    and AUTO_ADJUST_MAX_POLL_MINUTES.
+    """
+    p = policy
+    hours = math.inf
+    if rate > 0:
+        hours = p.ARRIVAL_TARGET_STORIES / rate
+
+    window = entries
+    if p.MAX_STORIES_PER_FEED and (not window or window > p.MAX_STORIES_PER_FEED):
+        window = p.MAX_STORIES_PER_FEED
+    high = rate + ARRIVAL_SIGMAS * math.sqrt(max(var, 0.0))
+    if window and high > 0:
+        new_max = window * (100 - p.AUTO_ADJUST_MIN_DUPLICATE_PERCENT) / 100
+        hours = min(hours, new_max / high)
+
+    minimum = max(update_minutes or 0, p.AUTO_ADJUST_MIN_POLL_MINUTES)
+    if hours * 60 < minimum:
+        return minimum
+    if hours * 60 > p.AUTO_ADJUST_MAX_POLL_MINUTES:
+        return p.AUTO_ADJUST_MAX_POLL_MINUTES
+    return int(hours * 60)
+
+
+def stretch_minutes(policy: Policy,
+                    activity: bytes,
+                    start: dt.datetime,
+                    minutes: float,
+                    update_minutes: Optional[int]) -> float:
+    """
+    Return the interval (in minutes) after `start` (UTC) over which
+    the feed's `activity` profile adds up to `minutes` at average
+    activity: longer in quiet hours, shorter in busy ones.  Never
+    below AUTO_ADJUST_MIN_POLL_MINUTES (or update_minutes if larger)
+    or above MAXIMUM_INTERVAL_MINS (unless `minutes` is).
+    """
+    p = policy
+    if len(activity) != ACTIVITY_HOURS:
+        return minutes
+    minimum = max(update_minutes or 0, p.AUTO_ADJUST_MIN_POLL_MINUTES)
+    low = min(minutes, minimum)
+    high = max(minutes, p.MAXIMUM_INTERVAL_MINS)
+
+    hour = start.weekday() * 24 + start.hour
+    span = 60 - start.minute - start.second / 60  # rest of this hour
+    need = minutes * ACTIVITY_SCALE
+    total = 0.0
+    while total < high:
+        level = activity[hour % ACTIVITY_HOURS]
+        if level * span >= need:
+            total += need / level
+            break
+        need -= level * span
+        total += span
+        hour += 1
+        span = 60
+    return min(max(total, low), high)
+
+
+def freshness_floor(policy: Policy,
+                    fresh_minutes: Optional[int],
+                    ttl_minutes: Optional[int]) -> float:
+    """
+    Return minimum minutes to the next fetch after a success:
+    SERVER_FRESHNESS_PERCENT of the longer of the freshness lifetimes
+    given by HTTP headers and RSS <ttl> (zero if neither), up to
+    MAXIMUM_INTERVAL_MINS.
+    """
+    p = policy
+    lifetime = max(fresh_minutes or 0, ttl_minutes or 0)
+    return min(lifetime * p.SERVER_FRESHNESS_PERCENT / 100,
+               p.MAXIMUM_INTERVAL_MINS)
+
+
+def skip_minutes(skip_hours: int,
+                 skip_days: int,
+                 start: dt.datetime,
+                 minutes: float,
+                 maximum: float) -> float:
+    """
+    If `minutes` after `start` (UTC) falls in an hour (bit mask
+    `skip_hours`, bit N for hour N) or day (bit mask `skip_days`, bit
+    0 for Monday) the feed says not to fetch in (RSS <skipHours> and
+    <skipDays>), return minutes to the start of the next hour that
+    isn't skipped, but not above `maximum` (unless `minutes` is).
+    """
+    when = start + dt.timedelta(minutes=minutes)
+    for _ in range(ACTIVITY_HOURS):
+        if not (skip_hours >> when.hour & 1 or
+                skip_days >> when.weekday() & 1):
+            break
+        when = (when.replace(minute=0, second=0, microsecond=0) +
+                dt.timedelta(hours=1))
+    else:
+        return minutes          # whole week skipped: ignore
+    skipped = (when - start).total_seconds() / 60
+    return min(max(skipped, minutes), max(minutes, maximum))
+
+
+# SQL version of schedule (returns a feed_schedule composite).
+SCHEDULE_SQL = """
+CREATE OR REPLACE FUNCTION feed_schedule(
+    p jsonb, status text, failures float8, poll_minutes int,
+    update_minutes int, since_success_min float8, since_new_days int,
+    saved int, dup int, retry_after_min float8,
+    OUT o_failures float8, OUT o_disable boolean, OUT o_poll_minutes int,
+    OUT o_next_minutes float8, OUT o_adjust text)
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    next_minutes float8;
+    next_min int;
+    delta_min float8;
+    dup_pct float8;
+    minimum int;
+    how text;
+    mult float8;
+    max_mins float8;
+    ram float8;
+BEGIN
+    o_adjust := NULL;
+    o_disable := false;
+    next_minutes := coalesce(nullif(poll_minutes, 0), nullif(update_minutes, 0),
+                             (p->>'DEFAULT_INTERVAL_MINS')::int);
+
+    IF status = 'Success' THEN
+        failures := 0;
+    ELSE
+        failures := failures + CASE status WHEN 'Hard error' THEN 1.0
+                                           WHEN 'Soft error' THEN 0.5
+                                           ELSE 0.25 END;
+        IF failures >= (p->>'MAX_FAILURES')::int
+           AND NOT (p->>'UNDEAD_FEEDS')::boolean THEN
+            o_disable := true;
+            next_minutes := NULL;
+        END IF;
+    END IF;
+    o_failures := failures;
+
+    IF next_minutes IS NULL THEN
+        o_poll_minutes := poll_minutes;
+        o_next_minutes := NULL;
+        RETURN;
+    END IF;
+
+    IF status = 'Success' AND since_success_min IS NOT NULL THEN
+        next_min := next_minutes::int;
+        delta_min := since_success_min - next_min;
+
+        IF saved IS NULL OR dup IS NULL THEN
+            dup_pct := 101.0;
+        ELSIF saved + dup > 0 THEN
+            dup_pct := 100.0 * dup / (saved + dup);
+        ELSE
+            dup_pct := 102.0;
+        END IF;
+
+        IF dup_pct >= (p->>'AUTO_ADJUST_MAX_DUPLICATE_PERCENT')::int THEN
+            IF delta_min < -(p->>'AUTO_ADJUST_MAX_DELTA_MIN')::int THEN
+                o_adjust := 'early';
+            ELSIF since_new_days IS NULL THEN
+                o_adjust := 'no_last';
+            ELSE
+                IF since_new_days <= (p->>'AUTO_ADJUST_SMALL_DAYS')::int
+                   OR dup_pct < 100 THEN
+                    next_min := next_min + (p->>'AUTO_ADJUST_SMALL_MINS')::int;
+                ELSE
+                    next_min := next_min + (p->>'AUTO_ADJUST_MINUTES')::int;
+                END IF;
+                IF next_min > (p->>'AUTO_ADJUST_MAX_POLL_MINUTES')::int THEN
+                    next_min := (p->>'AUTO_ADJUST_MAX_POLL_MINUTES')::int;
+                    o_adjust := 'max';
+                ELSIF poll_minutes IS DISTINCT FROM next_min THEN
+                    o_adjust := 'up';
+                END IF;
+            END IF;
+        ELSIF dup_pct < (p->>'AUTO_ADJUST_MIN_DUPLICATE_PERCENT')::int THEN
+            IF delta_min > (p->>'AUTO_ADJUST_MAX_DELTA_MIN')::int THEN
+                o_adjust := 'late';
+            ELSE
+                IF next_min > (p->>'DEFAULT_INTERVAL_MINS')::int THEN
+                    next_min := (p->>'DEFAULT_INTERVAL_MINS')::int;
+                    how := 'reset';
+                ELSE
+                    next_min := next_min - (p->>'AUTO_ADJUST_MINUTES')::int;
+                    how := 'down';
+                END IF;
+                IF coalesce(update_minutes, 0) <> 0 THEN
+                    minimum := greatest(update_minutes,
+                                        (p->>'AUTO_ADJUST_MIN_POLL_MINUTES')::int);
+                ELSE
+                    minimum := (p->>'AUTO_ADJUST_MIN_POLL_MINUTES')::int;
+                END IF;
+                IF next_min < minimum THEN
+                    next_min := minimum;
+                    o_adjust := 'min';
+                ELSIF poll_minutes IS DISTINCT FROM next_min THEN
+                    o_adjust := how;
+                END IF;
+            END IF;
+        END IF;
+        next_minutes := next_min;
+    END IF;
+
+    o_poll_minutes := next_minutes::int;
+
+    mult := failures;
+    IF mult >= 1 THEN
+        next_minutes := next_minutes * mult;
+        IF (p->>'UNDEAD_FEEDS')::boolean
+           AND failures > (p->>'MAX_FAILURES')::int THEN
+            max_mins := (p->>'UNDEAD_FEED_MAX_DAYS')::int * 1440;
+        ELSE
+            max_mins := (p->>'MAXIMUM_BACKOFF_MINS')::int;
+        END IF;
+        IF next_minutes > max_mins THEN
+            next_minutes := max_mins;
+        END IF;
+    END IF;
+
+    ram := retry_after_min;
+    IF coalesce(ram, 0) <> 0 AND ram > next_minutes THEN
+        IF ram > 1440 THEN
+            ram := 1440;
+        END IF;
+        next_minutes := ram;
+    END IF;
+
+    o_next_minutes := next_minutes;
+END
+$$;
+"""
+
+# SQL version of update_arrivals (used by feed_complete)
+ARRIVALS_SQL = """
+CREATE OR REPLACE FUNCTION feed_arrivals(
+    p jsonb, rate float8, var float8, new_stories int, hours float8,
+    overflow boolean,
+    OUT o_rate float8, OUT o_var float8)
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    obs float8;
+    alpha float8;
+    diff float8;
+    incr float8;
+BEGIN
+    o_rate := rate;
+    o_var := var;
+    IF hours < 1.0 / 60 THEN        -- ARRIVAL_MIN_HOURS
+        RETURN;
+    END IF;
+
+    obs := new_stories / hours;
+    IF rate IS NULL OR var IS NULL THEN
+        o_rate := obs;
+        o_var := 0.0;
+        RETURN;
+    END IF;
+
+    alpha := (p->>'ARRIVAL_EWMA_PERCENT')::int / 100.0;
+    diff := obs - rate;
+    incr := alpha * diff;
+    o_rate := rate + incr;
+    o_var := (1 - alpha) * (var + diff * incr);
+    IF overflow AND obs > o_rate THEN
+        o_rate := obs;
+    END IF;
+END
+$$;
+"""
+
+# tasks.update_feed in one statement: returns one row
+# (or none if feed does not exist)
+COMPLETE_SQL = """
+CREATE OR REPLACE FUNCTION feed_complete(
+    p jsonb, p_feed_id bigint, p_start timestamp, p_status text,
+    p_sys_status text, p_note text, p_saved int, p_dup int,
+    p_retry_after_min float8, p_randomize boolean, p_no_change boolean,
+    p_cols jsonb, p_version bigint,
+    OUT next_fetch_attempt timestamp, OUT failures float8,
+    OUT disabled boolean, OUT poll_minutes int, OUT adjust text,
+    OUT updated_refs int, OUT changed boolean)
+RETURNS SETOF record
+LANGUAGE plpgsql AS $$
+DECLARE
+    f feeds%ROWTYPE;
+    st feed_state%ROWTYPE;
+    s record;
+    a record;
+    now_utc timestamp := timezone('utc', clock_timestamp());
+    update_minutes int;
+    new_stories int;
+    event text;
+    seq bigint;
+BEGIN
+    SELECT * INTO f FROM feeds WHERE id = p_feed_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    INSERT INTO feed_state (feed_id) VALUES (p_feed_id)
+        ON CONFLICT DO NOTHING;
+    SELECT * INTO st FROM feed_state WHERE feed_id = p_feed_id FOR UPDATE;
+
+    -- feeds row changed since read by HeadHunter.refill?
+    -- (see tasks.update_feed)
+    changed := p_version IS NOT NULL AND p_version IS DISTINCT FROM
+        (SELECT feeds.xmin::text::bigint FROM feeds WHERE feeds.id = p_feed_id);
+    IF changed THEN
+        UPDATE feed_state SET queued = false
+            WHERE feed_state.feed_id = p_feed_id;
+        next_fetch_attempt := st.next_fetch_attempt;
+        failures := st.last_fetch_failures;
+        disabled := false;
+        poll_minutes := f.poll_minutes;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    -- feed_col_updates apply before policy: keys naming feed_state
+    -- columns go to st (written back below), the rest are feeds columns
+    update_minutes := CASE WHEN p_cols ? 'update_minutes'
+                           THEN (p_cols->>'update_minutes')::int
+                           ELSE f.update_minutes END;
+    st := jsonb_populate_record(st, p_cols);
+
+    -- update story arrival rate estimate (see schedule.update_arrivals)
+    IF p_status = 'Success' AND st.last_fetch_success IS NOT NULL THEN
+        new_stories := CASE WHEN p_no_change THEN 0 ELSE p_saved END;
+        IF new_stories IS NOT NULL THEN
+            SELECT * INTO a FROM feed_arrivals(
+                p, st.arrival_rate, st.arrival_var, new_stories,
+                extract(epoch FROM now_utc - st.last_fetch_success) / 3600,
+                new_stories > 0 AND coalesce(p_dup = 0, false));
+            st.arrival_rate := a.o_rate;
+            st.arrival_var := a.o_var;
+        END IF;
+    END IF;
+
+    SELECT * INTO s FROM feed_schedule(
+        p, p_status, st.last_fetch_failures, f.poll_minutes, update_minutes,
+        extract(epoch FROM now_utc - st.last_fetch_success) / 60,
+        floor(extract(epoch FROM now_utc -
+                      coalesce(st.last_new_stories, f.created_at))
+              / 86400)::int,
+        p_saved, p_dup, p_retry_after_min);
+
+    next_fetch_attempt := st.next_fetch_attempt;
+    IF s.o_next_minutes IS NOT NULL THEN
+        next_fetch_attempt := now_utc + make_interval(
+            secs => (s.o_next_minutes +
+                     CASE WHEN p_randomize THEN random() * 60 ELSE 0 END) * 60);
+    END IF;
+
+    UPDATE feed_state SET
+        queued = false,
+        last_fetch_attempt = p_start,
+        last_fetch_success = CASE WHEN p_status = 'Success' THEN p_start
+                                  ELSE st.last_fetch_success END,
+        system_status = p_sys_status,
+        last_fetch_failures = s.o_failures,
+        next_fetch_attempt = feed_complete.next_fetch_attempt,
+        -- every column fetches maintain (not those set by scripts):
+        last_fetch_hash = st.last_fetch_hash,
+        last_entries_hash = st.last_entries_hash,
+        http_etag = st.http_etag,
+        http_last_modified = st.http_last_modified,
+        http_304 = st.http_304,
+        http_trust = st.http_trust,
+        document_bytes = st.document_bytes,
+        last_new_stories = st.last_new_stories,
+        arrival_rate = st.arrival_rate,
+        arrival_var = st.arrival_var,
+        entry_count = st.entry_count,
+        fresh_minutes = st.fresh_minutes,
+        ttl_minutes = st.ttl_minutes,
+        skip_hours = st.skip_hours,
+        skip_days = st.skip_days
+    WHERE feed_state.feed_id = p_feed_id;
+
+    -- only write feeds row if something changed
+    UPDATE feeds SET
+        poll_minutes = s.o_poll_minutes,
+        system_enabled = f.system_enabled AND NOT s.o_disable,
+        update_minutes = feed_complete.update_minutes,
+        rss_title = CASE WHEN p_cols ? 'rss_title'
+                         THEN p_cols->>'rss_title' ELSE f.rss_title END
+    WHERE feeds.id = p_feed_id
+      AND (feeds.poll_minutes, feeds.system_enabled, feeds.update_minutes,
+           feeds.rss_title)
+          IS DISTINCT FROM
+          (s.o_poll_minutes, f.system_enabled AND NOT s.o_disable,
+           feed_complete.update_minutes,
+           CASE WHEN p_cols ? 'rss_title'
+                THEN p_cols->>'rss_title' ELSE f.rss_title END);
+
+    -- see tasks.save_fetch_events
+    -- (constraint names: column names are ambiguous with variables)
+    event := CASE WHEN p_status = 'Success' THEN 'fetch_succeeded'
+                  WHEN s.o_disable THEN 'fetch_disabled'
+                  ELSE 'fetch_failed' END;
+    SELECT coalesce(max(e.seq), 0) + 1 INTO seq
+        FROM fetch_events e WHERE e.feed_id = p_feed_id;
+    INSERT INTO fetch_events (feed_id, slot, seq, event, note, created_at)
+        VALUES (p_feed_id, seq % (p->>'FETCH_EVENT_ROWS')::int, seq,
+                event, p_note, p_start)
+        ON CONFLICT ON CONSTRAINT fetch_events_pkey DO UPDATE
+        SET seq = excluded.seq, event = excluded.event,
+            note = excluded.note, created_at = excluded.created_at;
+    INSERT INTO fetch_event_days (feed_id, day, event, count)
+        VALUES (p_feed_id, p_start::date, event, 1)
+        ON CONFLICT ON CONSTRAINT fetch_event_days_pkey DO UPDATE
+        SET count = fetch_event_days.count + 1;
+
+    updated_refs := NULL;
+    IF st.last_fetch_success IS NOT NULL AND p_no_change THEN
+        UPDATE feed_generations g SET seen_at = p_start
+            WHERE g.feed_id = p_feed_id
+              AND g.gen = (SELECT max(gen) FROM feed_generations
+                           WHERE feed_generations.feed_id = p_feed_id);
+        IF NOT FOUND THEN
+            UPDATE story_refs r SET seen_at = p_start
+                WHERE r.feed_id = p_feed_id AND r.gen IS NULL
+                  AND r.seen_at = st.last_fetch_success;
+            GET DIAGNOSTICS updated_refs = ROW_COUNT;
+        END IF;
+    END IF;
+
+    failures := s.o_failures;
+    disabled := s.o_disable;
+    poll_minutes := s.o_poll_minutes;
+    adjust := s.o_adjust;
+    RETURN NEXT;
+END
+$$;
+"""
+
+
+def policy_json(policy: Policy) -> Dict[str, Any]:
+    """
+    return policy as dict for the SQL functions' jsonb argument
+    """
+    return policy._asdict()
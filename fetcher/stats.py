@@ -149,6 +149,16 @@ class Stats:
         """
         self.timing(name, td.total_seconds(), labels)
 
+    def histogram(self, name: str, value: float,
+                  labels: List[Tuple[str, Any]] = []) -> None:
+        """
+        Report a value (ie; a size) for distribution statistics.
+        Sent as a statsd timer (which reports percentiles, mean,
+        upper etc), but WITHOUT scaling to ms.
+        """
+        if self.statsd:
+            self.statsd.timing(self._name(name, labels), value)
+
 
 if __name__ == '__main__':
     s = Stats.init('foo')
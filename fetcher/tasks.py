@@ -9,6 +9,7 @@ JobTimeoutException.
 """
 
 import datetime as dt
+import email.utils
 import hashlib
 import http.client
 import json
@@ -16,11 +17,16 @@ import logging
 import logging.handlers
 import os
 import random
+import re
+import struct
 import time
+import uuid
 import warnings
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, NamedTuple, Optional, Tuple, cast
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Set, Tuple, cast)
 from urllib.parse import urlsplit
 
 # PyPI
@@ -34,20 +40,33 @@ import requests
 import requests.exceptions
 from mcmetadata.requests_arcana import insecure_requests_session
 from mcmetadata.webpages import MEDIA_CLOUD_USER_AGENT
-from psycopg.errors import UniqueViolation
+from psycopg.errors import DeadlockDetected
 # NOTE! All references to rq belong in queue.py!
-from sqlalchemy import literal, select, update
-from sqlalchemy.exc import IntegrityError, PendingRollbackError
+from sqlalchemy import (BigInteger, DateTime, column, func, select, text,
+                        update, values)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased
 from urllib3.exceptions import InsecureRequestWarning
 
+import fetcher.dnscache as dnscache
 import fetcher.path as path
 import fetcher.util as util
 # feed fetcher:
+from fetcher.bloom import BloomFilter
+from fetcher.conditional import (STALE, check_validators, new_trust,
+                                 use_conditional)
 from fetcher.config import conf
 from fetcher.database import Session, SessionType, result_rowcount
-from fetcher.database.models import Feed, FetchEvent, Story, StoryRef, utc
+from fetcher.database.models import (FEED_VERSION, Feed, FeedGeneration,
+                                     FeedState, FetchEvent, FetchEventDay,
+                                     SeenEntries, Story, StoryRef, utc)
 from fetcher.direct import JobTimeoutException, set_job_timeout
 from fetcher.headhunter import Item
+from fetcher.leveler import Leveler
+from fetcher.schedule import (Policy, freshness_floor, policy_json,
+                              predict_minutes, schedule, skip_minutes,
+                              stretch_minutes, update_arrivals)
 from fetcher.stats import Stats
 
 # Increase Python3 http header limit (default is 100):
@@ -58,28 +77,6 @@ setattr(http.client, '_MAXHEADERS', 1000)
 LOG_AT_INFO = {'update_minutes', 'rss_title'}
 
 
-# make soft errors back off more slowly
-# (not disabling if UNDEAD_FEEDS set)
-SOFT_FAILURE_INCREMENT = 0.5
-
-
-# non-zero, in case permanent!
-TEMP_FAILURE_INCREMENT = 0.25
-
-
-class DupPct:
-    """
-    synthetic dup_pct values passed to _check_auto_adjust_longer
-    (All above 100%)
-
-    Values **NOT** intended to be used for comparison (ie; as "magic"
-    values), which could lead to lots of special case checks.  Add
-    additional args to _check_auto_adjust_longer instead!!!
-    """
-    NO_CHANGE = 101.0
-    NO_STORIES = 102.0
-
-
 class Status(Enum):
     # .value used for logging:
     SUCC = 'Success'            # success
@@ -110,6 +107,12 @@ class Update(NamedTuple):
     retry_after_min: Optional[float] = None
     randomize: bool = False     # (could now add to retry_after)
     no_change: bool = False     # feed document did not change
+    # stories to save (passed to writer process):
+    ingest: Optional['Ingest'] = None
+    # Item.version (Feed row version when read, checked by update_feed)
+    version: Optional[int] = None
+    # Item.load_factor (overload multiplier for rescheduling interval)
+    load_factor: float = 1.0
 
 
 def NoUpdate(counter: str) -> Update:
@@ -139,6 +142,9 @@ class ParsedFeed:
     feed_title: str | None
     updatefrequency: str | None
     updateperiod: str | None
+    ttl: str | None = None
+    skip_hours: int = 0         # bit per UTC hour
+    skip_days: int = 0          # bit per day (Monday is bit 0)
 
 
 # HTTP status codes to consider "soft" errors:
@@ -151,39 +157,65 @@ logger = logging.getLogger(__name__)  # get_task_logger(__name__)
 # force logging on startup (actual logging deferred)
 # see fetcher/config.py for descriptions
 # please keep alphabetical:
-AUTO_ADJUST_MAX_DELTA_MIN = conf.AUTO_ADJUST_MAX_DELTA_MIN
-AUTO_ADJUST_MAX_DUPLICATE_PERCENT = conf.AUTO_ADJUST_MAX_DUPLICATE_PERCENT
-AUTO_ADJUST_MIN_DUPLICATE_PERCENT = conf.AUTO_ADJUST_MIN_DUPLICATE_PERCENT
-if AUTO_ADJUST_MIN_DUPLICATE_PERCENT >= AUTO_ADJUST_MAX_DUPLICATE_PERCENT:
-    logger.error(f"AUTO_ADJUST_MIN_DUPLICATE_PERCENT ({AUTO_ADJUST_MIN_DUPLICATE_PERCENT}) >= "
-                 f"AUTO_ADJUST_MAX_DUPLICATE_PERCENT ({AUTO_ADJUST_MAX_DUPLICATE_PERCENT})")
-
-AUTO_ADJUST_MAX_POLL_MINUTES = conf.AUTO_ADJUST_MAX_POLL_MINUTES
-AUTO_ADJUST_MIN_POLL_MINUTES = conf.AUTO_ADJUST_MIN_POLL_MINUTES
-AUTO_ADJUST_MINUTES = conf.AUTO_ADJUST_MINUTES
-AUTO_ADJUST_SMALL_DAYS = conf.AUTO_ADJUST_SMALL_DAYS
-AUTO_ADJUST_SMALL_MINS = conf.AUTO_ADJUST_SMALL_MINS
-
+DEDUP_FILTER_MBYTES = conf.DEDUP_FILTER_MBYTES
 DEFAULT_INTERVAL_MINS = conf.DEFAULT_INTERVAL_MINS
+FETCH_EVENT_ROWS = conf.FETCH_EVENT_ROWS
 HTTP_CONDITIONAL_FETCH = conf.HTTP_CONDITIONAL_FETCH
-MAX_FAILURES = conf.MAX_FAILURES
+HTTP_CONDITIONAL_TRUST = conf.HTTP_CONDITIONAL_TRUST
+MAX_DOCUMENT_BYTES = conf.MAX_DOCUMENT_BYTES
 MAX_STORIES_PER_FEED = conf.MAX_STORIES_PER_FEED
 MAX_URL = conf.MAX_URL
-MAXIMUM_BACKOFF_MINS = conf.MAXIMUM_BACKOFF_MINS
 MAXIMUM_INTERVAL_MINS = conf.MAXIMUM_INTERVAL_MINS
-MINIMUM_INTERVAL_MINS = conf.MINIMUM_INTERVAL_MINS
 NORMALIZED_TITLE_DAYS = conf.NORMALIZED_TITLE_DAYS
+RSS_FETCH_COMPLETION_MS = conf.RSS_FETCH_COMPLETION_MS
+RSS_FETCH_SQL_UPDATE = conf.RSS_FETCH_SQL_UPDATE
 RSS_FETCH_TIMEOUT_SECS = conf.RSS_FETCH_TIMEOUT_SECS
+RSS_FETCH_WRITERS = conf.RSS_FETCH_WRITERS
+SCHEDULE_LEVEL_PERCENT = conf.SCHEDULE_LEVEL_PERCENT
 SAVE_RSS_FILES = conf.SAVE_RSS_FILES
 SAVE_PARSE_ERRORS = conf.SAVE_PARSE_ERRORS
 SAVE_STORY_MAX_SEC = conf.SAVE_STORY_MAX_SEC
 SAVE_STORY_MIN_SEC = conf.SAVE_STORY_MIN_SEC
 SAVE_STORY_SEC = conf.SAVE_STORY_MS / 1000
 SKIP_HOME_PAGES = conf.SKIP_HOME_PAGES
-UNDEAD_FEEDS = conf.UNDEAD_FEEDS
-UNDEAD_FEED_MAX_DAYS = conf.UNDEAD_FEED_MAX_DAYS
+TITLE_CACHE_ENTRIES = conf.TITLE_CACHE_ENTRIES
 VERIFY_CERTIFICATES = conf.VERIFY_CERTIFICATES
 
+# rescheduling policy (see fetcher/schedule.py)
+POLICY = Policy.from_conf()
+if POLICY.AUTO_ADJUST_MIN_DUPLICATE_PERCENT >= POLICY.AUTO_ADJUST_MAX_DUPLICATE_PERCENT:
+    logger.error(f"AUTO_ADJUST_MIN_DUPLICATE_PERCENT ({POLICY.AUTO_ADJUST_MIN_DUPLICATE_PERCENT}) >= "
+                 f"AUTO_ADJUST_MAX_DUPLICATE_PERCENT ({POLICY.AUTO_ADJUST_MAX_DUPLICATE_PERCENT})")
+if POLICY.ARRIVAL_TARGET_STORIES and RSS_FETCH_SQL_UPDATE:
+    logger.warning("ARRIVAL_TARGET_STORIES not used with RSS_FETCH_SQL_UPDATE")
+if POLICY.ACTIVITY_SCHEDULE and RSS_FETCH_SQL_UPDATE:
+    logger.warning("ACTIVITY_SCHEDULE not used with RSS_FETCH_SQL_UPDATE")
+if conf.RSS_FETCH_OVERLOAD_DELAY_SECS and RSS_FETCH_SQL_UPDATE:
+    logger.warning(
+        "RSS_FETCH_OVERLOAD_DELAY_SECS not used with RSS_FETCH_SQL_UPDATE")
+if SCHEDULE_LEVEL_PERCENT and RSS_FETCH_SQL_UPDATE:
+    logger.warning("SCHEDULE_LEVEL_PERCENT not used with RSS_FETCH_SQL_UPDATE")
+elif SCHEDULE_LEVEL_PERCENT and not RSS_FETCH_COMPLETION_MS:
+    logger.warning(
+        "SCHEDULE_LEVEL_PERCENT not used without RSS_FETCH_COMPLETION_MS")
+if POLICY.SERVER_FRESHNESS_PERCENT and RSS_FETCH_SQL_UPDATE:
+    logger.warning(
+        "SERVER_FRESHNESS_PERCENT not used with RSS_FETCH_SQL_UPDATE")
+if conf.FETCH_BUDGET_PER_HOUR and RSS_FETCH_SQL_UPDATE:
+    logger.warning("FETCH_BUDGET_PER_HOUR not used with RSS_FETCH_SQL_UPDATE")
+if HTTP_CONDITIONAL_TRUST and RSS_FETCH_SQL_UPDATE:
+    logger.warning("HTTP_CONDITIONAL_TRUST not used with RSS_FETCH_SQL_UPDATE")
+
+# per-process histogram of scheduled fetches (see fetcher/leveler.py),
+# only used by update_feeds
+LEVELER = Leveler()
+
+# size of reads of (streamed) feed documents
+READ_CHUNK_SIZE = 64 * 1024
+
+# rows per multi-row INSERT (keep parameter count well under 64K)
+INSERT_BATCH_ROWS = 1000
+
 # disable SSL verification warnings w/ requests verify=False
 if not VERIFY_CERTIFICATES:
     warnings.simplefilter('ignore', InsecureRequestWarning)
@@ -206,7 +238,8 @@ DEFAULT_UPDATE_FREQUENCY = 1    # specified in Syndication spec
 
 
 def _save_rss_files(dir: str, fname: Any, feed: Dict,
-                    response: requests.Response, note: Optional[str] = None) -> None:
+                    response: requests.Response, content: bytes,
+                    note: Optional[str] = None) -> None:
     """
     debugging helper method - saves two files for the feed (data & metadata)
     """
@@ -228,30 +261,200 @@ def _save_rss_files(dir: str, fname: Any, feed: Dict,
         json.dump(summary, f, indent=4)
     rss_filename = os.path.join(dir, f"{fname}-content.rss")
     with open(rss_filename, 'wb') as f:
-        f.write(response.content)
+        f.write(content)
 
 
-def normalized_title_exists(session: SessionType,
-                            normalized_title_hash: Optional[str],
-                            sources_id: Optional[int]) -> bool:
+def _earliest_title_date() -> dt.date:
+    """
+    return earliest Story.published_at date for title dedup
     """
-    Check if a story with the same normalized/hash title
-    has been seen recently in the same source.
+    return dt.date.today() - dt.timedelta(days=NORMALIZED_TITLE_DAYS)
+
+
+# Per-process LRU cache of (sources_id, normalized_title_hash) to
+# latest published_at for titles known to be in the stories table.
+# Entries are only good while published_at is inside the
+# NORMALIZED_TITLE_DAYS window, so no other expiration is needed.
+_title_cache: OrderedDict[Tuple[int, str], dt.datetime] = OrderedDict()
+
+
+def remember_title(sources_id: Optional[int],
+                   normalized_title_hash: Optional[str],
+                   published_at: Optional[dt.datetime]) -> None:
+    """
+    Add a saved story's title to the title cache.
+    """
+    if (TITLE_CACHE_ENTRIES <= 0 or sources_id is None or
+            normalized_title_hash is None or published_at is None):
+        return
+    key = (sources_id, normalized_title_hash)
+    old = _title_cache.get(key)
+    if old is None or published_at > old:
+        _title_cache[key] = published_at
+    _title_cache.move_to_end(key)
+    while len(_title_cache) > TITLE_CACHE_ENTRIES:
+        _title_cache.popitem(last=False)
+
+
+def normalized_titles_exist(session: SessionType,
+                            normalized_title_hashes: Iterable[Optional[str]],
+                            sources_id: Optional[int]) -> Set[str]:
+    """
+    Return the subset of normalized_title_hashes for stories
+    seen recently in the same source, using (at most) one query
+    (titles found in the title cache aren't queried).
 
     Called inside a transaction.
     """
-    if normalized_title_hash is None or sources_id is None:
+    if sources_id is None:
         # err on the side of keeping URLs
-        return False
-    earliest_date = dt.date.today() - dt.timedelta(days=NORMALIZED_TITLE_DAYS)
-    # only care if matching rows exist, so doing nested EXISTS query
-    return session.query(literal(True))\
-                  .filter(session.query(Story)
-                          .filter(Story.published_at >= earliest_date,
-                                  Story.normalized_title_hash == normalized_title_hash,
-                                  Story.sources_id == sources_id)
-                          .exists())\
-                  .scalar() is True
+        return set()
+    earliest = dt.datetime.combine(_earliest_title_date(), dt.time())
+    found = set()
+    query = []
+    for title_hash in set(normalized_title_hashes):
+        if title_hash is None:
+            continue
+        published_at = _title_cache.get((sources_id, title_hash))
+        if published_at is not None and published_at >= earliest:
+            _title_cache.move_to_end((sources_id, title_hash))
+            found.add(title_hash)
+        else:
+            query.append(title_hash)
+
+    stats = Stats.get()
+    if found:
+        stats.incr('title_cache', len(found), labels=[('stat', 'hit')])
+    if query:
+        stats.incr('title_cache', len(query), labels=[('stat', 'miss')])
+        # uses stories_title_hash_window index
+        # (normalized_title_hash checked for collisions)
+        t0 = time.monotonic()
+        for title_hash, published_at in session.execute(
+                select(Story.normalized_title_hash,
+                       func.max(Story.published_at))
+                .where(Story.sources_id == sources_id,
+                       Story.title_hash.in_([hash64(title_hash)
+                                             for title_hash in query]),
+                       Story.published_at >= earliest)
+                .group_by(Story.normalized_title_hash)):
+            if title_hash not in query:
+                stats.incr('hash_collision', labels=[('type', 'title')])
+                continue
+            found.add(title_hash)
+            remember_title(sources_id, title_hash, published_at)
+        stats.timing('title.lookup', time.monotonic() - t0)
+    return found
+
+
+# Shared (between Worker processes) filter of normalized URLs
+# of saved stories, created by init_dedup_filter.
+_dedup_filter: Optional[BloomFilter] = None
+
+
+def init_dedup_filter() -> None:
+    """
+    Called from fetcher main process, BEFORE creating Workers,
+    to create and load the dedup filter (if DEDUP_FILTER_MBYTES set).
+    """
+    global _dedup_filter
+    if DEDUP_FILTER_MBYTES <= 0:
+        return
+
+    stats = Stats.get()
+    t0 = time.monotonic()
+    with Session() as session:
+        # planner's estimate (table and any partitions) is good enough
+        # to pick the number of hashes, and much cheaper than count(*)
+        expected = session.scalar(text(
+            "SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint"
+            " FROM pg_class WHERE oid = 'stories'::regclass OR oid IN"
+            " (SELECT inhrelid FROM pg_inherits"
+            "  WHERE inhparent = 'stories'::regclass)")) or 0
+
+        bf = BloomFilter(DEDUP_FILTER_MBYTES * 1024 * 1024, expected)
+        result = session.scalars(
+            select(Story.normalized_url)
+            .where(Story.normalized_url.is_not(None))
+            .execution_options(yield_per=100000))
+        for part in result.partitions():
+            bf.add_many(part)
+    _dedup_filter = bf
+
+    secs = time.monotonic() - t0
+    logger.info("dedup filter: %d entries in %.1f sec, %d hashes, est. fp %.6f",
+                bf.entries, secs, bf.nhashes, bf.false_positive_rate())
+    stats.gauge('dedup_filter.load_secs', secs)
+    stats.gauge('dedup_filter.bytes', bf.nbytes)
+    dedup_filter_stats()
+
+
+def dedup_filter_stats() -> None:
+    """
+    report dedup filter gauges (called periodically by fetcher main loop)
+    """
+    if _dedup_filter is not None:
+        stats = Stats.get()
+        stats.gauge('dedup_filter.entries', _dedup_filter.entries)
+        stats.gauge('dedup_filter.fp_rate',
+                    _dedup_filter.false_positive_rate())
+
+
+def url_md5(url: str) -> uuid.UUID:
+    """
+    return MD5 of a URL (Story.url_md5 dedup key) as a UUID
+    (same as SQL md5(url)::uuid)
+    """
+    return uuid.UUID(bytes=hashlib.md5(url.encode('utf-8')).digest())
+
+
+def hash64(hex_hash: str) -> int:
+    """
+    return first 64 bits of a hex hash (ie; normalized_title_hash)
+    as a signed integer (for Story.title_hash); same as SQL
+    ('x' || substr(hex_hash, 1, 16))::bit(64)::bigint
+    """
+    return int.from_bytes(bytes.fromhex(hex_hash[:16]), 'big', signed=True)
+
+
+# SeenEntries.entries packing: (entry URL hash, story id)
+SEEN_ENTRY = struct.Struct('>qq')
+
+
+def _url_hash(url: str) -> int:
+    """
+    return signed 64-bit hash of a URL
+    """
+    digest = hashlib.md5(url.encode('utf-8', 'replace')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def _load_seen_entries(session: SessionType, feed_id: int) -> Dict[int, int]:
+    """
+    return dict of entry URL hash to story id for entries
+    seen on the last fetch that saved stories.
+    """
+    entries = session.scalars(select(SeenEntries.entries)
+                              .where(SeenEntries.feed_id == feed_id))\
+                     .one_or_none()
+    if not entries:
+        return {}
+    return dict(SEEN_ENTRY.iter_unpack(entries))
+
+
+def _save_seen_entries(session: SessionType, feed_id: int,
+                       start: dt.datetime, seen: Dict[int, int]) -> None:
+    """
+    replace SeenEntries row for feed.
+    """
+    entries = b''.join([SEEN_ENTRY.pack(url_hash, story_id)
+                        for url_hash, story_id in seen.items()])
+    stmt = insert(SeenEntries)\
+        .values(feed_id=feed_id, fetched_at=start, entries=entries)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[SeenEntries.feed_id],
+        set_={'fetched_at': stmt.excluded.fetched_at,
+              'entries': stmt.excluded.entries}))
 
 
 def _auto_adjust_stat(counter: str) -> None:
@@ -263,171 +466,338 @@ def _auto_adjust_stat(counter: str) -> None:
     stats.incr('adjust', 1, labels=[('stat', counter)])
 
 
-def _check_auto_adjust_longer(update: Update, feed: Feed,
-                              next_min: int, dup_pct: float,
-                              delta_min: float) -> int:
-    """
-    here to consider raising poll_minutues (too many dups)
-    """
-    # limit consideration of early polls, but late is ok.
-
-    # NOTE: This may be a positive feedback loop: if polls are late
-    # because "high water" is dropping, (and "ready" feeds backing
-    # up), allowing ALL late polls will increase the number of times
-    # poll_minutes is adjusted up, and increase the rate of decrease
-    # of the "high water" mark (and increase the number of late polls,
-    # which prohibits shortening poll periods.  Since the system is
-    # written to avoid early polls (except when triggered), perhaps
-    # this is an argument for primarily adjusting "up", and resetting
-    # periods to a minimal value??
-    if delta_min < -AUTO_ADJUST_MAX_DELTA_MIN:
-        logger.info(f"  Feed {feed.id} {-delta_min:.1f} min early")
-        _auto_adjust_stat('early')
-        return next_min
-
-    if feed.last_new_stories:
-        last = feed.last_new_stories
-    elif feed.created_at:
-        last = feed.created_at
-    else:
-        # should not happen!
-        _auto_adjust_stat('no_last')
-        return next_min
-
-    # adjust by smaller increment if:
-    # 1. stories seen in last AUTO_ADJUST_SMALL_DAYS (AASD)
-    # 2. or if no stories ever seen, feed is younger than AASD
-    # 3. or just fetched some stories (should trigger case 1).
-    since = dt.datetime.utcnow() - last
-    logger.info(                # TEMP (lower to debug?)
-        f"  Feed {feed.id} next: {next_min} m; {since.days} d; {dup_pct:.1f}% dup; delta {delta_min:.1f} m")
-    if since.days <= AUTO_ADJUST_SMALL_DAYS or dup_pct < 100:
-        next_min += AUTO_ADJUST_SMALL_MINS
-    else:
-        next_min += AUTO_ADJUST_MINUTES
+# (feed_id, event, created_at, note) for save_fetch_events
+EventRecord = Tuple[int, FetchEvent.Event, dt.datetime, Optional[str]]
+
+
+def save_fetch_events(session: SessionType,
+                      events: List[EventRecord]) -> None:
+    """
+    For each event, overwrite the oldest slot in the feed's
+    FetchEvent ring, and count the event in FetchEventDay
+    (one multi-row INSERT for each table).
 
-    if next_min > AUTO_ADJUST_MAX_POLL_MINUTES:
-        next_min = AUTO_ADJUST_MAX_POLL_MINUTES
+    Called from update_feed(s) inside a transaction with the Feed
+    rows locked, so no other process is writing events for the feeds.
+    """
+    feed_ids = set(e[0] for e in events)
+    seqs: Dict[int, int] = {
+        feed_id: seq
+        for feed_id, seq in session.execute(
+            select(FetchEvent.feed_id, func.max(FetchEvent.seq))
+            .where(FetchEvent.feed_id.in_(feed_ids))
+            .group_by(FetchEvent.feed_id))}
+
+    rows = []
+    days: Dict[Tuple[int, dt.date, str], int] = {}
+    for feed_id, event, created_at, note in events:
+        seq = seqs[feed_id] = seqs.get(feed_id, 0) + 1
+        rows.append({'feed_id': feed_id, 'slot': seq % FETCH_EVENT_ROWS,
+                     'seq': seq, 'event': event.value, 'note': note,
+                     'created_at': created_at})
+        key = (feed_id, created_at.date(), event.value)
+        days[key] = days.get(key, 0) + 1
+
+    stmt = insert(FetchEvent).values(rows)
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[FetchEvent.feed_id, FetchEvent.slot],
+            set_={'seq': stmt.excluded.seq,
+                  'event': stmt.excluded.event,
+                  'note': stmt.excluded.note,
+                  'created_at': stmt.excluded.created_at}))
+
+    dstmt = insert(FetchEventDay).values(
+        [{'feed_id': feed_id, 'day': day, 'event': event, 'count': count}
+         for (feed_id, day, event), count in days.items()])
+    session.execute(
+        dstmt.on_conflict_do_update(
+            index_elements=[FetchEventDay.feed_id, FetchEventDay.day,
+                            FetchEventDay.event],
+            set_={'count': FetchEventDay.count + dstmt.excluded.count}))
+
+
+def update_feed_sql(session: SessionType,
+                    feed_id: int,
+                    start_time: dt.datetime,
+                    u: Update,
+                    status_note: str) -> None:
+    """
+    update_feed with a single call to the feed_complete SQL function
+    (when RSS_FETCH_SQL_UPDATE set): one round trip, with the Feed
+    row locked only while the statement runs.
+    """
+    with session.begin():
+        row = session.execute(
+            text("SELECT * FROM feed_complete(CAST(:p AS jsonb), :feed_id,"
+                 " :start, :status, :sys_status, :note, :saved, :dup,"
+                 " :retry_after_min, :randomize, :no_change,"
+                 " CAST(:cols AS jsonb), :version)"),
+            {'p': json.dumps(policy_json(POLICY)),
+             'feed_id': feed_id, 'start': start_time,
+             'status': u.status.value, 'sys_status': u.sys_status,
+             'note': status_note, 'saved': u.saved, 'dup': u.dup,
+             'retry_after_min': u.retry_after_min,
+             'randomize': u.randomize, 'no_change': u.no_change,
+             'cols': json.dumps(u.feed_col_updates, default=str),
+             'version': u.version}).one_or_none()
+        session.commit()        # should happen at "with" exit
+        session.close()         # ditto
+
+    if row is None:
+        logger.info(f"  Feed {feed_id} not found in update_feed_sql")
+        return
+
+    if row.changed:
         logger.info(
-            f"  Feed {feed.id} poll_minutes clamped down to {next_min}")
-        _auto_adjust_stat('max')
-    elif feed.poll_minutes != next_min:
-        _auto_adjust_stat('up')
-        logger.info(f"  Feed {feed.id} adjust poll_minutes up to {next_min}")
+            f"  Feed {feed_id} changed while fetching; discarding {u.counter}")
+        Stats.get().incr('update_feed', labels=[('stat', 'changed')])
+        return
+
+    if row.adjust:
+        _auto_adjust_stat(row.adjust)
+    if row.disabled:
+        logger.warning(
+            f" Feed {feed_id}: disabled after {row.failures} failures")
+    elif row.failures:
+        logger.info(f" Feed {feed_id}: last_fetch_failures {row.failures}")
+    if row.updated_refs is not None:
+        logger.info("  Feed %d updated seen_at for %d stories",
+                    feed_id, row.updated_refs)
+    logger.info(
+        f"  Feed {feed_id} poll_minutes {row.poll_minutes} adjust {row.adjust} next {row.next_fetch_attempt}")
+
 
-    return next_min
+def _status_note(u: Update) -> str:
+    """
+    return FetchEvent "note" for an Update
+    """
+    if u.note:
+        if u.sys_status == SYS_WORKING:  # or/also check status == Status.SUCC??
+            return u.note
+        return f"{u.sys_status}; {u.note}"
+    return u.sys_status
 
 
-def _check_auto_adjust_shorter(update: Update, feed: Feed,
-                               next_min: int, dup_pct: float,
-                               delta_min: float) -> int:
+def _feed_changed(feed_id: int, version: int, u: Update) -> bool:
     """
-    Here to increase poll rate (adjust poll_minutes down/shorter).
-    due to too few duplicate (too many new stories)
+    return True if Feed row changed (ie; deactivated, or URL changed)
+    since read by HeadHunter.refill: caller discards results, and just
+    clears queued (next_fetch_attempt has passed, so the feed will be
+    refetched, with current values, if still active).
     """
-    # early is ok, but too late is not
-    if delta_min > AUTO_ADJUST_MAX_DELTA_MIN:
-        logger.info(f"  Feed {feed.id} {delta_min:.1f} min late")
-        _auto_adjust_stat('late')
-        return next_min
+    if u.version is None or version == u.version:
+        return False
+    logger.info(
+        f"  Feed {feed_id} changed while fetching; discarding {u.counter}")
+    Stats.get().incr('update_feed', labels=[('stat', 'changed')])
+    return True
 
-    if next_min > DEFAULT_INTERVAL_MINS:
-        # here to bring long poll intervals back to earth quickly
-        next_min = DEFAULT_INTERVAL_MINS
-        how = ctr = 'reset'
-    else:
-        next_min -= AUTO_ADJUST_MINUTES
-        how = 'adjust'
-        ctr = 'down'
-
-    if feed.update_minutes:
-        # Saw adjustment down to two minutes for feed 6231 (denverpost
-        # top news stories which advertises an update period of two
-        # minutes!), so apply a lower bound!!
-        minimum = max(feed.update_minutes, AUTO_ADJUST_MIN_POLL_MINUTES)
+
+def _apply_update(feed_id: int,
+                  f: Feed,
+                  st: FeedState,
+                  start_time: dt.datetime,
+                  u: Update,
+                  level: bool = False) -> FetchEvent.Event:
+    """
+    apply an Update to (locked) Feed and FeedState objects
+    (no database access); returns event to save.
+    `level` moves next fetch to a less loaded slot (see LEVELER).
+    """
+    status = u.status               # for log, FetchEvent.Event
+    system_status = u.sys_status    # for log, FeedState.system_status
+    feed_col_updates = u.feed_col_updates
+
+    # apply additional updates first to simplify checks
+    if feed_col_updates:
+        for key, value in feed_col_updates.items():
+            # Feed only written when a (rarely changing) value changes
+            obj = st if hasattr(FeedState, key) else f
+            curr = getattr(obj, key)
+            if value != curr:
+                if key in LOG_AT_INFO:
+                    lf = logger.info
+                else:
+                    lf = logger.debug
+                # was !r to quote strings, but noisy w/ datetime
+                lf(f"  Feed {feed_id} updating {key} from {curr} to {value}")
+                setattr(obj, key, value)
+
+    prev_success_time = st.last_fetch_success
+    st.last_fetch_attempt = start_time  # match fetch_event & stories
+    if status == Status.SUCC:
+        st.last_fetch_success = start_time
+    st.queued = False       # safe to requeue
+    prev_system_status = st.system_status
+    st.system_status = system_status
+
+    # see fetcher/schedule.py for rescheduling policy
+    if status == Status.SUCC and u.saved is None and not u.no_change:
+        logger.info(f"  Feed {feed_id} unexpected counter {u.counter}")
+
+    now = dt.datetime.utcnow()
+    if prev_success_time is not None:
+        since_success_min: Optional[float] = \
+            (now - prev_success_time).total_seconds() / 60
     else:
-        minimum = AUTO_ADJUST_MIN_POLL_MINUTES
-
-    if next_min < minimum:
-        next_min = minimum
-        logger.info(f"  Feed {feed.id} poll_minutes clamped up to {next_min}")
-        _auto_adjust_stat('min')
-    elif feed.poll_minutes != next_min:
-        logger.info(f"  Feed {feed.id} {how} poll_minutes down to {next_min}")
-        _auto_adjust_stat(ctr)
-
-    return next_min
-
-
-def _check_auto_adjust(update: Update, feed: Feed,
-                       next_min: int,
-                       prev_success: Optional[dt.datetime]) -> int:
-    """
-    Check if auto-adjust (adjustment of poll_minutes based on the
-    ammount of duplicate stories returned on a successful poll) is
-    needed.
-
-    NOTE! This is distinct from "backoff" which is how the base poll
-    rate is interpreted based on the number of consecutive fetch
-    failures!!
-
-    The code grew sufficently large that separate helper functions
-    _check_auto_adjust_longer and _check_auto_adjust_shorter handle
-    the two adjustment directions.
-
-    Returns (possibly updated) next_min (minutes to next fetch).
-    Separate function for easy exit, and to avoid clutter.
-    """
-    if update.status != Status.SUCC:
-        # let backoff do the work
-        return next_min
-
-    # Only want to look at results after TWO successful polls IN A ROW,
-    # where second poll happened close to on time (about "next_min" ago),
-    # and so is representative.
-    # NOTE: start_delay is system lantency (only) for current poll.
-    if prev_success is None:
-        return next_min
-
-    # get timedelta since previous successful poll:
-    since_prev_success = dt.datetime.utcnow() - prev_success
-
-    # get delta in minutes from expected/current poll period
-    # negative means polled early, positive means late.
-    # polls tend to be one queue scan period late.
-    delta_min = since_prev_success.total_seconds() / 60 - next_min
-
-    # Original version of auto-adjust only adjusted poll rate
-    # up/shorter/faster to make sure we got enough duplicates to
-    # ensure that there was good duplication/overlap (no missing
-    # stories) between polls, so it calculated the percentage of
-    # duplicates (and not the new/added percentage), and the dup_pct
-    # variable has persisted.
-
-    if update.saved is None or update.dup is None:
-        if not update.no_change:
+        since_success_min = None
+    last_new = st.last_new_stories or f.created_at
+    since_new_days = (now - last_new).days if last_new else None
+
+    if status == Status.SUCC and since_success_min is not None:
+        # update story arrival rate estimate
+        new = 0 if u.no_change else u.saved
+        if new is not None:
+            st.arrival_rate, st.arrival_var = update_arrivals(
+                POLICY, st.arrival_rate, st.arrival_var, new,
+                since_success_min / 60, new > 0 and u.dup == 0)
+
+    predicted = None
+    if (status == Status.SUCC and POLICY.ARRIVAL_TARGET_STORIES and
+            st.arrival_rate is not None and st.arrival_var is not None):
+        predicted = predict_minutes(POLICY, st.arrival_rate, st.arrival_var,
+                                    st.entry_count, f.update_minutes)
+
+    adjust_since_min = since_success_min
+    if u.load_factor > 1:
+        # overloaded: fetches are late by design, so don't let
+        # auto-adjust permanently change poll_minutes
+        adjust_since_min = None
+
+    prev_failures = st.last_fetch_failures
+    sched = schedule(POLICY, status.value, prev_failures,
+                     f.poll_minutes, f.update_minutes,
+                     adjust_since_min, since_new_days,
+                     u.saved, u.dup, u.retry_after_min, predicted,
+                     st.budget_minutes)
+    st.last_fetch_failures = failures = sched.failures
+
+    if status == Status.SUCC:
+        event = FetchEvent.Event.FETCH_SUCCEEDED
+        if prev_failures > 0:
+            # interested in seeing which errors are transient:
             logger.info(
-                f"  Feed {feed.id} unexpected counter {update.counter}")
-        dup_pct = DupPct.NO_CHANGE
+                f" Feed {feed_id}: clearing failures (was {prev_failures}: {prev_system_status})")
+    elif sched.disable:
+        event = FetchEvent.Event.FETCH_FAILED_DISABLED
+        f.system_enabled = False  # disable feed
+        logger.warning(
+            f" Feed {feed_id}: disabled after {failures} failures")
     else:
-        total = update.saved + update.dup  # ignoring "skipped" (bad) urls
-        if total > 0:
-            dup_pct = 100 * update.dup / total
-        else:
-            dup_pct = DupPct.NO_STORIES
+        event = FetchEvent.Event.FETCH_FAILED
+        logger.info(
+            f" Feed {feed_id}: upped last_fetch_failures to {failures}")
 
-    if dup_pct >= AUTO_ADJUST_MAX_DUPLICATE_PERCENT:
-        # too many dups: make poll period longer
-        return _check_auto_adjust_longer(
-            update, feed, next_min, dup_pct, delta_min)
+    if sched.adjust:
+        _auto_adjust_stat(sched.adjust)
+        logger.info(
+            f"  Feed {feed_id} auto-adjust {sched.adjust}: poll_minutes {f.poll_minutes} to {sched.poll_minutes}")
+
+    if f.poll_minutes != sched.poll_minutes:
+        f.poll_minutes = sched.poll_minutes
+
+    next_minutes = sched.next_minutes
+    if (next_minutes is not None and status == Status.SUCC and
+            POLICY.ACTIVITY_SCHEDULE and st.activity and
+            not u.retry_after_min):
+        # fetch sooner in the feed's busy hours, later in quiet ones
+        next_minutes = stretch_minutes(POLICY, st.activity, now,
+                                       next_minutes, f.update_minutes)
+
+    if next_minutes is not None and u.load_factor != 1:
+        # overload controller multiplier (see fetcher/overload.py)
+        next_minutes = min(next_minutes * u.load_factor,
+                           max(next_minutes, MAXIMUM_INTERVAL_MINS))
+
+    earliest = now              # for leveling
+    if (next_minutes is not None and status == Status.SUCC and
+            POLICY.SERVER_FRESHNESS_PERCENT):
+        # don't refetch before the server says the document is stale,
+        # or in hours/days the feed says to skip
+        floor = freshness_floor(POLICY, st.fresh_minutes, st.ttl_minutes)
+        if floor > next_minutes:
+            logger.info(
+                f"  Feed {feed_id} next fetch {round(next_minutes)} min raised to freshness {round(floor)}")
+            next_minutes = floor
+        if st.skip_hours or st.skip_days:
+            skipped = skip_minutes(st.skip_hours or 0, st.skip_days or 0,
+                                   now, next_minutes, MAXIMUM_INTERVAL_MINS)
+            if skipped != next_minutes:
+                logger.info(
+                    f"  Feed {feed_id} next fetch {round(next_minutes)} min moved to {round(skipped)} (skip hours/days)")
+                floor = next_minutes = skipped
+        earliest = now + dt.timedelta(minutes=floor)
 
-    if dup_pct < AUTO_ADJUST_MIN_DUPLICATE_PERCENT:
-        # too few dups: make poll period shorter
-        return _check_auto_adjust_shorter(
-            update, feed, next_min, dup_pct, delta_min)
+    if next_minutes is not None:  # rescheduling?
+        if u.retry_after_min and next_minutes == min(u.retry_after_min, _DAY_MINS):
+            logger.info(
+                f"  Feed {feed_id} - using retry_after {u.retry_after_min}")
+
+        if u.randomize:
+            # Add random minute offset to break up clumps of 429
+            # (Too Many Requests) errors.  In practice, quantized
+            # into queuer loop period sized buckets.
+            next_minutes += random.random() * 60
+
+        next_dt = utc(next_minutes * 60)
+        if level and SCHEDULE_LEVEL_PERCENT and not u.retry_after_min:
+            # move to least loaded slot near next_dt
+            tolerance = dt.timedelta(
+                minutes=next_minutes * SCHEDULE_LEVEL_PERCENT / 100)
+            next_dt = LEVELER.place(next_dt, tolerance, earliest=earliest)
+        st.next_fetch_attempt = next_dt
+        logger.info(
+            f"  Feed {feed_id} rescheduled for {round(next_minutes)} min at {next_dt}")
+    elif f.system_enabled:
+        # only reason next_minutes should be None is if
+        # system_enabled set False above.
+        logger.error("  Feed {feed_id} enabled but not rescheduled!!!")
+
+    return event
 
-    # no need for adjustment
-    return next_min
+
+# (feed_id, previous last_fetch_success, start_time) for _update_seen
+SeenRecord = Tuple[int, dt.datetime, dt.datetime]
+
+
+def _update_seen(session: SessionType, seen: List[SeenRecord]) -> None:
+    """
+    Here for feeds whose document didn't change; update seen_at of
+    each feed's current generation (the one StoryRefs for the stories
+    seen on the last successful fetch point to) to the current start
+    time to keep them from expiring.
+
+    Maybe move this to where the Update is created;
+    One advantage of here is that it's in the same commit as
+    the Feed update and FeedEvent creation.
+    """
+    v = values(column('feed_id', BigInteger), column('start', DateTime),
+               name='v').data([(feed_id, start) for feed_id, _, start in seen])
+    fg = aliased(FeedGeneration)
+    current_gen = select(func.max(fg.gen))\
+        .where(fg.feed_id == v.c.feed_id)\
+        .scalar_subquery()
+    ret = session.execute(update(FeedGeneration)
+                          .where(FeedGeneration.feed_id == v.c.feed_id,
+                                 FeedGeneration.gen == current_gen)
+                          .values(seen_at=v.c.start)
+                          .returning(FeedGeneration.feed_id))
+    updated = set(ret.scalars())
+
+    for feed_id, prev_success_time, start_time in seen:
+        if feed_id in updated:
+            continue
+        # no generations yet: refs written before
+        # feed_generations existed (expired by seen_at)
+        ret = session.execute(update(StoryRef)
+                              .where(StoryRef.feed_id == feed_id,
+                                     StoryRef.gen.is_(None),
+                                     StoryRef.seen_at == prev_success_time)
+                              .values(seen_at=start_time))
+        updated_rows = result_rowcount(ret)
+        logger.info("  Feed %d updated seen_at for %d stories",
+                    feed_id, updated_rows)
 
 
 def update_feed(session: SessionType,
@@ -436,33 +806,24 @@ def update_feed(session: SessionType,
                 u: Update
                 ) -> None:
     """
-    Update Feed row, inserts FeedEvent row, increments feeds counter,
+    Update Feed row, saves FetchEvent, increments feeds counter,
     updates StoryRef.seen_at if feed hash was the same.
 
-    * updates the Feed row
-      + clearing "Feed.queued"
-      + increment or clear Feed.last_fetch_failures
-      + update Feed.next_fetch_attempt to reschedule
+    * updates the FeedState row (and Feed row if needed)
+      + clearing "FeedState.queued"
+      + increment or clear FeedState.last_fetch_failures
+      + update FeedState.next_fetch_attempt to reschedule
     * increment feeds stats counter
     so all policy can be centralized here.
 
     start_time used for (expect to match):
     * fetch/processing time
     """
+    status_note = _status_note(u)   # for FetchEvent.note
 
-    status = u.status               # for log, FetchEvent.Event
-    system_status = u.sys_status    # for log, Feed.system_status
-    note = u.note                   # for log, FetchEvent.note
-    feed_col_updates = u.feed_col_updates
-
-    # construct status_note for fetch_event entry "note"
-    if note:
-        if system_status == SYS_WORKING:  # or/also check status == Status.SUCC??
-            status_note = note
-        else:
-            status_note = f"{system_status}; {note}"
-    else:
-        status_note = system_status
+    if RSS_FETCH_SQL_UPDATE:
+        update_feed_sql(session, feed_id, start_time, u, status_note)
+        return
 
     with session.begin():
         # NOTE! locks row for atomic update of last_fetch_errors
@@ -477,170 +838,155 @@ def update_feed(session: SessionType,
         # better (and there could be less, but at the cost of added
         # complexity).
 
-        stmt = select(Feed).where(Feed.id == feed_id).with_for_update()
-        f = session.scalars(stmt).one_or_none()
-        if f is None:
+        stmt = select(Feed, FEED_VERSION)\
+            .where(Feed.id == feed_id)\
+            .with_for_update()
+        row = session.execute(stmt).one_or_none()
+        if row is None:
             logger.info(f"  Feed {feed_id} not found in update_feed")
             return
+        f, version = row
 
-        # apply additional updates first to simplify checks
-        if feed_col_updates:
-            for key, value in feed_col_updates.items():
-                curr = getattr(f, key)
-                if value != curr:
-                    if key in LOG_AT_INFO:
-                        lf = logger.info
-                    else:
-                        lf = logger.debug
-                    # was !r to quote strings, but noisy w/ datetime
-                    lf(f"  Feed {feed_id} updating {key} from {curr} to {value}")
-                setattr(f, key, value)
-
-        prev_success_time = f.last_fetch_success
-        f.last_fetch_attempt = start_time  # match fetch_event & stories
-        if status == Status.SUCC:
-            f.last_fetch_success = start_time
-        f.queued = False        # safe to requeue
-        prev_system_status = f.system_status
-        f.system_status = system_status
-
-        # get normal feed update period in minutes, one of:
-        # 0. poll_minutes field, if non-NULL
-        # 1. update_minutes value being passed in to update Feed row (from RSS)
-        # 2. update_minutes stored in feed row (if fetch or parse failed)
-        # 3. default
-        # (update_minutes is either a value from feed, or NULL)
-
-        # On error, next_minutes is multipled by last_fetch_failures
-        # (see mult variable).
-
-        next_minutes = (f.poll_minutes or
-                        f.update_minutes or
-                        DEFAULT_INTERVAL_MINS)
-
-        if status == Status.SUCC:
-            event = FetchEvent.Event.FETCH_SUCCEEDED
-            if f.last_fetch_failures > 0:
-                # interested in seeing which errors are transient:
-                logger.info(
-                    f" Feed {feed_id}: clearing failures (was {f.last_fetch_failures}: {prev_system_status})")
-            f.last_fetch_failures = failures = 0
-            # many values come in via 'feed_col_updates'
-        else:
-            if status == Status.HARD:
-                incr = 1.
-            elif status == Status.SOFT:
-                incr = SOFT_FAILURE_INCREMENT
-            else:               # Status.TEMP
-                incr = TEMP_FAILURE_INCREMENT
-            failures = f.last_fetch_failures = f.last_fetch_failures + incr
-            if failures >= MAX_FAILURES and not UNDEAD_FEEDS:
-                event = FetchEvent.Event.FETCH_FAILED_DISABLED
-                f.system_enabled = False  # disable feed
-                next_minutes = None  # don't reschedule
-                logger.warning(
-                    f" Feed {feed_id}: disabled after {failures} failures")
-            else:
-                event = FetchEvent.Event.FETCH_FAILED
-                if incr != 0:
-                    logger.info(
-                        f" Feed {feed_id}: upped last_fetch_failures to {failures}")
-
-        if next_minutes is not None:  # rescheduling?  back off to be
-            # check if auto-adjust needed, before backoff, or
-            # retry-after, and update poll_minutes.
-            next_minutes = _check_auto_adjust(
-                u, f, next_minutes, prev_success_time)
-
-            if f.poll_minutes != next_minutes:
-                f.poll_minutes = next_minutes
-
-            # kind to servers: with large intervals exponential
-            # backoff (mult = N**failures) is extreme (1x, 2x, 4x, 8x)
-            # so using linear backoff (1x, 2x, 3x, 4x)
-            mult = failures
-
-            # backoff result MUST NOT be less than next_minutes!!
-            # so only apply multiplier when >= 1!
-            if mult >= 1:
-                next_minutes *= mult
-                # cap interval...
-
-                # if never killing feeds, allow larger max once a feed
-                # reaches the point where it would have been disabled.
-                if UNDEAD_FEEDS and failures > MAX_FAILURES:
-                    max_mins = UNDEAD_FEED_MAX_DAYS * _DAY_MINS
-                else:
-                    max_mins = MAXIMUM_BACKOFF_MINS
-
-                if next_minutes > max_mins:
-                    next_minutes = max_mins
-
-            if f.poll_minutes is None:
-                if next_minutes < MINIMUM_INTERVAL_MINS:
-                    next_minutes = MINIMUM_INTERVAL_MINS
-
-            # Always honor HTTP Retry-After: header if longer (but log)
-            # Only passed w/ non-success
-            ram = u.retry_after_min
-            if ram and ram > next_minutes:
-                # 24 hours not uncommon; saw 317100 sec (88h!) once
-                if ram > _DAY_MINS:
-                    ram = _DAY_MINS  # limit to one day (log???)
-                logger.info(
-                    f"  Feed {feed_id} - using retry_after {ram} ({next_minutes})")
-                next_minutes = ram
+        st = session.get(FeedState, feed_id, with_for_update=True)
+        if st is None:          # not marked queued (command line?)
+            st = FeedState(feed_id=feed_id, last_fetch_failures=0.0)
+            session.add(st)
 
-            if u.randomize:
-                # Add random minute offset to break up clumps of 429
-                # (Too Many Requests) errors.  In practice, quantized
-                # into queuer loop period sized buckets.
-                next_minutes += random.random() * 60
+        if _feed_changed(feed_id, version, u):
+            st.queued = False
+            return
 
-            f.next_fetch_attempt = next_dt = utc(next_minutes * 60)
-            logger.info(
-                f"  Feed {feed_id} rescheduled for {round(next_minutes)} min at {next_dt}")
-        elif f.system_enabled:
-            # only reason next_minutes should be None is if
-            # system_enabled set False above.
-            logger.error("  Feed {feed_id} enabled but not rescheduled!!!")
+        prev_success_time = st.last_fetch_success
+        event = _apply_update(feed_id, f, st, start_time, u)
 
         # See above for expect synchronicity regarding "start_time"
-        session.add(
-            FetchEvent.from_info(
-                feed_id,
-                event,
-                start_time,
-                status_note))
+        save_fetch_events(session, [(feed_id, event, start_time, status_note)])
 
         if prev_success_time is not None and u.no_change:
-            # Here when feed document didn't change; update StoryRef.seen_at for
-            # any stories seen on the last successful fetch of this feed to the
-            # current start time to keep them from expiring, and so they can be
-            # found next time if the hash hasn't changed again.
-
-            # It's tempting to update seen_at less often to avoid frequent
-            # writes to so many rows (and attendant SSD aging), but doing this
-            # efficiently would require another layer of indirection, AND only
-            # 30% of fetch_events entries report "same hash"; All other seen_at
-            # updates (due to dup detection) would still require updating the
-            # StoryRef.
-
-            # Maybe move this to where the Update is created;
-            # One advantage of here is that it's in the same commit as
-            # the Feed update and FeedEvent creation.
-            ret = session.execute(update(StoryRef)
-                                  .where(StoryRef.feed_id == feed_id,
-                                         StoryRef.seen_at == prev_success_time)
-                                  .values(seen_at=start_time))
-            updated_rows = result_rowcount(ret)
-            logger.info("  Feed %d updated seen_at for %d stories",
-                        feed_id, updated_rows)
+            _update_seen(session, [(feed_id, prev_success_time, start_time)])
         session.commit()        # should happen at "with" exit
         session.close()         # ditto
     # end "with session.begin()" [feed unlocked]
 
 
+# (feed_id, start_time, Update) returned by feed_worker
+Completion = Tuple[int, dt.datetime, Update]
+
+
+def update_feeds(session: SessionType,
+                 records: List[Completion]) -> None:
+    """
+    update_feed for a batch of completed fetches in ONE transaction
+    (write-behind: see RSS_FETCH_COMPLETION_MS): Feed and FeedState
+    rows are locked and read with one query each, written by the ORM
+    flush (executemany), with one multi-row INSERT of events.
+
+    Feeds stay marked queued until their completion is written, so
+    are not refetched in the meantime, and if completions are lost
+    (ie; a crash) the feeds are refetched after queued is cleared
+    at fetcher startup.
+    """
+    # a feed should not appear twice (queued until written),
+    # but if it does, handle the extras separately.
+    batch: Dict[int, Completion] = {}
+    extras = []
+    for rec in records:
+        if rec[0] in batch:
+            extras.append(rec)
+        else:
+            batch[rec[0]] = rec
+
+    if SCHEDULE_LEVEL_PERCENT:
+        LEVELER.refresh()       # if stale
+
+    with session.begin():
+        # lock in feed id order (avoid deadlocks)
+        ids = sorted(batch)
+        feeds = {f.id: (f, version)
+                 for f, version in session.execute(
+                     select(Feed, FEED_VERSION)
+                     .where(Feed.id.in_(ids))
+                     .order_by(Feed.id)
+                     .with_for_update())}
+        states = {st.feed_id: st
+                  for st in session.scalars(
+                      select(FeedState)
+                      .where(FeedState.feed_id.in_(ids))
+                      .order_by(FeedState.feed_id)
+                      .with_for_update())}
+
+        events: List[EventRecord] = []
+        seen: List[SeenRecord] = []
+        for feed_id, start_time, u in batch.values():
+            if feed_id not in feeds:
+                logger.info(f"  Feed {feed_id} not found in update_feeds")
+                continue
+            f, version = feeds[feed_id]
+
+            st = states.get(feed_id)
+            if st is None:      # not marked queued (command line?)
+                st = FeedState(feed_id=feed_id, last_fetch_failures=0.0)
+                session.add(st)
+
+            if _feed_changed(feed_id, version, u):
+                st.queued = False
+                continue
+
+            prev_success_time = st.last_fetch_success
+            event = _apply_update(feed_id, f, st, start_time, u,
+                                  level=True)
+            events.append((feed_id, event, start_time, _status_note(u)))
+            if prev_success_time is not None and u.no_change:
+                seen.append((feed_id, prev_success_time, start_time))
+
+        if events:
+            save_fetch_events(session, events)
+        if seen:
+            _update_seen(session, seen)
+    # end "with session.begin()" [feeds unlocked]
+
+    for feed_id, start_time, u in extras:
+        update_feed(session, feed_id, start_time, u)
+
+
+def write_completions(records: List[Completion]) -> None:
+    """
+    write a batch of completions returned by feed_worker (or
+    feed_writer) with update_feeds; if the batch fails, write
+    each one separately, so one bad record can't leave all the
+    feeds in the batch marked queued (and clear queued for any that
+    still fail).
+    """
+    t0 = time.monotonic()
+    try:
+        with Session() as session:
+            update_feeds(session, records)
+    except Exception:
+        logger.exception("update_feeds")
+        Stats.get().incr('completions.errors')
+        failed = []
+        for feed_id, start_time, u in records:
+            try:
+                with Session() as session:
+                    update_feed(session, feed_id, start_time, u)
+            except Exception:
+                logger.exception("update_feed %d", feed_id)
+                failed.append(feed_id)
+        if failed:
+            # results lost: clear queued so the feeds are refetched
+            # (next_fetch_attempt has passed)
+            try:
+                with Session() as session:
+                    session.execute(
+                        update(FeedState)
+                        .values(queued=False)
+                        .where(FeedState.feed_id.in_(failed)))
+                    session.commit()
+            except Exception:
+                logger.exception("clearing queued for %s", failed)
+    Stats.get().timing('completions.write', time.monotonic() - t0)
+
+
 def _feed_update_period_mins(parsed_feed: ParsedFeed) -> Optional[int]:
     """
     Extract feed update period in minutes, if any from parsed feed.
@@ -688,20 +1034,161 @@ def _feed_update_period_mins(parsed_feed: ParsedFeed) -> Optional[int]:
         return None
 
 
-def _fetch_rss_feed(feed: Dict) -> requests.Response:
+def _feed_ttl_mins(parsed_feed: ParsedFeed) -> Optional[int]:
+    """
+    Return RSS <ttl> (minutes the document may be cached),
+    or None if not present, or bogus.
+    """
+    try:
+        ttl = int((parsed_feed.ttl or '').strip())
+    except ValueError:
+        return None
+    if ttl <= 0:
+        return None
+    maximum: int = MAXIMUM_INTERVAL_MINS
+    return min(ttl, maximum)
+
+
+SKIP_HOURS_RE = re.compile(rb'<skipHours\b[^>]*>(.*?)</skipHours>',
+                           re.S | re.I)
+SKIP_DAYS_RE = re.compile(rb'<skipDays\b[^>]*>(.*?)</skipDays>',
+                          re.S | re.I)
+SKIP_ITEM_RE = re.compile(rb'<(?:hour|day)>\s*([^<\s]*)\s*</(?:hour|day)>',
+                          re.I)
+SKIP_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+             'saturday', 'sunday']
+
+
+def _skip_hour(value: str) -> int:
+    return int(value) % 24      # some feeds use 24 for midnight
+
+
+def _skip_day(value: str) -> int:
+    return SKIP_DAYS.index(value.lower())
+
+
+def _skip_mask(content: bytes, block_re: re.Pattern,
+               bit: Callable[[str], int]) -> int:
+    """
+    return bit mask of RSS <skipHours> <hour> or <skipDays> <day>
+    values (ignoring bad values)
+    """
+    m = block_re.search(content)
+    if not m:
+        return 0
+    mask = 0
+    for value in SKIP_ITEM_RE.findall(m.group(1)):
+        try:
+            mask |= 1 << bit(value.decode('ascii', errors='replace'))
+        except ValueError:
+            pass
+    return mask
+
+
+def _delta_secs(value: str) -> int:
+    """
+    parse HTTP delta-seconds (digits only: rejects signs,
+    fractions, "nan" and "inf" that float() would take)
+    """
+    if not value.isdigit():
+        raise ValueError(value)
+    return int(value)
+
+
+def _http_fresh_mins(headers: Any) -> Optional[int]:
+    """
+    Return minutes an HTTP response says it will stay fresh
+    (Cache-Control max-age, else Expires less Date, minus Age), or
+    None if not given, under a minute, or no-cache/no-store.
+    """
+    directives = {}
+    for directive in headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.partition('=')
+        directives[name.strip().lower()] = value.strip().strip('"')
+    if 'no-store' in directives or 'no-cache' in directives:
+        return None
+
+    secs: float
+    try:
+        if 'max-age' in directives:
+            secs = _delta_secs(directives['max-age'])
+        elif 'Expires' in headers:
+            expires = email.utils.parsedate_to_datetime(headers['Expires'])
+            if 'Date' in headers:
+                date = email.utils.parsedate_to_datetime(headers['Date'])
+            else:
+                date = dt.datetime.now(dt.timezone.utc)
+            secs = (expires - date).total_seconds()
+        else:
+            return None
+        secs -= _delta_secs(headers.get('Age') or '0')
+    except (TypeError, ValueError):  # bad values, or mixed timezones
+        return None
+
+    if secs < 60:
+        return None
+    return int(min(secs // 60, MAXIMUM_INTERVAL_MINS))
+
+
+def _check_validators(feed: Dict, conditional: bool,
+                      etag: Optional[str], lastmod: Optional[str],
+                      same_entries: bool,
+                      feed_col_updates: Dict[str, Any]) -> None:
+    """
+    after an unconditional fetch of a document that parsed (or had
+    the same hash), check the feed's ETag/Last-Modified against its
+    entries, and update FeedState.http_trust
+    (see fetcher/conditional.py)
+    """
+    if (conditional or not HTTP_CONDITIONAL_TRUST or
+            not feed['last_entries_hash']):  # nothing to compare
+        return
+    outcome = check_validators(feed['http_etag'], feed['http_last_modified'],
+                               etag, lastmod, same_entries)
+    if outcome is None:
+        return
+    Stats.get().incr('conditional.checks', labels=[('outcome', outcome)])
+    trust = new_trust(feed['http_trust'], outcome)
+    if outcome == STALE:
+        logger.info(
+            f"  Feed {feed['id']} stale validators: http_trust {feed['http_trust']} to {trust}")
+    feed_col_updates['http_trust'] = trust
+
+
+# requests.Session kept for the life of the (Worker) process so that
+# kept-alive connections can be reused when fetches from the same host
+# are directed to the same Worker (see scripts/fetcher.py)
+_session: Optional[requests.Session] = None
+
+
+def _requests_session() -> requests.Session:
+    global _session
+    if _session is None:
+        dnscache.install()      # first fetch in Worker process
+        _session = insecure_requests_session(MEDIA_CLOUD_USER_AGENT)
+    return _session
+
+
+def _fetch_rss_feed(feed: Dict,
+                    conditional: bool = HTTP_CONDITIONAL_FETCH) -> requests.Response:
     """
     Fetch current feed document using Feed.url
-    may add headers that make GET conditional (result in 304 status_code).
+    if `conditional` adds headers that make GET conditional
+    (result in 304 status_code).
     Raises exceptions on errors
+
+    NOTE! Response is streamed: only the headers have been read;
+    the caller must read the body (see _read_body) and close the response!
     """
     headers = {}  # User-Agent set by insecure_requests_session
 
     # 2023-01-31: some feeds give incorrect "no change" responses
     # ie; https://www.bizpacreview.com/feed
-    # perhaps try to validate http_last_modified
-    # (don't send headers if last_modified is more than a month old?)
+    # so (unless HTTP_CONDITIONAL_FETCH set) only feeds whose
+    # validators have been checked are fetched conditionally
+    # (see fetcher/conditional.py)
 
-    if HTTP_CONDITIONAL_FETCH:
+    if conditional:
         # if ETag (Entity-Tag) stashed, make GET conditional
         etag = feed.get('http_etag', None)
         if etag:
@@ -720,15 +1207,53 @@ def _fetch_rss_feed(feed: Dict) -> requests.Response:
             if lastmod:
                 headers['If-Modified-Since'] = lastmod
 
-    with insecure_requests_session(MEDIA_CLOUD_USER_AGENT) as sess:
+    sess = _requests_session()
+    try:
         response = sess.get(
             feed['url'],
             headers=headers,
             timeout=RSS_FETCH_TIMEOUT_SECS,
-            verify=VERIFY_CERTIFICATES)
+            verify=VERIFY_CERTIFICATES,
+            stream=True)
+    finally:
+        # don't carry cookies from one feed to the next
+        sess.cookies.clear()
     return response
 
 
+class DocumentTooLarge(Exception):
+    """
+    raised by _read_body if document larger than MAX_DOCUMENT_BYTES
+    """
+
+
+def _read_body(response: requests.Response) -> Tuple[bytes, str]:
+    """
+    Read body of streamed response, computing MD5 hash as it arrives.
+    Returns (content, hex_hash).
+
+    Raises DocumentTooLarge (before reading any of the body if
+    Content-Length is too large) if the document is larger than
+    MAX_DOCUMENT_BYTES.  May raise RequestException on read errors.
+    """
+    length = response.headers.get('Content-Length', '')
+    # (compressed length, so only useful when too large)
+    if length.isdigit() and int(length) > MAX_DOCUMENT_BYTES:
+        raise DocumentTooLarge(f"Content-Length {length}")
+
+    md5 = hashlib.md5()
+    chunks = []
+    size = 0
+    # iter_content decompresses, so limit applies to decoded document.
+    for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_DOCUMENT_BYTES:
+            raise DocumentTooLarge(f"over {MAX_DOCUMENT_BYTES} bytes")
+        md5.update(chunk)
+        chunks.append(chunk)
+    return b''.join(chunks), md5.hexdigest()
+
+
 def request_exception_to_status(
         feed_id: int,
         exc: requests.exceptions.RequestException) -> Tuple[Status, str]:
@@ -900,14 +1425,16 @@ def _sme2pe(sme: sitemap_parser.SitemapEntry) -> ParsedEntry:
         published_dt=_iso2dt(sme.get("news_pub_date")))
 
 
-def parse(url: str, response: requests.Response) -> ParsedFeed:
+def parse(url: str, content: bytes,
+          encoding: Optional[str] = None) -> ParsedFeed:
     """
+    `encoding` is charset from HTTP Content-Type header (if any).
     NOTE!! Any exception from this routine will be captured as a "note" for the feed
     """
 
     # try parsing as feed
     # NOTE! passing undecoded bytes!
-    parsed_feed = feedparser.parse(response.content)
+    parsed_feed = feedparser.parse(content)
 
     # legacy common/src/python/mediawords/feed/parse.py
     # ignores "bozo", checks only "version"
@@ -919,17 +1446,33 @@ def parse(url: str, response: requests.Response) -> ParsedFeed:
         title = pff.get("title")
         updatefrequency = pff.get("sy_updatefrequency")
         updateperiod = pff.get("sy_updateperiod")
+        ttl = cast(Optional[str], pff.get("ttl"))
+
+        # feedparser only keeps the last <hour> and <day>,
+        # so look for the elements in the document (when present)
+        skip_hours = skip_days = 0
+        if "skiphours" in pff:
+            skip_hours = _skip_mask(content, SKIP_HOURS_RE, _skip_hour)
+        if "skipdays" in pff:
+            skip_days = _skip_mask(content, SKIP_DAYS_RE, _skip_day)
 
         return ParsedFeed(
             entries=[_fpe2pe(fpe) for fpe in parsed_feed["entries"]],
             format=vers,
             feed_title=title,
             updatefrequency=updatefrequency,
-            updateperiod=updateperiod)
+            updateperiod=updateperiod,
+            ttl=ttl,
+            skip_hours=skip_hours,
+            skip_days=skip_days)
 
     # Try parsing as sitemap.
-    # Pass decoded string.  Spec'ed to always be UTF-8.
-    text = response.text
+    # Pass decoded string.  Spec'ed to always be UTF-8
+    # (so used when Content-Type doesn't supply a charset).
+    try:
+        text = content.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:         # unknown encoding name
+        text = content.decode('utf-8', errors='replace')
     if not text:
         raise Exception("empty")
 
@@ -963,6 +1506,44 @@ def parse(url: str, response: requests.Response) -> ParsedFeed:
         updateperiod=None)
 
 
+# query parameters that vary between fetches of the same feed document
+# without changing what story is linked to (keys starting with "utm_"
+# are also dropped).
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ocid', 'cmpid'}
+
+
+def _strip_tracking(url: str) -> str:
+    """
+    cheap removal of fragment and tracking parameters from an entry URL
+    (for _entries_fingerprint only).
+    """
+    url = url.split('#', 1)[0]
+    if '?' not in url:
+        return url
+    base, query = url.split('?', 1)
+    params = [p for p in query.split('&')
+              if p and not p.lower().startswith('utm_') and
+              p.split('=', 1)[0].lower() not in TRACKING_PARAMS]
+    if params:
+        return base + '?' + '&'.join(params)
+    return base
+
+
+def _entries_fingerprint(entries: list[ParsedEntry]) -> str:
+    """
+    Return hex hash of the ordered (link, title) pairs of a parsed
+    feed (ignoring tracking parameters), to detect documents whose
+    only changes don't effect the stories.
+    """
+    md5 = hashlib.md5()
+    for entry in entries:
+        md5.update(_strip_tracking(entry.url).encode('utf-8', 'replace'))
+        md5.update(b'\0')
+        md5.update((entry.title or '').encode('utf-8', 'replace'))
+        md5.update(b'\n')
+    return md5.hexdigest()
+
+
 def make_story(feed: Dict,
                fetched_at: dt.datetime,
                entry: ParsedEntry) -> Story:
@@ -970,7 +1551,9 @@ def make_story(feed: Dict,
     s.feed_id = feed["id"]
     s.sources_id = feed["sources_id"]
     s.url = url = entry.url
-    s.normalized_url = urls.normalize_url(url)
+    s.normalized_url = nurl = urls.normalize_url(url)
+    if nurl is not None:
+        s.url_md5 = url_md5(nurl)
     s.domain = urls.canonical_domain(url)
     s.guid = entry.guid
     s.published_at = entry.published_dt
@@ -984,66 +1567,32 @@ def make_story(feed: Dict,
         s.normalized_title = titles.normalize_title(entry.title or "")
         s.normalized_title_hash = hashlib.md5(
             s.normalized_title.encode()).hexdigest()
+        s.title_hash = hash64(s.normalized_title_hash)
     except AttributeError:
         s.title = None
         s.normalized_title = None
         s.normalized_title_hash = None
+        s.title_hash = None
     s.fetched_at = fetched_at
     return s
 
 
 def fetch_and_process_feed(
-        session: SessionType, feed_id: int, start: dt.datetime) -> Update:
+        session: SessionType, item: Item, start: dt.datetime) -> Update:
     """
     Was fetch_feed_content: this is THE routine called in a worker.
     Made a single routine for clarity/communication.
+
+    The Item (read by HeadHunter.refill) has all of the feed's
+    columns needed here, so the fetch starts without a database
+    query.  The Feed row may have been changed (ie; deactivated)
+    since the Item was read: update_feed compares the Item's version
+    with the (locked) Feed row, and discards the results if the row
+    changed.
     """
     stats = Stats.get()         # get singleton
-    with session.begin():
-        # lock row for duration of (sanity-check) transaction:
-        # atomically checks if timestamp from queue matches
-        # f.last_fetch_attempt, and if so, updates last_fetch_attempt
-        # to "start".  While this isn't an IRONCLAD guarantee of
-        # exclusive access, it's a bit of added paranoia
-        # (search for "tri-state" below for an alternatve).
-
-        # (lock for duration of sanity check -- see above)
-        stmt = select(Feed).where(Feed.id == feed_id).with_for_update()
-        f = session.scalars(stmt).one()
-        if f is None:
-            logger.warning(f"feed_worker: feed {feed_id} not found")
-            return NoUpdate('missing')
-
-        # Sanity clause, in case DB entry modified while in queue:
-        # reasons for being declared insane:
-        # * db entry marked inactive by human
-        # * db entry disabled by fetcher
-        # * db entry not marked as queued
-        # * db entry next_fetch_attempt set, and in the future.
-
-        #     Driftwood (Groucho):
-        #       It's all right. That's, that's in every contract.
-        #       That's, that's what they call a sanity clause.
-        #     Fiorello (Chico):
-        #       Ha-ha-ha-ha-ha! You can't fool me.
-        #       There ain't no Sanity Clause!
-        #     Marx Brothers' "Night at the Opera" (1935)
-
-        if (not f.active
-                or not f.system_enabled
-                or not f.queued
-                # OLD: queue_feeds w/ command line used to clear next_fetch_attempt
-                # or f.next_fetch_attempt and f.next_fetch_attempt > start
-            ):
-            logger.info(
-                f"insane: act {f.active} ena {f.system_enabled} qd {f.queued} nxt {f.next_fetch_attempt} last {f.last_fetch_attempt}")
-            # tempting to clear f.queued here if set, but that
-            # increases risk of the feed being queued twice.
-            # instead rely on "stray feed catcher" in scripts/queue_feeds.py
-            return NoUpdate('insane')
-
-        feed = f.as_dict()      # code below expects dict
-    # end with session.begin() & with_for_update (feed row locked)
+    feed_id = item.id
+    feed = item._asdict()       # code below expects dict
 
     start_delay = None
     if feed['next_fetch_attempt']:
@@ -1055,15 +1604,38 @@ def fetch_and_process_feed(
     logger.info(
         f"Feed {feed_id} srcid {feed['sources_id']}: {feed['url']} start_delay {start_delay}")
 
+    # conditional fetch only for feeds with trusted validators
+    conditional = (HTTP_CONDITIONAL_FETCH or
+                   use_conditional(feed['http_trust']))
+
     # first thing is to fetch the content
-    response = _fetch_rss_feed(feed)
+    # (only headers read: body read here, with size limit)
+    response = _fetch_rss_feed(feed, conditional)
+    rsc = response.status_code
+    content = b''
+    new_hash = ''
+    try:
+        # always read 304 (empty) body so connection can be reused.
+        # HTTP error pages only read if saving files.
+        if rsc == 200 or rsc == 304 or SAVE_RSS_FILES:
+            content, new_hash = _read_body(response)
+    except DocumentTooLarge as exc:
+        # BAIL: document too large (only a failure if expected content)
+        if rsc == 200:
+            return Update('too_large', Status.SOFT, 'document too large',
+                          note=str(exc))
+    finally:
+        response.close()        # returns connection to pool if body read
+
+    if rsc == 200:
+        stats.histogram('document.bytes', len(content))
 
     if SAVE_RSS_FILES:
         # NOTE! saves one file per SOURCE!  bug and feature?!
-        _save_rss_files(path.INPUT_RSS_DIR, feed['sources_id'], feed, response)
+        _save_rss_files(path.INPUT_RSS_DIR, feed['sources_id'],
+                        feed, response, content)
 
     # BAIL: HTTP failed (not full response or "Not Changed")
-    rsc = response.status_code
     if rsc != 200 and rsc != 304:
         if rsc in HTTP_SOFT:
             status = Status.SOFT
@@ -1123,11 +1695,20 @@ def fetch_and_process_feed(
     if response.status_code == 200 or lastmod:
         feed_col_updates['http_last_modified'] = lastmod
 
+    if response.status_code == 200:
+        # to count bytes saved by 304 responses
+        feed_col_updates['document_bytes'] = len(content)
+
+    # freshness lifetime (see schedule.freshness_floor):
+    # 304 responses update it too (RFC 9111 section 4.3.4)
+    feed_col_updates['fresh_minutes'] = _http_fresh_mins(response.headers)
+
     # BAIL: server says file hasn't changed (no data returned)
     # treated as success
     if response.status_code == 304:
         # record if feed has ever sent 304 response.
         feed_col_updates['http_304'] = True
+        stats.incr('conditional.bytes_saved', feed['document_bytes'] or 0)
         return Update('not_mod', Status.SUCC, SYS_WORKING,
                       note="not modified",
                       feed_col_updates=feed_col_updates,
@@ -1139,9 +1720,26 @@ def fetch_and_process_feed(
         logger.error(
             f"  Feed {feed_id} - unexpected status {response.status_code}")
 
+    # Checked before parsing to save the CPU time.  last_fetch_hash is
+    # only saved after a successful parse, so feed URLs that are
+    # replaced with HTML will still back off (and be eventually
+    # disabled if UNDEAD_FEEDS not set).
+    # (new_hash computed as document was read)
+    if new_hash == feed['last_fetch_hash']:
+        _check_validators(feed, conditional, etag, lastmod, True,
+                          feed_col_updates)
+        # BAIL: no changes since last time
+        # XXX Maybe update StoryRefs here????
+        return Update('same_hash', Status.SUCC, SYS_WORKING,
+                      note="same hash",
+                      feed_col_updates=feed_col_updates,
+                      no_change=True)
+
     # try to parse the content, parsing all the stories
     try:
-        parsed_feed = parse(feed['url'], response)
+        parsed_feed = parse(feed['url'], content,
+                            requests.utils.get_encoding_from_headers(
+                                response.headers))
         format = parsed_feed.format
         logger.debug(f"  Feed {feed_id} format {format}")
     except JobTimeoutException:
@@ -1152,33 +1750,12 @@ def fetch_and_process_feed(
         if SAVE_PARSE_ERRORS:
             # NOTE! Saving per-feed
             _save_rss_files(path.PARSE_ERROR_DIR, feed['id'],
-                            feed, response, note=repr(exc))
+                            feed, response, content, note=repr(exc))
         return Update('parse_err', Status.SOFT, 'parse error',
                       note=repr(exc))
 
-    # Moved after parse (at the cost of CPU time), but means feed URLs that are
-    # replaced with HTML will back off (and be eventually disabled if
-    # UNDEAD_FEEDS not set)
-    new_hash = hashlib.md5(response.content).hexdigest()
-    if new_hash == feed['last_fetch_hash']:
-        # BAIL: no changes since last time
-        # XXX Maybe update StoryRefs here????
-        return Update('same_hash', Status.SUCC, SYS_WORKING,
-                      note="same hash",
-                      feed_col_updates=feed_col_updates,
-                      no_change=True)
     feed_col_updates['last_fetch_hash'] = new_hash
 
-    save_timeout = len(parsed_feed.entries) * SAVE_STORY_SEC
-    if save_timeout > SAVE_STORY_MAX_SEC:
-        save_timeout = SAVE_STORY_MAX_SEC
-    if save_timeout < SAVE_STORY_MIN_SEC:
-        save_timeout = SAVE_STORY_MIN_SEC
-    set_job_timeout(save_timeout)
-    saved, dup, skipped = save_stories_from_feed(
-        session, start, feed, parsed_feed)
-    set_job_timeout()           # clear timeout alarm
-
     # may update feed_col_updates dict (add new "name")
     check_feed_title(feed, parsed_feed, feed_col_updates)
 
@@ -1191,56 +1768,139 @@ def fetch_and_process_feed(
     if feed['update_minutes'] != update_minutes:
         feed_col_updates['update_minutes'] = update_minutes
 
-    if saved > 0:
-        feed_col_updates['last_new_stories'] = start
+    # RSS freshness hints (FeedState columns)
+    feed_col_updates['ttl_minutes'] = _feed_ttl_mins(parsed_feed)
+    feed_col_updates['skip_hours'] = parsed_feed.skip_hours or None
+    feed_col_updates['skip_days'] = parsed_feed.skip_days or None
+
+    # size of feed's "window" (for fetcher.schedule.predict_minutes)
+    feed_col_updates['entry_count'] = len(parsed_feed.entries)
+
+    # Many documents change only in timestamps (ie; lastBuildDate)
+    # or tracking parameters: check if the list of entries changed.
+    entries_hash = _entries_fingerprint(parsed_feed.entries)
+    same_entries = entries_hash == feed['last_entries_hash']
+    _check_validators(feed, conditional, etag, lastmod, same_entries,
+                      feed_col_updates)
+    if same_entries:
+        # BAIL: same stories as last time
+        return Update('same_entries', Status.SUCC, SYS_WORKING,
+                      note="same entries",
+                      feed_col_updates=feed_col_updates,
+                      no_change=True)
+    feed_col_updates['last_entries_hash'] = entries_hash
 
-    return Update('ok', Status.SUCC, SYS_WORKING,
-                  note=f"{skipped} skipped / {dup} dup / {saved} added",
-                  feed_col_updates=feed_col_updates,
-                  saved=saved, dup=dup, skipped=skipped,
-                  start_delay=start_delay)
+    u = Update('ok', Status.SUCC, SYS_WORKING,
+               feed_col_updates=feed_col_updates,
+               start_delay=start_delay,
+               ingest=prepare_ingest(session, start, feed, parsed_feed))
+    if RSS_FETCH_WRITERS > 0:
+        # stories saved (and Feed updated) by a writer process
+        return u._replace(note="to writer")
+    return _store_update(session, u)
 
 
-def save_stories_from_feed(session: SessionType,
-                           start: dt.datetime,
-                           feed: Dict,  # db entry
-                           parsed_feed: ParsedFeed) -> Tuple[int, int, int]:
+def _lookup_story_ids(session: SessionType,
+                      normalized_urls: List[str]) -> Dict[str, int]:
     """
-    Take parsed feed, so insert all the (valid) entries.
-    returns (saved_count, dup_count, skipped_count)
+    return dict of normalized_url to id for existing Stories.
+
+    Locks the Stories (against db_archive) so Ref creation is
+    conflict free.  "KEY SHARE" doesn't block other workers.
+    Called inside a transaction.
     """
-    stats = Stats.get()         # get singleton
+    if not normalized_urls:
+        return {}
+    t0 = time.monotonic()
+    wanted = set(normalized_urls)
+    ret = {}
+    # url_md5 index is much smaller than an index on the URL text:
+    # check for (astronomically unlikely) hash collisions.
+    # (probes the url_md5 index of each stories partition)
+    for nurl, story_id in session.execute(
+            select(Story.normalized_url, Story.id)
+            .where(Story.url_md5.in_([url_md5(nurl) for nurl in wanted]))
+            .with_for_update(key_share=True)):
+        if nurl in wanted:
+            ret[nurl] = story_id
+        else:
+            logger.warning("url_md5 collision: %s", nurl)
+            Stats.get().incr('hash_collision', labels=[('type', 'url')])
+    Stats.get().timing('story.lookup', time.monotonic() - t0)
+    return ret
 
-    def stories_incr(status: str, inc: int = 1) -> None:
-        """call exactly ONCE for each story processed"""
-        stats.incr('stories', inc, labels=[('stat', status)])
 
-    skipped_count = dup_count = saved_count = 0
-    parsed_feed_url = None
-    feed_url_scheme = None
+def _lock_urls(session: SessionType, md5s: Iterable[uuid.UUID]) -> None:
+    """
+    Take transaction advisory locks on (the first 64 bits of) url_md5
+    values, in key order (so Workers can't deadlock), so only one
+    transaction at a time saves a given new URL: the unique url_md5
+    index is per partition, and can't catch the same URL saved with
+    different fetched_at days (by Workers racing at midnight UTC).
+    Called inside a transaction (locks released at commit/rollback).
+    """
+    keys = sorted({hash64(md5.hex) for md5 in md5s})
+    if keys:
+        # unnest returns array elements in order
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(k)"
+                 " FROM unnest(CAST(:keys AS bigint[])) AS k"),
+            {'keys': keys})
 
-    # truncating here rather than in feed-type dependant paths, so
-    # there is only one place (at the cost of extra conversions).
-    # Setting MAX_STORIES_PER_FEED to zero means unlimited.
-    entries = parsed_feed.entries
-    nentries = len(entries)
-    if MAX_STORIES_PER_FEED > 0 and nentries > MAX_STORIES_PER_FEED:
-        tossed = nentries - MAX_STORIES_PER_FEED
-        logger.warning("Feed %d (%s) returned %d stories; tossing %d",
-                       feed["id"], feed["url"], nentries, tossed)
-        entries = entries[:MAX_STORIES_PER_FEED]
-        stories_incr("tossed", tossed)
-        skipped_count += tossed
 
+def _stories_incr(status: str, inc: int = 1) -> None:
+    """call exactly ONCE for each story processed"""
+    Stats.get().incr('stories', inc, labels=[('stat', status)])
+
+
+@dataclass
+class Ingest:
+    """
+    Entries from a feed document, prepared by prepare_ingest (without
+    writing to the database) for store_ingest.  Passed from fetch
+    Workers to writer processes when RSS_FETCH_WRITERS is set, so
+    Stories are kept as dicts of column values.
+    """
+    feed_id: int
+    sources_id: Optional[int]
+    start: dt.datetime
+    # SeenEntries for feed: entry URL hash to story id
+    prev_seen: Dict[int, int]
+    # entries in prev_seen, by story id: [(URL hash, entry), ....]
+    known: Dict[int, List[Tuple[int, ParsedEntry]]]
+    # new entries: [(URL hash, Story columns), ....]
+    candidates: List[Tuple[int, Dict[str, Any]]]
+    skipped: int                # entries skipped so far
+
+    def count(self) -> int:
+        """
+        number of entries to be stored
+        """
+        return len(self.candidates) + sum(len(k) for k in self.known.values())
+
+
+def _make_candidates(feed: Dict,
+                     start: dt.datetime,
+                     entries: List[ParsedEntry]
+                     ) -> Tuple[List[Tuple[int, Dict[str, Any]]], int]:
+    """
+    skip unwanted entries (no database access), and make
+    Story column dicts for the rest.
+    returns ([(URL hash, Story columns), ....], skipped_count)
+    """
+    skipped_count = 0
+    parsed_feed_url = None
+    feed_url_scheme = None
+    candidates = []
     for entry in entries:
         try:
-            t0 = time.monotonic()
             link = entry.url
             if link is None:
                 logger.debug(" * skip missing URL")
-                stories_incr('nourl')
+                _stories_incr('nourl')
                 skipped_count += 1
                 continue
+            url_hash = _url_hash(link)
 
             if not util.is_absolute_url(link):
                 # skip relative URLs
@@ -1251,7 +1911,7 @@ def save_stories_from_feed(session: SessionType,
                     f" * skip relative URL: %s (feed %s)",
                     link,
                     feed['id'])
-                stories_incr('relurl')
+                _stories_incr('relurl')
                 skipped_count += 1
                 continue
 
@@ -1276,7 +1936,7 @@ def save_stories_from_feed(session: SessionType,
 
             if len(link) > MAX_URL:
                 logger.debug(f" * URL too long: {link}")
-                stories_incr('toolong')
+                _stories_incr('toolong')
                 skipped_count += 1
                 continue
 
@@ -1288,9 +1948,9 @@ def save_stories_from_feed(session: SessionType,
                     if SKIP_HOME_PAGES:
                         logger.info(f" * skip homepage URL: {link}")
                         if '?' in link:
-                            stories_incr('home_query')
+                            _stories_incr('home_query')
                         else:
-                            stories_incr('home')
+                            _stories_incr('home')
                         skipped_count += 1
                         continue
 
@@ -1299,7 +1959,7 @@ def save_stories_from_feed(session: SessionType,
                 s = make_story(feed, start, entry)
             except (ValueError, TypeError) as e:
                 logger.debug(" * bad URL: %s: %r", link, e)
-                stories_incr('bad')
+                _stories_incr('bad')
                 skipped_count += 1
                 continue
 
@@ -1307,64 +1967,20 @@ def save_stories_from_feed(session: SessionType,
             # we see a lot in feeds
             if mcmetadata.urls.is_non_news_domain(s.domain):
                 logger.debug(f" * skip non_news_domain URL: {link}")
-                stories_incr('nonews')
+                _stories_incr('nonews')
                 skipped_count += 1
                 continue
 
             # only save if url is unique, and title is unique recently
             if s.normalized_url is None:
                 logger.debug(f" * no normalized_url")
-                stories_incr('nonurl')
+                _stories_incr('nonurl')
                 skipped_count += 1
                 continue
 
-            with session.begin():
-                # excess paranoia: lock Story row so Ref creation conflict free
-                os = session.scalars(select(Story)
-                                     .where(Story.normalized_url == s.normalized_url)
-                                     .with_for_update())\
-                            .one_or_none()
-                if os is not None:
-                    sr = StoryRef(story_id=os.id,
-                                  feed_id=feed["id"], seen_at=start)
-                    # ref may exist (previously seen from this feed), or not:
-                    session.merge(sr)
-                    session.commit()
-                    logger.debug(
-                        f" * skip duplicate normalized URL: %s | %s", link, s.normalized_url)
-                    stories_incr('dup_url')
-                    dup_count += 1
-                    continue
-
-                if normalized_title_exists(session, s.normalized_title_hash, s.sources_id):
-                    # raised to info 2022-10-27, lowered back to debug 2026-06-21!
-                    logger.debug(
-                        f" * skip duplicate title URL: {link} | {s.normalized_title} | {s.sources_id}")
-                    stories_incr('dup_title')
-                    dup_count += 1
-                    continue
-
-            with session.begin():
-                # need to commit one by one so duplicate URL keys don't stop a larger insert from happening
-                # those are (somewhat) *expected* errors, so we can ignore (but count) them
-                try:
-                    session.add(s)
-                    session.flush()  # to get id; Story row now locked (can give exception!)
-
-                    sr = StoryRef(
-                        story_id=s.id, feed_id=feed["id"], seen_at=start)
-                    session.merge(sr)  # paranoia
-                    session.commit()
-                    stories_incr('ok')
-                    saved_count += 1
-                    stats.timing('story.save', time.monotonic() - t0)
-                except (IntegrityError, PendingRollbackError, UniqueViolation):
-                    # semi-expected exception - log and ignore
-                    logger.debug(
-                        f" * duplicate normalized URL: {s.normalized_url}")
-                    stories_incr('dupurl2')
-                    dup_count += 1
-                    continue
+            row = s.as_dict()
+            del row['id']
+            candidates.append((url_hash, row))
         except (AttributeError, KeyError, ValueError, UnicodeError) as exc:
             # NOTE!! **REALLY** easy for coding errors to end up here!!!
             # couldn't parse the entry - skip it
@@ -1377,14 +1993,357 @@ def save_stories_from_feed(session: SessionType,
             # NOTE! can end up here if is_homepage_url not called!
             logger.exception(f"bad rss entry {link}")
 
-            stories_incr('bad2')
+            _stories_incr('bad2')
             skipped_count += 1
+    return candidates, skipped_count
+
+
+def _new_generation(session: SessionType,
+                    feed_id: int,
+                    start: dt.datetime) -> int:
+    """
+    create (and return number of) new FeedGeneration for feed.
+    Called inside a transaction.
+    """
+    gen = session.scalar(
+        select(func.coalesce(func.max(FeedGeneration.gen), 0) + 1)
+        .where(FeedGeneration.feed_id == feed_id))
+    assert gen is not None
+    session.execute(insert(FeedGeneration)
+                    .values(feed_id=feed_id, gen=gen, seen_at=start))
+    return int(gen)
+
+
+def _store_stories(session: SessionType,
+                   feed_id: int,
+                   gen: int,
+                   sources_id: Optional[int],
+                   start: dt.datetime,
+                   candidates: List[Tuple[int, Dict[str, Any]]],
+                   seen: Dict[int, int]
+                   ) -> Tuple[int, int, int, int, List[Dict[str, Any]]]:
+    """
+    Save new Stories and create/refresh StoryRefs for a batch of
+    (URL hash, Story columns) pairs from one feed, in document order,
+    with a fixed number of statements.
+
+    Gives the same results as checking and saving one at a time:
+    a Story that duplicates (by URL or title) one earlier in the
+    batch is a duplicate.  Adds URL hash to story id entries to `seen`.
+
+    Called inside a transaction.
+    returns (saved, dup_url, dup_title, dupurl2) counts, and the
+    inserted Story rows (for remember_title once committed)
+    """
+    stats = Stats.get()
+    nurls = list({row['normalized_url'] for _, row in candidates})
+    if _dedup_filter is not None:
+        # only look up URLs that might have been saved before;
+        # the rest are inserted directly.
+        lookup = [nurl for nurl in nurls if nurl in _dedup_filter]
+        unlooked = set(nurls) - set(lookup)
+        stats.incr('dedup_filter', len(lookup), labels=[('stat', 'hit')])
+        stats.incr('dedup_filter', len(unlooked), labels=[('stat', 'miss')])
+    else:
+        lookup = nurls
+        unlooked = set()
+    existing = _lookup_story_ids(session, lookup)
+    if _dedup_filter is not None and len(existing) < len(lookup):
+        stats.incr('dedup_filter', len(lookup) - len(existing),
+                   labels=[('stat', 'false_pos')])
+
+    title_hashes = {row['normalized_title_hash'] for _, row in candidates
+                    if row['normalized_url'] not in existing}
+    titles = normalized_titles_exist(session, title_hashes, sources_id)
+    earliest = dt.datetime.combine(_earliest_title_date(), dt.time())
+
+    dup_urls = dup_titles = 0
+    ref_ids = set()
+    new: Dict[str, Dict[str, Any]] = {}  # by normalized_url
+    new_hashes: List[Tuple[int, str]] = []  # (URL hash, normalized_url)
+    for url_hash, row in candidates:
+        nurl = row['normalized_url']
+        title_hash = row['normalized_title_hash']
+        story_id = existing.get(nurl)
+        if story_id is not None:
+            logger.debug(f" * skip duplicate normalized URL: %s | %s",
+                         row['url'], nurl)
+            ref_ids.add(story_id)
+            seen[url_hash] = story_id
+            dup_urls += 1
+        elif nurl in new:
+            # duplicate of entry earlier in document
+            logger.debug(f" * skip duplicate normalized URL: %s | %s",
+                         row['url'], nurl)
+            new_hashes.append((url_hash, nurl))
+            dup_urls += 1
+        elif title_hash in titles:
+            # raised to info 2022-10-27, lowered back to debug 2026-06-21!
+            logger.debug(
+                f" * skip duplicate title URL: {row['url']} | {row['normalized_title']} | {sources_id}")
+            dup_titles += 1
+        else:
+            new[nurl] = row
+            new_hashes.append((url_hash, nurl))
+            # visible to title check for later entries
+            # (if it would have been found by the query)
+            published_at = row['published_at']
+            if (title_hash is not None and
+                    sources_id is not None and
+                    published_at is not None and
+                    published_at >= earliest):
+                titles.add(title_hash)
+
+    saved = dup_urls2 = 0
+    saved_rows = []
+    if new:
+        # insert in url_md5 order, so Workers saving overlapping
+        # URLs wait on each other, rather than deadlocking.
+        rows = sorted(new.values(), key=lambda row: row['url_md5'])
+        _lock_urls(session, (row['url_md5'] for row in rows))
+
+        # Stories inserted (by another Worker) since the lookup above
+        # are (somewhat) *expected*: with the locks held, look again
+        # (sees rows committed since), and skip and count them.
+        found = _lookup_story_ids(session, list(new))
+        rows = [row for row in rows if row['normalized_url'] not in found]
+
+        # No conflict target: stories is partitioned, and the unique
+        # url_md5 index is per-partition (locks above keep URLs unique).
+        inserted: Dict[str, int] = {}
+        for i in range(0, len(rows), INSERT_BATCH_ROWS):
+            for nurl, story_id in session.execute(
+                    insert(Story)
+                    .values(rows[i:i + INSERT_BATCH_ROWS])
+                    .on_conflict_do_nothing()
+                    .returning(Story.normalized_url, Story.id)):
+                inserted[nurl] = story_id
+        saved = len(inserted)
+        conflicts = [nurl for nurl in new if nurl not in inserted]
+        for nurl in conflicts:
+            logger.debug(f" * duplicate normalized URL: {nurl}")
+
+        # URLs not looked up (dedup filter miss) that were saved by
+        # someone else (ie; not yet in filter): treat as regular
+        # duplicates (their titles have already been checked).
+        missed = sum(1 for nurl in found if nurl in unlooked)
+        if missed:
+            stats.incr('dedup_filter', missed,
+                       labels=[('stat', 'conflict')])
+            dup_urls += missed
+        dup_urls2 = len(conflicts) - missed
+        saved_rows = [row for nurl, row in new.items() if nurl in inserted]
+        if _dedup_filter is not None:
+            _dedup_filter.add_many(inserted)
+        inserted.update(found)  # for refs
+        for url_hash, nurl in new_hashes:
+            story_id = inserted.get(nurl)
+            if story_id is not None:
+                ref_ids.add(story_id)
+                seen[url_hash] = story_id
+
+    # refs may exist (previously seen from this feed), or not:
+    refs = [{'story_id': story_id, 'feed_id': feed_id,
+             'seen_at': start, 'gen': gen}
+            for story_id in sorted(ref_ids)]  # lock in key order
+    for i in range(0, len(refs), INSERT_BATCH_ROWS):
+        stmt = insert(StoryRef).values(refs[i:i + INSERT_BATCH_ROWS])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[StoryRef.story_id, StoryRef.feed_id],
+            set_={'seen_at': stmt.excluded.seen_at,
+                  'gen': stmt.excluded.gen}))
+
+    return saved, dup_urls, dup_titles, dup_urls2, saved_rows
+
+
+def prepare_ingest(session: SessionType,
+                   start: dt.datetime,
+                   feed: Dict,  # db entry
+                   parsed_feed: ParsedFeed) -> Ingest:
+    """
+    First half of saving stories from a parsed feed: only reads
+    from the database.
+    """
+    skipped_count = 0
+
+    # truncating here rather than in feed-type dependant paths, so
+    # there is only one place (at the cost of extra conversions).
+    # Setting MAX_STORIES_PER_FEED to zero means unlimited.
+    entries = parsed_feed.entries
+    nentries = len(entries)
+    if MAX_STORIES_PER_FEED > 0 and nentries > MAX_STORIES_PER_FEED:
+        tossed = nentries - MAX_STORIES_PER_FEED
+        logger.warning("Feed %d (%s) returned %d stories; tossing %d",
+                       feed["id"], feed["url"], nentries, tossed)
+        entries = entries[:MAX_STORIES_PER_FEED]
+        _stories_incr("tossed", tossed)
+        skipped_count += tossed
+
+    # Entries that resolved to a Story on the last fetch that saved
+    # stories (usually most of them) skip the per-entry dedup path:
+    # their StoryRefs are refreshed with a single UPDATE.
+    with session.begin():
+        prev_seen = _load_seen_entries(session, feed["id"])
+
+    known: Dict[int, List[Tuple[int, ParsedEntry]]] = {}
+    if prev_seen:
+        new_entries = []
+        for entry in entries:
+            if entry.url is not None:
+                url_hash = _url_hash(entry.url)
+                story_id = prev_seen.get(url_hash)
+                if story_id is not None:
+                    known.setdefault(story_id, []).append((url_hash, entry))
+                    continue
+            new_entries.append(entry)
+        entries = new_entries
+
+    candidates, skipped = _make_candidates(feed, start, entries)
+    return Ingest(feed_id=feed["id"], sources_id=feed["sources_id"],
+                  start=start, prev_seen=prev_seen, known=known,
+                  candidates=candidates, skipped=skipped_count + skipped)
+
+
+def store_ingest(session: SessionType,
+                 ingest: Ingest) -> Tuple[int, int, int]:
+    """
+    Second half of saving stories from a parsed feed: all the writes.
+    returns (saved_count, dup_count, skipped_count)
+    """
+    stats = Stats.get()         # get singleton
+    feed_id = ingest.feed_id
+    start = ingest.start
+    candidates = ingest.candidates
+    skipped_count = ingest.skipped
+    dup_count = saved_count = 0
+    seen: Dict[int, int] = {}   # URL hash to story id, for next time
+
+    # StoryRefs for all stories in this document point to a new generation
+    gen = 0
+    if ingest.known or candidates:
+        with session.begin():
+            gen = _new_generation(session, feed_id, start)
+
+    if ingest.known:
+        with session.begin():
+            # only returns refs (and stories) not yet archived
+            refreshed = set(session.scalars(
+                update(StoryRef)
+                .where(StoryRef.feed_id == feed_id,
+                       StoryRef.story_id.in_(ingest.known))
+                .values(seen_at=start, gen=gen)
+                .returning(StoryRef.story_id)
+                .execution_options(synchronize_session=False)))
+        nseen = 0
+        stale: List[ParsedEntry] = []
+        for story_id, known_entries in ingest.known.items():
+            if story_id in refreshed:
+                for url_hash, entry in known_entries:
+                    seen[url_hash] = story_id
+                nseen += len(known_entries)
+            else:
+                stale.extend(entry for _, entry in known_entries)
+        if nseen:
+            _stories_incr('dup_url', nseen)
+            dup_count += nseen
+            stats.incr('seen_entries', nseen, labels=[('stat', 'hit')])
+        if stale:
+            # take the long way
+            stats.incr('seen_entries', len(stale),
+                       labels=[('stat', 'stale')])
+            feed = {'id': feed_id, 'sources_id': ingest.sources_id}
+            more, skipped = _make_candidates(feed, start, stale)
+            candidates = candidates + more
+            skipped_count += skipped
+        logger.debug("  Feed %d: %d entries seen last time, %d stale",
+                     feed_id, nseen, len(stale))
+
+    # dedup and insert all the candidates in one transaction.
+    if candidates:
+        t0 = time.monotonic()
+        for retry in (False, True):
+            try:
+                with session.begin():
+                    saved, dup_urls, dup_titles, dup_urls2, rows = \
+                        _store_stories(session, feed_id, gen,
+                                       ingest.sources_id, start,
+                                       candidates, seen)
+                break
+            except OperationalError as e:
+                # rare (rows are locked in key order): try once more
+                # rather than failing the fetch
+                if retry or not isinstance(e.orig, DeadlockDetected):
+                    raise
+                logger.warning("  Feed %d: deadlock saving stories; retrying",
+                               feed_id)
+                stats.incr('story.deadlock')
+        # only once committed (else titles never saved look like dups)
+        for row in rows:
+            remember_title(ingest.sources_id, row['normalized_title_hash'],
+                           row['published_at'])
+        if saved:
+            _stories_incr('ok', saved)
+            saved_count += saved
+            # average per (new) story, for comparison with old values
+            stats.timing('story.save', (time.monotonic() - t0) / saved)
+        if dup_urls:
+            _stories_incr('dup_url', dup_urls)
+        if dup_titles:
+            _stories_incr('dup_title', dup_titles)
+        if dup_urls2:
+            _stories_incr('dupurl2', dup_urls2)
+        dup_count += dup_urls + dup_titles + dup_urls2
+
+    if seen != ingest.prev_seen:
+        with session.begin():
+            _save_seen_entries(session, feed_id, start, seen)
 
     # assert len(parsed_feed.entries) == (saved_count+dup_count+skipped_count)
     # ???
     return saved_count, dup_count, skipped_count
 
 
+def save_stories_from_feed(session: SessionType,
+                           start: dt.datetime,
+                           feed: Dict,  # db entry
+                           parsed_feed: ParsedFeed) -> Tuple[int, int, int]:
+    """
+    Take parsed feed, so insert all the (valid) entries.
+    returns (saved_count, dup_count, skipped_count)
+    """
+    return store_ingest(session,
+                        prepare_ingest(session, start, feed, parsed_feed))
+
+
+def _store_update(session: SessionType, u: Update) -> Update:
+    """
+    save stories in an Update returned by fetch_and_process_feed
+    (in a fetch Worker, or a writer process), and return the
+    Update for update_feed.
+    """
+    ingest = u.ingest
+    assert ingest is not None
+
+    save_timeout = ingest.count() * SAVE_STORY_SEC
+    if save_timeout > SAVE_STORY_MAX_SEC:
+        save_timeout = SAVE_STORY_MAX_SEC
+    if save_timeout < SAVE_STORY_MIN_SEC:
+        save_timeout = SAVE_STORY_MIN_SEC
+    set_job_timeout(save_timeout)
+    saved, dup, skipped = store_ingest(session, ingest)
+    set_job_timeout()           # clear timeout alarm
+
+    feed_col_updates = u.feed_col_updates
+    if saved > 0:
+        feed_col_updates = dict(feed_col_updates,
+                                last_new_stories=ingest.start)
+
+    return u._replace(note=f"{skipped} skipped / {dup} dup / {saved} added",
+                      feed_col_updates=feed_col_updates,
+                      saved=saved, dup=dup, skipped=skipped,
+                      ingest=None)
+
+
 def check_feed_title(feed: Dict,
                      parsed_feed: ParsedFeed,
                      feed_col_updates: Dict) -> None:
@@ -1403,24 +2362,30 @@ def check_feed_title(feed: Dict,
 ################
 
 
-def feed_worker(item: Item) -> None:
+def feed_worker(item: Item) -> Optional[Completion]:
     """
     Fetch a feed, parse out stories, store them
     :param self: this maintains the single session to use for all DB operations
     :param feed_id: integer Feed id
+
+    When RSS_FETCH_WRITERS is set, returns (feed_id, start, Update)
+    for feed_writer if there are stories to save.
+
+    When RSS_FETCH_COMPLETION_MS is set, returns (feed_id, start, Update)
+    for update_feeds (called by the Manager) rather than calling update_feed.
     """
 
     feed_id = item.id
 
     # This date/time is used thruout:
-    # * Feed.last_fetch_{attempt,success}
-    # * FetchEvents.created_at
+    # * FeedState.last_fetch_{attempt,success}
+    # * FetchEvent.created_at
     # * Story.{fetched,seen}_at
     start = dt.datetime.utcnow()
     try:
         # here is where the actual work is done:
         with Session() as session:
-            u = fetch_and_process_feed(session, feed_id, start)
+            u = fetch_and_process_feed(session, item, start)
     except requests.exceptions.RequestException as exc:
         status, system_status = request_exception_to_status(feed_id, exc)
         u = Update(system_status.lower().replace(' ', '_'),
@@ -1438,6 +2403,7 @@ def feed_worker(item: Item) -> None:
                    note=repr(exc))
 
     set_job_timeout()           # clear timeout alarm
+    u = u._replace(version=item.version, load_factor=item.load_factor)
     # fetch + processing time:
     total_td = dt.datetime.utcnow() - start
     total_sec = total_td.total_seconds()
@@ -1455,9 +2421,61 @@ def feed_worker(item: Item) -> None:
     stats.timing('total', total_sec,
                  labels=[('status', u.status.name)])
 
+    if u.ingest is not None:
+        # stories saved, and Feed updated by feed_writer
+        return (feed_id, start, u)
+
     if u.status != Status.NOUPD:
+        if RSS_FETCH_COMPLETION_MS:
+            # write-behind: Feed updated by update_feeds
+            return (feed_id, start, u)
+
         with Session() as session:
             update_feed(session, feed_id, start, u)
 
         # if repeated Status.TEMP errors seen, sleep here??
         # (to avoid spinning through feeds incrementing failures)
+    return None
+
+
+def feed_writer(records: List[Completion]
+                ) -> List[Tuple[int, int, int, int]]:
+    """
+    Called in writer processes with records returned by feed_worker:
+    save stories and update Feed rows (all in one transaction at the
+    end if RSS_FETCH_COMPLETION_MS set).
+    returns [(feed_id, saved, dup, skipped), ....]
+    """
+    stats = Stats.get()
+    ret = []
+    completions = []
+    for feed_id, start, u in records:
+        t0 = time.monotonic()
+        try:
+            with Session() as session:
+                u = _store_update(session, u)
+        except JobTimeoutException:
+            u = Update('job_timeout', Status.SOFT, 'job timeout',
+                       version=u.version, load_factor=u.load_factor)
+        except Exception as exc:
+            logger.exception("feed_writer")
+            u = Update('exception', Status.SOFT, 'caught exception',
+                       note=repr(exc), version=u.version,
+                       load_factor=u.load_factor)
+        set_job_timeout()       # clear timeout alarm
+
+        logger.info(
+            f"  Feed {feed_id} {u.status.value} (writer): {u.sys_status}; {u.note or ''}")
+        stats.incr('writer.feeds', labels=[('stat', u.counter)])
+
+        if RSS_FETCH_COMPLETION_MS:
+            completions.append((feed_id, start, u))
+        else:
+            with Session() as session:
+                update_feed(session, feed_id, start, u)
+        stats.timing('writer.feed', time.monotonic() - t0)
+        ret.append((feed_id, u.saved or 0, u.dup or 0, u.skipped or 0))
+
+    if completions:
+        write_completions(completions)
+    return ret
@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from fetcher.activity import ACTIVITY_MIN, profiles
+from fetcher.schedule import ACTIVITY_HOURS, ACTIVITY_SCALE
+
+
+class TestProfiles(unittest.TestCase):
+
+    def test_profiles(self) -> None:
+        counts = np.zeros((3, ACTIVITY_HOURS), dtype=np.float64)
+        counts[1, :] = 10                   # even
+        counts[2, 9::24] = 1000             # 09:00 every day
+        p = profiles(counts)
+
+        assert p.shape == (3, ACTIVITY_HOURS)
+        # no stories, and evenly spread: flat
+        assert (p[0] == ACTIVITY_SCALE).all()
+        assert (p[1] == ACTIVITY_SCALE).all()
+
+        # busy hour (and neighbors) above average, rest below
+        busy = p[2]
+        assert busy[9] == 255
+        assert busy[8] > ACTIVITY_SCALE
+        assert busy[10] > ACTIVITY_SCALE
+        assert ACTIVITY_MIN <= busy[12] < ACTIVITY_SCALE
+        assert len(busy.tobytes()) == ACTIVITY_HOURS
+
+    def test_mean(self) -> None:
+        # clipping must not change average interval
+        counts = np.zeros((3, ACTIVITY_HOURS), dtype=np.float64)
+        counts[0, 9::24] = 1000             # 09:00 every day
+        counts[1, 9::24] = 5
+        counts[2, 100] = 10000              # one hour a week
+        p = profiles(counts)
+        for mean in p.mean(axis=1):
+            self.assertAlmostEqual(mean, ACTIVITY_SCALE, delta=0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
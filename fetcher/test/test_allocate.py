@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from fetcher.allocate import allocate, bounds, load, report
+from fetcher.test.test_schedule import POLICY
+
+
+def array(*values: float) -> np.ndarray:
+    return np.array(values, dtype=np.float64)
+
+
+class TestAllocate(unittest.TestCase):
+
+    def test_bounds(self) -> None:
+        low, high = bounds(POLICY,
+                           array(1.0, 0.0, 100.0, 1.0),  # rate
+                           array(0.0, 0.0, 0.0, 0.25),   # var
+                           np.array([0, 0, 10, 20]),     # entries
+                           np.array([0, 120, 0, 0]),     # update_minutes
+                           1440)
+        assert list(low) == [60, 120, 60, 60]
+        # window: 25% of 2000 at 1/hour; nothing new;
+        # 25% of 10 at 100/hour (not below low);
+        # 25% of 20 at 2/hour
+        assert list(high) == [1440, 1440, 60, 150]
+
+    def test_budget(self) -> None:
+        rate = array(4.0, 1.0, 0.25, 0.0)
+        low = array(10, 10, 10, 10)
+        high = array(1440, 1440, 1440, 1440)
+
+        # plenty of budget
+        assert list(allocate(rate, low, high, 100.0)) == list(low)
+
+        # too little
+        assert list(allocate(rate, low, high, 0.1)) == list(high)
+
+        minutes = allocate(rate, low, high, 2.0)
+        assert load(minutes) <= 2.0
+        assert load(minutes) > 1.9
+        # proportional to 1/sqrt(rate)
+        assert minutes[3] == 1440
+        assert abs(minutes[1] / minutes[0] - 2) < 0.05
+        assert abs(minutes[2] / minutes[1] - 2) < 0.05
+
+        # clamped feed gives its share to the others
+        low2 = array(10, 10, 10, 10)
+        high2 = array(1440, 1440, 100, 1440)
+        minutes2 = allocate(rate, low2, high2, 2.0)
+        assert minutes2[2] == 100
+        assert minutes2[0] > minutes[0]
+
+    def test_report(self) -> None:
+        r = report(array(1.0, 3.0), array(60, 120))
+        assert r.feeds == 2
+        assert r.load == 1.5
+        assert r.stories == 4.0
+        assert r.delay == (60 + 3 * 120) / 2 / 4
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import unittest
+
+from fetcher.bloom import BloomFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_add(self) -> None:
+        bf = BloomFilter(1024, 100)
+        urls = [f"http://example.com/story/{i}" for i in range(100)]
+        bf.add_many(urls[:50])
+        bf.add(urls[50])
+        for url in urls[:51]:
+            assert url in bf
+        misses = sum(1 for url in urls[51:] if url not in bf)
+        assert misses >= 40     # est. fp rate is ~2%
+        assert bf.entries == 51
+        assert bf.false_positive_rate() < 0.05
+
+    def test_shared(self) -> None:
+        bf = BloomFilter(1024, 100)
+        pid = os.fork()
+        if pid == 0:
+            bf.add('http://example.com/child')
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert 'http://example.com/child' in bf
+        assert bf.entries == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
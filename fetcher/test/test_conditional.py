@@ -0,0 +1,50 @@
+import unittest
+
+from fetcher.conditional import (CHANGED, SAME, STALE, STALE_PENALTY,
+                                 check_validators, new_trust, trusted,
+                                 use_conditional)
+
+ETAG = 'W/"abc"'
+LASTMOD = 'Mon, 19 Oct 2026 12:00:00 GMT'
+
+
+class TestConditional(unittest.TestCase):
+    def test_check_validators(self) -> None:
+        # nothing saved, or nothing to compare:
+        assert check_validators(None, None, ETAG, LASTMOD, True) is None
+        assert check_validators(ETAG, None, None, LASTMOD, True) is None
+
+        assert check_validators(ETAG, None, ETAG, None, True) == SAME
+        assert check_validators(ETAG, None, 'W/"def"', None, True) == CHANGED
+        assert check_validators(ETAG, None, 'W/"def"', None, False) == CHANGED
+        assert check_validators(ETAG, None, ETAG, None, False) == STALE
+
+        # Last-Modified only checked without an ETag:
+        assert check_validators(None, LASTMOD, None, LASTMOD, False) == STALE
+        assert check_validators(ETAG, LASTMOD, 'x', LASTMOD, False) == CHANGED
+
+    def test_trust(self) -> None:
+        trust = None
+        for i in range(3):
+            assert not trusted(trust, 3)
+            trust = new_trust(trust, SAME, 3)
+        assert trusted(trust, 3)
+        assert new_trust(trust, CHANGED, 3) == 3  # capped
+        assert new_trust(trust, None, 3) == 3
+
+        trust = new_trust(trust, STALE, 3)
+        assert trust == -STALE_PENALTY
+        assert not trusted(trust, 3)
+
+        # disabled:
+        assert not trusted(100, 0)
+
+    def test_use_conditional(self) -> None:
+        assert not use_conditional(None, 3, 0)
+        assert use_conditional(3, 3, 0)
+        assert not use_conditional(3, 3, 100)   # always checked
+        assert not use_conditional(3, 0, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
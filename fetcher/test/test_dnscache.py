@@ -0,0 +1,62 @@
+import socket
+import unittest
+from typing import Any, List
+
+from fetcher.dnscache import DNSCache
+from fetcher.stats import Stats
+
+if Stats._instance is None:
+    Stats.init('test')
+
+
+class FakeResolver:
+    def __init__(self) -> None:
+        self.calls: List[Any] = []
+
+    def getaddrinfo(self, host: str, port: int, *args: Any) -> List[Any]:
+        self.calls.append(host)
+        if host == 'nx.example':
+            raise socket.gaierror(socket.EAI_NONAME,
+                                  'Name or service not known')
+        if host == 'again.example':
+            raise socket.gaierror(socket.EAI_AGAIN,
+                                  'Temporary failure in name resolution')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', port))]
+
+
+class TestDNSCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.resolver = FakeResolver()
+        self.cache = DNSCache(self.resolver.getaddrinfo, 60, 60, 2)
+
+    def test_positive(self) -> None:
+        a = self.cache.lookup('www.example', 443)
+        b = self.cache.lookup('www.example', 443)
+        assert a == b
+        assert self.resolver.calls == ['www.example']
+
+    def test_negative(self) -> None:
+        for i in range(2):
+            with self.assertRaises(socket.gaierror) as cm:
+                self.cache.lookup('nx.example', 80)
+            assert cm.exception.errno == socket.EAI_NONAME
+            assert 'Name or service not known' in str(cm.exception)
+        assert self.resolver.calls == ['nx.example']
+
+    def test_temporary_not_cached(self) -> None:
+        for i in range(2):
+            with self.assertRaises(socket.gaierror):
+                self.cache.lookup('again.example', 80)
+        assert self.resolver.calls == ['again.example', 'again.example']
+
+    def test_lru(self) -> None:
+        self.cache.lookup('a.example', 80)
+        self.cache.lookup('b.example', 80)
+        self.cache.lookup('c.example', 80)  # pushes out a.example
+        self.cache.lookup('a.example', 80)
+        assert self.resolver.calls.count('a.example') == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
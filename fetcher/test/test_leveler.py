@@ -0,0 +1,75 @@
+import datetime as dt
+import unittest
+
+from fetcher.leveler import Leveler
+
+NOW = dt.datetime(2026, 10, 19, 12, 0, 0)
+
+
+class TestLeveler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.lev = Leveler(bucket_mins=5)
+
+    def fill(self, when: dt.datetime, count: int) -> None:
+        self.lev.counts[self.lev.bucket(when)] = count
+
+    def test_empty_keeps_ideal(self) -> None:
+        ideal = NOW + dt.timedelta(minutes=62)
+        t = self.lev.place(ideal, dt.timedelta(minutes=30))
+        assert t == ideal
+        assert self.lev.counts[self.lev.bucket(ideal)] == 1
+
+    def test_zero_tolerance(self) -> None:
+        self.fill(NOW, 100)
+        assert self.lev.place(NOW, dt.timedelta(0)) == NOW
+
+    def test_moves_off_peak(self) -> None:
+        ideal = NOW + dt.timedelta(minutes=2)
+        tol = dt.timedelta(minutes=10)
+        for minutes in range(-10, 15, 5):
+            self.fill(ideal + dt.timedelta(minutes=minutes), 10)
+        # quieter slot after ideal:
+        self.fill(NOW + dt.timedelta(minutes=5), 3)
+        assert self.lev.place(ideal, tol) == NOW + dt.timedelta(minutes=5)
+
+        # quieter slot before ideal: end of the slot
+        self.fill(NOW - dt.timedelta(minutes=5), 1)
+        t = self.lev.place(ideal, tol)
+        assert t == NOW - dt.timedelta(seconds=1)
+        assert abs(t - ideal) <= tol
+
+    def test_ties_random(self) -> None:
+        ideal = NOW + dt.timedelta(minutes=2)
+        tol = dt.timedelta(minutes=20)
+        self.fill(ideal, 5)
+        slots = set()
+        for i in range(20):
+            t = self.lev.place(ideal, tol)
+            assert abs(t - ideal) <= tol
+            slots.add(self.lev.bucket(t))
+            self.lev.counts[self.lev.bucket(t)] = 0  # keep tied
+        # parallel processes with the same histogram mustn't all
+        # pick the same bucket:
+        assert len(slots) > 1
+        assert self.lev.bucket(ideal) not in slots
+
+    def test_earliest(self) -> None:
+        self.fill(NOW - dt.timedelta(minutes=5), 0)
+        self.fill(NOW, 10)
+        self.fill(NOW + dt.timedelta(minutes=5), 10)
+        t = self.lev.place(NOW, dt.timedelta(minutes=10), earliest=NOW)
+        assert t >= NOW
+
+    def test_admit_spreads(self) -> None:
+        slots = set()
+        for i in range(12):
+            t = self.lev.admit(NOW, 60)
+            assert NOW <= t <= NOW + dt.timedelta(minutes=60)
+            slots.add(self.lev.bucket(t))
+        # twelve five minute slots in an hour (plus a partial):
+        assert len(slots) >= 12
+        assert max(self.lev.counts.values()) == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
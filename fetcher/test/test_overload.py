@@ -0,0 +1,64 @@
+import unittest
+
+from fetcher.overload import (CONTROL_SECS, INCREASE, SUSTAIN,
+                              LoadController, percentile)
+
+
+class TestLoadController(unittest.TestCase):
+
+    def run_intervals(self, lc: LoadController, n: int, delay: float,
+                      ready: int = 0) -> None:
+        for i in range(n):
+            self.now += CONTROL_SECS
+            lc.delay(delay)
+            assert lc.check(ready, self.now)
+
+    def setUp(self) -> None:
+        self.now = 0.0
+
+    def test_percentile(self) -> None:
+        assert percentile([], 90) is None
+        assert percentile(list(range(100)), 90) == 90
+        assert percentile([5.0], 90) == 5.0
+
+    def test_disabled(self) -> None:
+        lc = LoadController(delay_limit=0, max_factor=4, ready_limit=100)
+        lc.delay(10000)
+        assert not lc.check(1000, 1e9)
+        assert lc.factor == 1.0
+        assert not lc.delays
+
+    def test_overload(self) -> None:
+        lc = LoadController(delay_limit=600, max_factor=2, ready_limit=100)
+        self.now = lc.next_check - CONTROL_SECS
+
+        # not sustained: no change
+        self.run_intervals(lc, SUSTAIN - 1, 1000)
+        self.run_intervals(lc, 1, 400)  # between: holding
+        assert lc.factor == 1.0
+
+        self.run_intervals(lc, SUSTAIN, 1000)
+        assert lc.factor == INCREASE
+
+        # limited
+        self.run_intervals(lc, SUSTAIN * 10, 1000)
+        assert lc.factor == 2.0
+
+        # backlog (not growing) holds factor
+        self.run_intervals(lc, SUSTAIN * 2, 10, 500)
+        assert lc.factor == 2.0
+
+        # relaxes back to 1
+        self.run_intervals(lc, SUSTAIN * 100, 10)
+        assert lc.factor == 1.0
+
+    def test_growing_backlog(self) -> None:
+        lc = LoadController(delay_limit=600, max_factor=4, ready_limit=100)
+        self.now = lc.next_check - CONTROL_SECS
+        for ready in range(200, 200 + SUSTAIN + 1):
+            self.run_intervals(lc, 1, 10, ready)
+        assert lc.factor == INCREASE
+
+
+if __name__ == '__main__':
+    unittest.main()
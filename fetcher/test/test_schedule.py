@@ -0,0 +1,307 @@
+import datetime as dt
+import itertools
+import json
+import unittest
+
+import psycopg
+
+from fetcher.schedule import (ACTIVITY_HOURS, ACTIVITY_SCALE, ARRIVALS_SQL,
+                              HARD, SCHEDULE_SQL, SOFT, SUCC, TEMP, Policy,
+                              freshness_floor, policy_json, predict_minutes,
+                              schedule, skip_minutes, stretch_minutes,
+                              update_arrivals)
+
+POLICY = Policy(
+    ACTIVITY_SCHEDULE=True,
+    ARRIVAL_EWMA_PERCENT=30,
+    ARRIVAL_TARGET_STORIES=5,
+    AUTO_ADJUST_MAX_DELTA_MIN=120,
+    AUTO_ADJUST_MAX_DUPLICATE_PERCENT=95,
+    AUTO_ADJUST_MAX_POLL_MINUTES=1440,
+    AUTO_ADJUST_MIN_DUPLICATE_PERCENT=75,
+    AUTO_ADJUST_MIN_POLL_MINUTES=60,
+    AUTO_ADJUST_MINUTES=60,
+    AUTO_ADJUST_SMALL_DAYS=7,
+    AUTO_ADJUST_SMALL_MINS=5,
+    DEFAULT_INTERVAL_MINS=360,
+    FETCH_EVENT_ROWS=30,
+    MAX_FAILURES=4,
+    MAX_STORIES_PER_FEED=2000,
+    MAXIMUM_BACKOFF_MINS=2880,
+    MAXIMUM_INTERVAL_MINS=1440,
+    SERVER_FRESHNESS_PERCENT=100,
+    UNDEAD_FEEDS=False,
+    UNDEAD_FEED_MAX_DAYS=30)
+
+UNDEAD = POLICY._replace(UNDEAD_FEEDS=True)
+
+
+def cases():
+    """
+    grid of schedule arguments (after policy)
+    """
+    return itertools.product(
+        [SUCC, SOFT, HARD, TEMP],       # status
+        [0.0, 0.5, 3.0, 5.0],           # failures
+        [None, 30, 360, 2000],          # poll_minutes
+        [None, 10, 120],                # update_minutes
+        [None, 100.0, 400.0, 2000.0],   # since_success_min
+        [None, 0, 30],                  # since_new_days
+        [(None, None), (0, 0), (1, 99), (20, 80), (50, 50)],  # saved, dup
+        [None, 600.0, 5000.0])          # retry_after_min
+
+
+class TestSchedule(unittest.TestCase):
+
+    def test_success(self) -> None:
+        s = schedule(POLICY, SUCC, 2.0, None, None, None, None,
+                     None, None, None)
+        assert s.failures == 0
+        assert not s.disable
+        assert s.poll_minutes == POLICY.DEFAULT_INTERVAL_MINS
+        assert s.next_minutes == POLICY.DEFAULT_INTERVAL_MINS
+        assert s.adjust is None
+
+    def test_disable(self) -> None:
+        s = schedule(POLICY, HARD, 3.0, 360, None, None, None,
+                     None, None, None)
+        assert s.failures == 4.0
+        assert s.disable
+        assert s.next_minutes is None
+
+        s = schedule(UNDEAD, HARD, 200.0, 360, None, None, None,
+                     None, None, None)
+        assert not s.disable
+        assert s.next_minutes == UNDEAD.UNDEAD_FEED_MAX_DAYS * 24 * 60
+
+    def test_backoff(self) -> None:
+        s = schedule(POLICY, SOFT, 2.5, 360, None, None, None,
+                     None, None, 5000.0)
+        assert s.failures == 3.0
+        assert s.poll_minutes == 360
+        assert s.next_minutes == 24 * 60  # retry_after capped at a day
+
+    def test_adjust(self) -> None:
+        # all dups, on time: longer
+        s = schedule(POLICY, SUCC, 0.0, 360, None, 360.0, 30,
+                     0, 10, None)
+        assert s.adjust == 'up'
+        assert s.poll_minutes == 360 + POLICY.AUTO_ADJUST_MINUTES
+
+        # no dups: shorter, but not below update_minutes
+        s = schedule(POLICY, SUCC, 0.0, 100, 90, 100.0, 0,
+                     10, 0, None)
+        assert s.adjust == 'min'
+        assert s.poll_minutes == 90
+
+        # early polls don't make period longer
+        s = schedule(POLICY, SUCC, 0.0, 360, None, 100.0, 30,
+                     None, None, None)
+        assert s.adjust == 'early'
+        assert s.poll_minutes == 360
+
+    def test_predicted(self) -> None:
+        s = schedule(POLICY, SUCC, 0.0, 360, None, 360.0, 30,
+                     0, 10, None, 720)
+        assert s.adjust == 'predict'
+        assert s.poll_minutes == 720
+        assert s.next_minutes == 720
+
+        # not used on failure
+        s = schedule(POLICY, SOFT, 0.0, 360, None, 360.0, 30,
+                     None, None, None, 720)
+        assert s.poll_minutes == 360
+
+    def test_budget(self) -> None:
+        # no dups: would go down, but not below budget floor
+        s = schedule(POLICY, SUCC, 0.0, 360, None, 360.0, 0,
+                     10, 0, None, None, 330)
+        assert s.adjust == 'budget'
+        assert s.poll_minutes == 330
+        assert s.next_minutes == 330
+
+        # already at floor: no change counted
+        s = schedule(POLICY, SUCC, 0.0, 330, None, 330.0, 0,
+                     10, 0, None, None, 330)
+        assert s.adjust is None
+        assert s.poll_minutes == 330
+
+        # prediction can't go below floor either
+        s = schedule(POLICY, SUCC, 0.0, 360, None, 360.0, 30,
+                     0, 10, None, 120, 300)
+        assert s.poll_minutes == 300
+
+        # longer intervals untouched
+        s = schedule(POLICY, SUCC, 0.0, 360, None, 360.0, 30,
+                     0, 10, None, None, 60)
+        assert s.adjust == 'up'
+
+
+class TestArrivals(unittest.TestCase):
+
+    def test_update(self) -> None:
+        rate, var = update_arrivals(POLICY, None, None, 6, 2.0, False)
+        assert (rate, var) == (3.0, 0.0)
+
+        # converges on steady rate
+        for i in range(30):
+            rate, var = update_arrivals(POLICY, rate, var, 2, 1.0, False)
+        assert rate is not None and var is not None
+        assert abs(rate - 2.0) < 0.01
+        assert var < 0.01
+
+        # too soon after previous fetch: ignored
+        assert update_arrivals(POLICY, rate, var, 5, 0.001, False) == \
+            (rate, var)
+
+        # no overlap: raised to observed rate
+        rate, var = update_arrivals(POLICY, 2.0, 0.0, 100, 1.0, True)
+        assert rate == 100.0
+
+    def test_predict(self) -> None:
+        # 5 stories at 1/hour: 5 hours
+        assert predict_minutes(POLICY, 1.0, 0.0, 100, None) == 300
+
+        # nothing new: maximum
+        assert predict_minutes(POLICY, 0.0, 0.0, 100, None) == \
+            POLICY.AUTO_ADJUST_MAX_POLL_MINUTES
+
+        # window of 20 entries, 1/hour +/- 0.5 (up to 2/hour):
+        # no more than 5 (25%) new stories: 2.5 hours
+        assert predict_minutes(POLICY, 1.0, 0.25, 20, None) == 150
+
+        # not below update_minutes
+        assert predict_minutes(POLICY, 100.0, 0.0, 10, 120) == 120
+
+
+class TestActivity(unittest.TestCase):
+    MONDAY = dt.datetime(2026, 10, 19, 8, 30)
+
+    def test_flat(self) -> None:
+        flat = bytes([ACTIVITY_SCALE] * ACTIVITY_HOURS)
+        assert stretch_minutes(POLICY, flat, self.MONDAY, 360, None) == 360
+        # bad profile ignored
+        assert stretch_minutes(POLICY, b'', self.MONDAY, 360, None) == 360
+
+    def test_stretch(self) -> None:
+        # Monday 09:00-10:00 twice as busy as usual, rest of day quiet:
+        day = [ACTIVITY_SCALE // 2] * 24
+        day[9] = ACTIVITY_SCALE * 2
+        profile = bytes(day * 7)
+
+        # 150: 30 min at half (15), hour at double (120), 30 at half (15)
+        assert stretch_minutes(POLICY, profile, self.MONDAY, 150, None) == \
+            30 + 60 + 30
+
+        # busy hour: shorter, but not below minimum
+        start = self.MONDAY.replace(hour=9, minute=0)
+        assert stretch_minutes(POLICY, profile, start, 60, None) == 60
+        short = POLICY._replace(AUTO_ADJUST_MIN_POLL_MINUTES=10)
+        assert stretch_minutes(short, profile, start, 60, None) == 30
+        assert stretch_minutes(short, profile, start, 60, 45) == 45
+
+        # quiet: longer, but not above maximum
+        assert stretch_minutes(POLICY, profile, start, 1000, None) == \
+            POLICY.MAXIMUM_INTERVAL_MINS
+
+
+class TestFreshness(unittest.TestCase):
+    MONDAY = dt.datetime(2026, 10, 19, 8, 30)
+
+    def test_floor(self) -> None:
+        assert freshness_floor(POLICY, None, None) == 0
+        assert freshness_floor(POLICY, 30, None) == 30
+        assert freshness_floor(POLICY, 30, 120) == 120
+        # capped at maximum interval:
+        assert freshness_floor(POLICY, 10000, None) == \
+            POLICY.MAXIMUM_INTERVAL_MINS
+        hint = POLICY._replace(SERVER_FRESHNESS_PERCENT=50)
+        assert freshness_floor(hint, 120, None) == 60
+        off = POLICY._replace(SERVER_FRESHNESS_PERCENT=0)
+        assert freshness_floor(off, 120, 120) == 0
+
+    def test_skip(self) -> None:
+        # not skipped:
+        assert skip_minutes(0, 0, self.MONDAY, 60, 1440) == 60
+        assert skip_minutes(1 << 8, 0, self.MONDAY, 60, 1440) == 60
+
+        # 09:30 falls in skipped hours 9 and 10: wait until 11:00
+        hours = 1 << 9 | 1 << 10
+        assert skip_minutes(hours, 0, self.MONDAY, 60, 1440) == 150
+        assert skip_minutes(hours, 0, self.MONDAY, 60, 100) == 100
+
+        # skip Tuesday: wait until Wednesday 00:00
+        assert skip_minutes(0, 1 << 1, self.MONDAY, 24 * 60, 10000) == \
+            (24 + 15.5) * 60
+
+        # everything skipped: ignored
+        assert skip_minutes(0, 0x7f, self.MONDAY, 60, 1440) == 60
+
+
+class TestScheduleSQL(unittest.TestCase):
+    """
+    check SQL feed_schedule function matches schedule()
+    """
+
+    def setUp(self) -> None:
+        try:
+            self.conn = psycopg.connect(dbname='postgres', host='127.0.0.1')
+        except psycopg.OperationalError:
+            self.skipTest("no database")
+        self.cursor = self.conn.cursor()
+        # function is created in a transaction that is never committed
+        self.cursor.execute(SCHEDULE_SQL)
+        self.cursor.execute(ARRIVALS_SQL)
+
+    def tearDown(self) -> None:
+        self.conn.rollback()
+        self.conn.close()
+
+    def test_parity(self) -> None:
+        for policy in (POLICY, UNDEAD):
+            p = json.dumps(policy_json(policy))
+            for (status, failures, poll, upd, since_succ, since_new,
+                 (saved, dup), ram) in cases():
+                args = (status, failures, poll, upd, since_succ, since_new,
+                        saved, dup, ram)
+                expect = schedule(policy, *args)
+                self.cursor.execute(
+                    "SELECT * FROM feed_schedule(%s::jsonb, %s::text,"
+                    " %s::float8, %s::int, %s::int, %s::float8, %s::int,"
+                    " %s::int, %s::int, %s::float8)", (p,) + args)
+                row = self.cursor.fetchone()
+                assert row is not None
+                got = (row[0], row[1], row[2],
+                       row[3] if row[3] is None else float(row[3]), row[4])
+                self.assertEqual(
+                    got,
+                    (expect.failures, expect.disable, expect.poll_minutes,
+                     None if expect.next_minutes is None
+                     else float(expect.next_minutes),
+                     expect.adjust),
+                    msg=repr(args))
+
+    def test_arrivals_parity(self) -> None:
+        p = json.dumps(policy_json(POLICY))
+        for args in itertools.product(
+                [None, 0.0, 2.5],       # rate
+                [None, 0.0, 1.5],       # var
+                [0, 3, 40],             # new
+                [0.001, 0.5, 6.0],      # hours
+                [False, True]):         # overflow
+            expect = update_arrivals(POLICY, *args)
+            self.cursor.execute(
+                "SELECT * FROM feed_arrivals(%s::jsonb, %s::float8,"
+                " %s::float8, %s::int, %s::float8, %s::boolean)",
+                (p,) + args)
+            row = self.cursor.fetchone()
+            assert row is not None
+            for got, want in zip(row, expect):
+                if want is None:
+                    assert got is None, repr(args)
+                else:
+                    self.assertAlmostEqual(got, want, msg=repr(args))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -66,18 +66,19 @@ class TestSaveFetchEvent(DBTest):
 
     def test_save_fetch_event(self):
         with self._Session() as session:
-            tasks.save_fetch_event(
-                session, 1, models.FetchEvent.EVENT_FETCH_FAILED, "fake")
-            total_events = session.query(models.FetchEvent.id).count()
+            tasks.save_fetch_events(session, [
+                (1, models.FetchEvent.Event.FETCH_FAILED,
+                 dt.datetime.utcnow(), "fake")])
+            total_events = session.query(models.FetchEvent.feed_id).count()
             assert total_events == 1
 
     def test_save_fetch_events(self):
+        now = dt.datetime.utcnow()
         with self._Session() as session:
-            tasks.save_fetch_event(
-                session, 1, models.FetchEvent.EVENT_FETCH_FAILED, "fake")
-            tasks.save_fetch_event(
-                session, 1, models.FetchEvent.EVENT_FETCH_FAILED, "fake")
-            total_events = session.query(models.FetchEvent.id).count()
+            tasks.save_fetch_events(session, [
+                (1, models.FetchEvent.Event.FETCH_FAILED, now, "fake"),
+                (1, models.FetchEvent.Event.FETCH_FAILED, now, "fake")])
+            total_events = session.query(models.FetchEvent.feed_id).count()
             assert total_events == 2
 
 
@@ -201,6 +202,33 @@ class TestHelpers(unittest.TestCase):
         assert response.status_code == 200
         assert len(response.content) > 0
 
+    def test_http_fresh_mins(self):
+        fresh = tasks._http_fresh_mins
+        assert fresh({}) is None
+        assert fresh({'Cache-Control': 'public, max-age=600'}) == 10
+        assert fresh({'Cache-Control': 'max-age=600', 'Age': '300'}) == 5
+        assert fresh({'Cache-Control': 'max-age=30'}) is None
+        assert fresh({'Cache-Control': 'no-cache, max-age=600'}) is None
+        assert fresh({'Expires': 'Mon, 19 Oct 2026 12:30:00 GMT',
+                      'Date': 'Mon, 19 Oct 2026 12:00:00 GMT'}) == 30
+        assert fresh({'Expires': '0'}) is None
+        assert fresh({'Cache-Control': 'max-age=inf'}) is None
+        assert fresh({'Cache-Control': 'max-age=nan'}) is None
+        assert fresh({'Cache-Control': 'max-age=600', 'Age': 'nan'}) is None
+        assert fresh({'Cache-Control': 'max-age=' + '9' * 400}) == \
+            tasks.MAXIMUM_INTERVAL_MINS
+
+    def test_parse_skip(self):
+        content = b'''<?xml version="1.0"?>
+<rss version="2.0"><channel><title>t</title><ttl>60</ttl>
+<skipHours><hour>1</hour><hour>2</hour><hour>24</hour></skipHours>
+<skipDays><day>Saturday</day><day>Sunday</day></skipDays>
+<item><link>https://example.com/a</link></item></channel></rss>'''
+        pf = tasks.parse('https://example.com/rss', content)
+        assert tasks._feed_ttl_mins(pf) == 60
+        assert pf.skip_hours == 0b111
+        assert pf.skip_days == 0b1100000
+
 
 if __name__ == "__main__":
     unittest.main()
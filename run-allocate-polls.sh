@@ -0,0 +1,20 @@
+#!/bin/sh
+
+# run from app.json cron entry (does nothing unless
+# FETCH_BUDGET_PER_HOUR is set)
+
+# relative, for running outside:
+DATA=data
+
+# send stdout/err to a log file
+# log not rotated, so overwrite each time
+exec > $DATA/logs/run-allocate-polls.log 2>&1
+
+log() {
+    echo `date '+%F %T'` $*
+}
+
+log start $0
+python -m scripts.allocate_polls "$@"
+# directly after python command
+log "status: $?"
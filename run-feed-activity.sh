@@ -0,0 +1,20 @@
+#!/bin/sh
+
+# run from app.json cron entry (does nothing unless
+# ACTIVITY_SCHEDULE is set)
+
+# relative, for running outside:
+DATA=data
+
+# send stdout/err to a log file
+# log not rotated, so overwrite each time
+exec > $DATA/logs/run-feed-activity.log 2>&1
+
+log() {
+    echo `date '+%F %T'` $*
+}
+
+log start $0
+python -m scripts.feed_activity "$@"
+# directly after python command
+log "status: $?"
@@ -0,0 +1,240 @@
+"""
+Set poll_minutes for all active feeds in one pass, so that the
+expected fetch rate fits a fetches/hour budget
+(see fetcher/allocate.py for the policy).
+
+Story arrival rates come from FeedState.arrival_rate (maintained by
+fetches), or for feeds without an estimate, from stories fetched in
+the last --days days, over the number of days with successful
+fetches (from fetch_event_days).  Feeds with neither keep their
+current interval, which is charged against the budget.
+
+Allocated intervals are also saved as FeedState.budget_minutes, a
+floor for per-fetch auto-adjust (or ARRIVAL_TARGET_STORIES), which
+can lengthen poll_minutes between runs, but not shorten it past the
+budget.  Floors are cleared when run without a budget.
+"""
+
+import datetime as dt
+import logging
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import (BigInteger, Integer, column, func, select, update,
+                        values)
+
+from fetcher.allocate import Report, allocate, bounds, load, report
+from fetcher.config import conf
+from fetcher.database import Session, result_rowcount
+from fetcher.database.models import (Feed, FeedState, FetchEvent,
+                                     FetchEventDay, Story)
+from fetcher.logargparse import LogArgumentParser
+from fetcher.schedule import Policy
+from fetcher.stats import Stats
+
+SCRIPT = 'allocate_polls'
+
+WRITE_CHUNK = 1000              # feeds updated per transaction
+
+logger = logging.getLogger(SCRIPT)
+
+
+def history_rates(days: int) -> Dict[int, float]:
+    """
+    return dict of feed_id to stories/hour over the last `days` days
+    of successful fetching
+    """
+    since = dt.datetime.utcnow() - dt.timedelta(days=days)
+    with Session() as session:
+        fetched = dict(
+            (feed_id, count) for feed_id, count in session.execute(
+                select(FetchEventDay.feed_id, func.count())
+                .where(FetchEventDay.event ==
+                       FetchEvent.Event.FETCH_SUCCEEDED.value,
+                       FetchEventDay.day >= since.date())
+                .group_by(FetchEventDay.feed_id)))
+        stories = dict(
+            (feed_id, count) for feed_id, count in session.execute(
+                select(Story.feed_id, func.count())
+                .where(Story.fetched_at >= since)
+                .group_by(Story.feed_id)))
+    return {feed_id: stories.get(feed_id, 0) / (fetch_days * 24)
+            for feed_id, fetch_days in fetched.items()}
+
+
+def log_report(title: str, r: Report) -> None:
+    logger.info("%s: %d feeds, %.1f fetches/hour, %.1f stories/hour,"
+                " %.2f stories/fetch, mean delay %.1f minutes",
+                title, r.feeds, r.load, r.stories, r.per_fetch, r.delay)
+
+
+def write_polls(changes: List[Tuple[int, int]]) -> int:
+    """
+    set poll_minutes from (feed_id, minutes) pairs, skipping queued
+    feeds (writing the feeds row would make the fetch results be
+    discarded).  Returns number of feeds updated.
+    """
+    updated = 0
+    for i in range(0, len(changes), WRITE_CHUNK):
+        v = values(column('id', BigInteger), column('minutes', Integer),
+                   name='v').data(changes[i:i + WRITE_CHUNK])
+        with Session() as session:
+            res = session.execute(
+                update(Feed)
+                .where(Feed.id == v.c.id,
+                       FeedState.feed_id == Feed.id,
+                       FeedState.queued.is_(False))
+                .values(poll_minutes=v.c.minutes))
+            updated += result_rowcount(res)
+            session.commit()
+    return updated
+
+
+def write_floors(floors: List[Tuple[int, int]]) -> int:
+    """
+    set FeedState.budget_minutes from (feed_id, minutes) pairs;
+    returns number of rows changed
+    """
+    updated = 0
+    for i in range(0, len(floors), WRITE_CHUNK):
+        v = values(column('feed_id', BigInteger), column('minutes', Integer),
+                   name='v').data(floors[i:i + WRITE_CHUNK])
+        with Session() as session:
+            res = session.execute(
+                update(FeedState)
+                .where(FeedState.feed_id == v.c.feed_id,
+                       FeedState.budget_minutes.is_distinct_from(
+                           v.c.minutes))
+                .values(budget_minutes=v.c.minutes))
+            updated += result_rowcount(res)
+            session.commit()
+    return updated
+
+
+def clear_floors() -> int:
+    """clear all FeedState.budget_minutes; returns rows changed"""
+    with Session() as session:
+        res = session.execute(
+            update(FeedState)
+            .where(FeedState.budget_minutes.is_not(None))
+            .values(budget_minutes=None))
+        session.commit()
+        return result_rowcount(res)
+
+
+def run(*, budget: int, days: int, change: int, dry_run: bool) -> int:
+    stats = Stats.get()
+    policy = Policy.from_conf()
+    default = conf.DEFAULT_INTERVAL_MINS
+
+    with Session() as session:
+        rows = session.execute(
+            select(Feed.id, Feed.poll_minutes, Feed.update_minutes,
+                   FeedState.arrival_rate, FeedState.arrival_var,
+                   FeedState.entry_count)
+            .outerjoin(FeedState, FeedState.feed_id == Feed.id)
+            .where(Feed.active.is_(True),
+                   Feed.system_enabled.is_(True))).all()
+    logger.info("%d active feeds", len(rows))
+
+    if any(row.arrival_rate is None for row in rows):
+        history = history_rates(days)
+    else:
+        history = {}
+
+    ids = []
+    rate = []
+    var = []
+    entries = []
+    update_minutes = []
+    current = []
+    unknown = 0.0               # load of feeds with no history
+    for row in rows:
+        minutes = row.poll_minutes or row.update_minutes or default
+        if row.arrival_rate is not None:
+            rate.append(row.arrival_rate)
+            var.append(row.arrival_var or 0.0)
+        elif row.id in history:
+            rate.append(history[row.id])
+            var.append(0.0)
+        else:
+            unknown += 60 / minutes
+            continue
+        ids.append(row.id)
+        entries.append(row.entry_count or 0)
+        update_minutes.append(row.update_minutes or 0)
+        current.append(minutes)
+
+    if not ids:
+        logger.info("no feeds with history")
+        return 0
+
+    rates = np.array(rate, dtype=np.float64)
+    cur = np.array(current, dtype=np.float64)
+    low, high = bounds(policy, rates,
+                       np.array(var, dtype=np.float64),
+                       np.array(entries),
+                       np.array(update_minutes),
+                       conf.MAXIMUM_INTERVAL_MINS)
+    logger.info("%d feeds without history: %.1f fetches/hour",
+                len(rows) - len(ids), unknown)
+
+    available = budget - unknown
+    minutes = allocate(rates, low, high, available)
+    log_report("current", report(rates, cur))
+    new = report(rates, minutes)
+    log_report("allocated", new)
+    if new.load > available:
+        logger.warning("budget %d fetches/hour can't be met:"
+                       " all feeds at longest interval", budget)
+    logger.info("%d feeds at shortest interval, %d at longest",
+                np.count_nonzero(minutes <= low),
+                np.count_nonzero(minutes >= np.floor(high)))
+    stats.gauge('allocate.budget', budget)
+    stats.gauge('allocate.load', new.load + unknown)
+
+    # only write intervals that changed by more than `change` percent
+    changed = np.abs(minutes - cur) * 100 > cur * change
+    changes = [(ids[i], int(minutes[i])) for i in np.flatnonzero(changed)]
+    logger.info("%d feeds to update (%.1f fetches/hour after update)",
+                len(changes), load(np.where(changed, minutes, cur)) + unknown)
+    if dry_run:
+        return 0
+
+    floors = [(ids[i], int(minutes[i])) for i in range(len(ids))]
+    logger.info("updated %d budget floors", write_floors(floors))
+    if not changes:
+        return 0
+
+    updated = write_polls(changes)
+    logger.info("updated %d feeds (%d skipped: queued)",
+                updated, len(changes) - updated)
+    stats.gauge('allocate.updated', updated)
+    return 0
+
+
+if __name__ == '__main__':
+    p = LogArgumentParser(SCRIPT, 'set feed poll intervals to fit a budget')
+    def_budget = conf.FETCH_BUDGET_PER_HOUR
+    p.add_argument('--budget', type=int, default=def_budget,
+                   help=f"fetches/hour for all feeds ({def_budget})")
+    def_days = conf.NORMALIZED_TITLE_DAYS
+    p.add_argument('--days', type=int, default=def_days,
+                   help=f"days of story history for feeds without an arrival rate estimate ({def_days})")
+    CHANGE = 10
+    p.add_argument('--change', type=int, default=CHANGE,
+                   help=f"minimum change (percent) to poll_minutes to write ({CHANGE})")
+    p.add_argument('--dry-run', action='store_true',
+                   help="report only: don't update database")
+    # info logging before this call unlikely to be seen:
+    args = p.my_parse_args()       # parse logging args, output start message
+
+    if args.budget <= 0:
+        logger.info("no budget set")
+        if not args.dry_run:
+            logger.info("cleared %d budget floors", clear_floors())
+        sys.exit(0)
+
+    sys.exit(run(budget=args.budget, days=args.days, change=args.change,
+                 dry_run=args.dry_run))
@@ -17,16 +17,22 @@ import gzip
 import logging
 import os.path
 
-from sqlalchemy import delete, exists, func, select, text
+from sqlalchemy import and_, delete, exists, func, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
 
 import fetcher.path as path
 from fetcher.config import conf
 from fetcher.database import Session, engine, result_rowcount
-from fetcher.database.models import Story, StoryRef
+from fetcher.database.models import FeedGeneration, StoryRef
+from fetcher.database.partitions import (PARENT, create_story_partitions,
+                                         story_partitions)
 from fetcher.logargparse import LogArgumentParser
 
 SCRIPT = 'db_archive'
 
+DELETE_CHUNK_IDS = 100000       # story ids examined per DELETE
+
 logger = logging.getLogger(SCRIPT)
 
 
@@ -38,47 +44,40 @@ def logsize(fname: str) -> None:
         logger.error(f"stat {fname}: {e}")
 
 
-def dump_fetch_events(now: str, events: int, delete: bool, dump: bool) -> bool:
+def prune_fetch_events(now: str, events: int, days: int,
+                       delete: bool, dump: bool) -> bool:
     """
-    Write CSV file of fetch_events table
-    keeping `events` table rows for each feed_id.
+    Remove fetch_events ring slots beyond `events` (left if
+    FETCH_EVENT_ROWS was lowered), and fetch_event_days rows more than
+    `days` old (optionally writing a CSV file of them first).
     """
-    logger.info("creating temp table for ranking fetch_events")
     with engine.begin() as conn:
-        # create temp table (lasts as long as DB session)
-        # with fetch_event row id and the row rank (n'th row)
-        # within feed_id (older rows have higher rank).
-
-        # This is necessary because:
-        # 1. RANK cannot be used in a where clause
-        # 2. There would be a race between new inserts and copy/delete.
-        conn.execute(text(
-            "SELECT id, RANK() OVER (PARTITION BY feed_id ORDER BY id DESC) AS rank INTO TEMP temp_table FROM fetch_events;"))
-
-        # used for count, extraction, deletion:
-        from_temp_table = f"FROM temp_table WHERE rank > {events}"
-
-        logger.info("counting")
-        count = conn.scalar(text(f"SELECT COUNT(1) {from_temp_table}"))
-        logger.info(f"found {count} fetch_events to archive/delete")
+        from_slots = f"FROM fetch_events WHERE slot >= {events}"
+        count = conn.scalar(text(f"SELECT COUNT(1) {from_slots}"))
+        logger.info(f"found {count} fetch_events slots to delete")
+        if count and delete:
+            conn.execute(text(f"DELETE {from_slots}"))
+
+        limit = (dt.datetime.utcnow().date() -
+                 dt.timedelta(days=days)).isoformat()
+        from_where = f"FROM fetch_event_days WHERE day < '{limit}'"
+        count = conn.scalar(text(f"SELECT COUNT(1) {from_where}"))
+        logger.info(f"found {count} fetch_event_days to archive/delete")
         if count == 0:
             return True
 
-        # used for extract & deletion:
-        from_where = f"FROM fetch_events WHERE id IN (SELECT id {from_temp_table})"
-
         if dump:
-            query = f"SELECT * {from_where} ORDER BY id"
+            query = f"SELECT * {from_where} ORDER BY day, feed_id"
             logger.debug("%s", query)
             cursor = conn.execute(text(query))
             fname = os.path.join(path.DB_ARCHIVE_DIR,
-                                 f"fetch_events-{now}.csv.gz")
+                                 f"fetch_event_days-{now}.csv.gz")
             logger.info(f"writing {fname}")
             with gzip.open(fname, 'wt') as f:
                 writer = csv.writer(f)
                 first = next(cursor)._asdict()
                 writer.writerow(first.keys())
-                writer.writerow(first)
+                writer.writerow(first.values())
                 writer.writerows(cursor)
 
         if delete:
@@ -98,8 +97,14 @@ def prune_stories(date_limit: dt.date, really_delete: bool) -> None:
     """
 
     with Session() as session:
-        # prune expired refs
-        where = StoryRef.seen_at < date_limit
+        # prune expired refs: those in generations last seen before
+        # date_limit (and any from before generations).
+        expired_gen = exists().where(FeedGeneration.feed_id == StoryRef.feed_id,
+                                     FeedGeneration.gen == StoryRef.gen,
+                                     FeedGeneration.seen_at < date_limit)
+        where = or_(expired_gen,
+                    and_(StoryRef.gen.is_(None),
+                         StoryRef.seen_at < date_limit))
         if really_delete:
             res = session.execute(delete(StoryRef).where(where))
             logger.info("deleted %d story_refs", result_rowcount(res))
@@ -109,32 +114,117 @@ def prune_stories(date_limit: dt.date, really_delete: bool) -> None:
                                     .where(where)).one()
             logger.info("found %d story_refs to delete", count)
 
-        # delete stories with no refs
-        where = ~exists().where(StoryRef.story_id == Story.id)
+        # prune expired generations (no longer referenced)
+        where = FeedGeneration.seen_at < date_limit
         if really_delete:
-            res = session.execute(delete(Story).where(where))
-            logger.info("deleted %d stories", result_rowcount(res))
+            res = session.execute(delete(FeedGeneration).where(where))
+            logger.info("deleted %d feed_generations", result_rowcount(res))
         else:
             count = session.scalars(select(func.count())
-                                    .select_from(Story)
+                                    .select_from(FeedGeneration)
                                     .where(where)).one()
-            logger.info("found %d stories to delete", count)
+            logger.info("found %d feed_generations to delete", count)
 
         # (no sources table in rss-fetcher)
         if really_delete:
             session.commit()
 
+    prune_story_partitions(date_limit, really_delete)
+
+
+def prune_story_partitions(date_limit: dt.date, really_delete: bool) -> None:
+    """
+    delete stories with no refs.
+
+    Only partitions holding stories fetched before date_limit are
+    examined: later stories were seen in generations that have not
+    expired.  Partitions without any referenced stories are detached
+    and dropped, the rest have unreferenced stories deleted in
+    chunks of story ids.
+
+    A ref added to a story in a dropped partition (by a fetcher racing
+    with the check) is left dangling and expires with its generation.
+    """
+    limit = dt.datetime.combine(date_limit, dt.time())
+    with engine.connect() as conn:
+        lower = None
+        for part in story_partitions(conn):
+            if lower is not None and lower >= limit:
+                break           # stories all fetched after limit
+            lower = part.upper
+            name = part.name
+            referenced = conn.scalar(text(
+                f"SELECT EXISTS (SELECT 1 FROM {name} s"
+                " JOIN story_refs r ON r.story_id = s.id)"))
+            if (not referenced and part.upper is not None
+                    and part.upper <= limit):
+                if really_delete:
+                    # DETACH briefly locks the stories table
+                    conn.execute(text("SET LOCAL lock_timeout = '30s'"))
+                    try:
+                        conn.execute(text(
+                            f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+                    except OperationalError as e:
+                        logger.warning("could not detach %s: %s", name, e)
+                        conn.rollback()
+                    else:
+                        conn.execute(text(f"DROP TABLE {name}"))
+                        conn.commit()
+                        logger.info("dropped partition %s", name)
+                else:
+                    logger.info("found partition %s to drop", name)
+            else:
+                # partition with referenced stories, or the boundary
+                delete_unreferenced(conn, name, really_delete)
+            conn.rollback()     # end any read-only transaction
+
+
+def delete_unreferenced(conn: Connection, name: str,
+                        really_delete: bool) -> None:
+    """
+    delete (or count) stories in partition `name` with no refs,
+    committing each chunk of ids
+    """
+    low, high = conn.execute(
+        text(f"SELECT MIN(id), MAX(id) FROM {name}")).one()
+    if low is None:
+        return
+
+    where = ("s.id >= :low AND s.id < :high AND NOT EXISTS"
+             " (SELECT 1 FROM story_refs r WHERE r.story_id = s.id)")
+    total = 0
+    for chunk in range(low, high + 1, DELETE_CHUNK_IDS):
+        params = {'low': chunk, 'high': chunk + DELETE_CHUNK_IDS}
+        if really_delete:
+            res = conn.execute(text(f"DELETE FROM {name} s WHERE {where}"),
+                               params)
+            total += result_rowcount(res)
+            conn.commit()
+        else:
+            total += conn.scalar(text(
+                f"SELECT COUNT(1) FROM {name} s WHERE {where}"), params) or 0
+    if really_delete:
+        logger.info("deleted %d stories from %s", total, name)
+    else:
+        logger.info("found %d stories to delete in %s", total, name)
+
 
 if __name__ == '__main__':
-    p = LogArgumentParser(SCRIPT, 'prune stories and fetch_events tables')
+    p = LogArgumentParser(SCRIPT, 'prune stories and fetch event tables')
     def_sd = max(conf.RSS_OUTPUT_DAYS, conf.NORMALIZED_TITLE_DAYS)
     p.add_argument('--story-days', type=int, default=def_sd,
                    help=f"number of days of story rows to keep ({def_sd})")
     def_fe = conf.FETCH_EVENT_ROWS
     p.add_argument('--fetch-events', type=int, default=def_fe,
                    help=f"number of fetch_events to keep per feed ({def_fe})")
+    def_fd = conf.FETCH_EVENT_DAYS
+    p.add_argument('--fetch-event-days', type=int, default=def_fd,
+                   help=f"number of days of fetch event counts to keep ({def_fd})")
     p.add_argument('--delete', action='store_true', default=False,
                    help="delete rows after writing files")
+    def_pd = conf.STORY_PARTITION_DAYS
+    p.add_argument('--partition-days', type=int, default=def_pd,
+                   help=f"number of days of stories partitions to create ahead ({def_pd})")
     p.add_argument('--dump', action='store_true', default=False,
                    help="create dump files (no longer archived)")
     # info logging before this call unlikely to be seen:
@@ -147,8 +237,14 @@ if __name__ == '__main__':
         logger.info("Creating %s directory", path.DB_ARCHIVE_DIR)
         os.makedirs(path.DB_ARCHIVE_DIR)
 
-    logger.info(f"Keeping {args.fetch_events} fetch_events for each feed")
-    dump_fetch_events(date, args.fetch_events, args.delete, args.dump)
+    logger.info("Creating %d days of stories partitions", args.partition_days)
+    with engine.connect() as conn:
+        create_story_partitions(conn, now.date(), args.partition_days)
+
+    logger.info(f"Keeping {args.fetch_events} fetch_events for each feed"
+                f" and {args.fetch_event_days} days of counts")
+    prune_fetch_events(date, args.fetch_events, args.fetch_event_days,
+                       args.delete, args.dump)
 
     logger.info(f"Keeping stories seen in the last %d days", args.story_days)
     limit = now.date() - dt.timedelta(days=args.story_days)
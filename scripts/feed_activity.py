@@ -0,0 +1,158 @@
+"""
+Build hour-of-week activity profiles (FeedState.activity) for active
+feeds from the publication (or fetch) times of their recent stories
+(see fetcher/activity.py).
+
+Feeds with fewer than ACTIVITY_MIN_STORIES stories get their source's
+profile (if the source has enough stories), else none.  Profiles are
+only used (and only built) when ACTIVITY_SCHEDULE is set.
+"""
+
+import datetime as dt
+import logging
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import (BigInteger, LargeBinary, and_, case, column, extract,
+                        func, select, update, values)
+
+from fetcher.activity import profiles
+from fetcher.config import conf
+from fetcher.database import Session, result_rowcount
+from fetcher.database.models import Feed, FeedState, Story
+from fetcher.logargparse import LogArgumentParser
+from fetcher.schedule import ACTIVITY_HOURS
+from fetcher.stats import Stats
+
+SCRIPT = 'feed_activity'
+
+WRITE_CHUNK = 1000              # feeds updated per transaction
+
+logger = logging.getLogger(SCRIPT)
+
+
+def story_counts(days: int) -> List[Tuple[int, int, int]]:
+    """
+    return (feed_id, hour of week, count) for stories fetched in the
+    last `days` days.  Uses published_at if it's in the day before
+    fetched_at, else fetched_at (published_at can be missing, or not
+    the date of the story).
+    """
+    since = dt.datetime.utcnow() - dt.timedelta(days=days)
+    when = case((and_(Story.published_at <= Story.fetched_at,
+                      Story.published_at > Story.fetched_at -
+                      dt.timedelta(days=1)),
+                 Story.published_at),
+                else_=Story.fetched_at)
+    # ISO day of week: Monday is 1
+    hour = (extract('isodow', when) - 1) * 24 + extract('hour', when)
+    with Session() as session:
+        rows = session.execute(
+            select(Story.feed_id, hour, func.count())
+            .where(Story.fetched_at >= since)
+            .group_by(Story.feed_id, hour))
+        return [(feed_id, int(how), count) for feed_id, how, count in rows]
+
+
+def write_profiles(rows: List[Tuple[int, Optional[bytes]]]) -> int:
+    """
+    set FeedState.activity from (feed_id, profile) pairs;
+    returns number of rows updated
+    """
+    updated = 0
+    for i in range(0, len(rows), WRITE_CHUNK):
+        v = values(column('feed_id', BigInteger),
+                   column('activity', LargeBinary),
+                   name='v').data(rows[i:i + WRITE_CHUNK])
+        with Session() as session:
+            res = session.execute(
+                update(FeedState)
+                .where(FeedState.feed_id == v.c.feed_id,
+                       FeedState.activity.is_distinct_from(v.c.activity))
+                .values(activity=v.c.activity))
+            updated += result_rowcount(res)
+            session.commit()
+    return updated
+
+
+def run(*, days: int, min_stories: int, dry_run: bool) -> int:
+    stats = Stats.get()
+
+    with Session() as session:
+        feeds = session.execute(
+            select(Feed.id, Feed.sources_id)
+            .where(Feed.active.is_(True),
+                   Feed.system_enabled.is_(True))).all()
+    logger.info("%d active feeds", len(feeds))
+    if not feeds:
+        return 0
+
+    feed_index: Dict[int, int] = {}
+    source_index: Dict[Optional[int], int] = {}
+    feed_source = np.zeros(len(feeds), dtype=np.int64)
+    for i, (feed_id, sources_id) in enumerate(feeds):
+        feed_index[feed_id] = i
+        feed_source[i] = source_index.setdefault(sources_id,
+                                                 len(source_index))
+
+    # story counts by feed and hour of week, summed by source:
+    counts = np.zeros((len(feeds), ACTIVITY_HOURS), dtype=np.float64)
+    for feed_id, hour, count in story_counts(days):
+        row = feed_index.get(feed_id)
+        if row is not None and 0 <= hour < ACTIVITY_HOURS:
+            counts[row, hour] = count
+    source_counts = np.zeros((len(source_index), ACTIVITY_HOURS),
+                             dtype=np.float64)
+    np.add.at(source_counts, feed_source, counts)
+
+    own = counts.sum(axis=1) >= min_stories
+    source_ok = source_counts.sum(axis=1)[feed_source] >= min_stories
+    feed_profiles = profiles(counts)
+    source_profiles = profiles(source_counts)
+
+    rows: List[Tuple[int, Optional[bytes]]] = []
+    for i, (feed_id, _) in enumerate(feeds):
+        if own[i]:
+            profile: Optional[bytes] = feed_profiles[i].tobytes()
+        elif source_ok[i]:
+            profile = source_profiles[feed_source[i]].tobytes()
+        else:
+            profile = None
+        rows.append((feed_id, profile))
+
+    n_source = int(np.count_nonzero(~own & source_ok))
+    n_none = int(np.count_nonzero(~own & ~source_ok))
+    logger.info("%d feeds with own profile, %d with source profile,"
+                " %d without", int(np.count_nonzero(own)), n_source, n_none)
+    stats.gauge('activity.profiles', len(feeds) - n_none)
+    if dry_run:
+        return 0
+
+    updated = write_profiles(rows)
+    logger.info("updated %d feeds", updated)
+    stats.gauge('activity.updated', updated)
+    return 0
+
+
+if __name__ == '__main__':
+    p = LogArgumentParser(SCRIPT, 'build feed hour-of-week activity profiles')
+    def_days = conf.ACTIVITY_DAYS
+    p.add_argument('--days', type=int, default=def_days,
+                   help=f"days of stories to count ({def_days})")
+    def_min = conf.ACTIVITY_MIN_STORIES
+    p.add_argument('--min-stories', type=int, default=def_min,
+                   help=f"stories needed for a profile ({def_min})")
+    p.add_argument('--dry-run', action='store_true',
+                   help="report only: don't update database")
+    p.add_argument('--force', action='store_true',
+                   help="run even if ACTIVITY_SCHEDULE not set")
+    # info logging before this call unlikely to be seen:
+    args = p.my_parse_args()       # parse logging args, output start message
+
+    if not conf.ACTIVITY_SCHEDULE and not args.force:
+        logger.info("ACTIVITY_SCHEDULE not set")
+        sys.exit(0)
+
+    sys.exit(run(days=args.days, min_stories=args.min_stories,
+                 dry_run=args.dry_run))
@@ -11,24 +11,30 @@ run on dedicated hardware, CPU and I/O are essentially in endless
 supply.
 """
 
+import collections
+import datetime as dt
 import logging
 import time
-from typing import Dict
+from typing import Any, Deque, Dict, List, Optional, Tuple
 
 # mediacloud/system-dev-ops
 from mc_logging.logger import log_to_sink
 # PyPI:
 from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
 
 # app
 from fetcher.config import conf
-from fetcher.database import Session
-from fetcher.database.models import Feed
-from fetcher.direct import Manager, Worker
+from fetcher.database import Session, engine
+from fetcher.database.models import FeedState
+from fetcher.database.partitions import create_story_partitions
+from fetcher.direct import Manager, Worker, poll
 from fetcher.headhunter import HeadHunter, Item
 from fetcher.logargparse import LogArgumentParser
+from fetcher.overload import LoadController
 from fetcher.stats import Stats
-from fetcher.tasks import feed_worker
+from fetcher.tasks import (dedup_filter_stats, feed_worker, feed_writer,
+                           init_dedup_filter, write_completions)
 
 DEBUG_COUNTERS = False
 SCRIPT = 'fetcher'
@@ -65,25 +71,138 @@ def main() -> None:
             # add fork index to log messages:
             log_to_sink(SCRIPT, sub_id=str(fork))
 
-        def fetch(self, item: Item) -> None:  # called in Worker to do work
+        def fetch(self, item: Item) -> Any:  # called in Worker to do work
             """
             passed entire item (as dict) for use by fetch_done
             """
-            feed_worker(item)
+            return feed_worker(item)
 
         def fetch_done(self, ret: Dict) -> None:  # callback in Manager
             # print("fetch_done", ret)
             # first positional arg is Item
             item = ret['args'][0]
             hunter.completed(item)
+            if (rec := ret.get('ret')) is not None:
+                if rec[2].ingest is not None:
+                    to_write.append(rec)  # stories to save
+                else:
+                    to_complete.append(rec)  # write-behind
+
+    class WriterWorker(Worker):
+        def child_log_file(self, fork: int) -> None:
+            log_to_sink(SCRIPT, sub_id=f"w{fork}")
+
+        def write(self, records: Any) -> Any:  # called in Worker
+            return feed_writer(records)
+
+        def write_done(self, ret: Dict) -> None:  # callback in Manager
+            if 'exc' in ret:
+                # records lost: clear queued so the feeds are refetched
+                # (next_fetch_attempt has passed)
+                logger.error("write: %s %s", ret['exc'], ret.get('info'))
+                stats.incr('writer.errors')
+                ids = [rec[0] for rec in ret['args'][0]]
+                with Session() as session:
+                    session.execute(
+                        update(FeedState)
+                        .values(queued=False)
+                        .where(FeedState.feed_id.in_(ids)))
+                    session.commit()
+                return
+            for feed_id, saved, dup, skipped in ret['ret']:
+                logger.debug("feed %d written: %d saved, %d dup, %d skipped",
+                             feed_id, saved, dup, skipped)
+
+    # records returned by fetch Workers for writer processes
+    to_write: Deque[Any] = collections.deque()
+    writer_batch = conf.RSS_FETCH_WRITER_BATCH
+
+    def start_writes() -> None:
+        """hand off records from fetch Workers to idle writers"""
+        if writers is None:
+            return
+        while to_write and (w := writers.find_available_worker()):
+            records: List[Any] = []
+            while to_write and len(records) < writer_batch:
+                records.append(to_write.popleft())
+            w.call('write', records)
+        stats.gauge('writer.backlog', len(to_write))
+
+    # completions returned by fetch Workers when
+    # RSS_FETCH_COMPLETION_MS set (feeds remain queued until written)
+    to_complete: List[Any] = []
+    complete_secs = conf.RSS_FETCH_COMPLETION_MS / 1000
+    complete_deadline: Optional[float] = None
+
+    def write_completed() -> None:
+        """write all pending completions in one transaction"""
+        stats.gauge('completions.pending', len(to_complete))
+        if to_complete:
+            records = to_complete.copy()
+            to_complete.clear()
+            t0 = time.monotonic()
+            write_completions(records)
+            controller.commit(time.monotonic() - t0)
+
+    # stretches rescheduling intervals when fetches fall behind
+    controller = LoadController()
+
+    def check_load() -> None:
+        if controller.check(hunter.ready):
+            stats.gauge('overload.factor', controller.factor)
+            if controller.delay_pct is not None:
+                stats.gauge('overload.delay', controller.delay_pct)
+            if controller.commit_pct is not None:
+                stats.gauge('overload.commit', controller.commit_pct)
+
+    # make sure stories can be saved even if db_archive hasn't run
+    # lately (it creates partitions daily):
+    with engine.connect() as conn:
+        create_story_partitions(conn, dt.datetime.utcnow().date(),
+                                conf.STORY_PARTITION_DAYS)
+
+    # load shared filter (if configured) before Workers are forked
+    init_dedup_filter()
+
+    managers = []
+    writers = None
+    if conf.RSS_FETCH_WRITERS > 0:
+        # no job timeout: feed_writer sets its own
+        writers = Manager(conf.RSS_FETCH_WRITERS, WriterWorker, timeout=0)
+        managers.append(writers)
 
     # XXX pass command line args for concurrency, fetches/sec??
-    manager = Manager(args.workers, FetcherWorker)
+    manager = Manager(args.workers, FetcherWorker,
+                      affinity_secs=conf.RSS_FETCH_AFFINITY_SECS)
+    managers.append(manager)
+
+    # issued Items waiting (briefly) for the Worker that last fetched
+    # from the same host to become idle: (deadline, Item)
+    affinity_wait = conf.RSS_FETCH_AFFINITY_WAIT_MS / 1000
+    held: Deque[Tuple[float, Item]] = collections.deque()
+
+    def affinity_stat(status: str) -> None:
+        stats.incr('affinity', labels=[('stat', status)])
+
+    def next_held() -> Optional[Item]:
+        """
+        return a held Item whose affine Worker is now idle,
+        or that has waited long enough.
+        """
+        now = time.monotonic()
+        for entry in held:
+            deadline, item = entry
+            w = manager.affine_worker(item.fqdn)
+            if w is None or not w.wactive or now >= deadline:
+                held.remove(entry)
+                return item
+        return None
 
     def worker_stats() -> None:
         stats.gauge('workers.active', manager.active_workers)
         stats.gauge('workers.current', manager.cworkers)  # current
         stats.gauge('workers.n', manager.nworkers)  # goal
+        dedup_filter_stats()
         if DEBUG_COUNTERS:
             print('workers.active', manager.active_workers)
             print('workers.current', manager.cworkers)  # current
@@ -93,7 +212,7 @@ def main() -> None:
         # force feed with feed ids from command line
         hunter.refill(args.feeds)
     else:
-        # clear all Feed.queued columns
+        # clear all FeedState.queued columns
         # XXX maybe leave be, and when zero of our workers
         #   are active but database shows non-zero queued,
         #   clear out the DB?  Back when queued meant queued,
@@ -104,39 +223,72 @@ def main() -> None:
         #   was a success....
         with Session() as session:
             res = session.execute(
-                update(Feed)
+                update(FeedState)
                 .values(queued=False)
-                .where(Feed.queued.is_(True)))
+                .where(FeedState.queued.is_(True)))
             # print("UPDATED", res.rowcount)
             session.commit()
 
     next_wakeup = 0.0
-    while hunter.have_work():
+    while hunter.have_work() or held:
         # here initially, or after manager.poll()
         t0 = time.time()
 
         worker_stats()
         looked_for_work = False
         # worker completion only processed in manager.poll()
-        # so this loop can only iterate nworkers times.
-        while w := manager.find_available_worker():
+        # so this loop can only iterate nworkers times
+        # (plus the number of Items held for affinity).
+        while manager.find_available_worker():
             looked_for_work = True
-            item = hunter.find_work()
-            if item is None:    # no issuable work available
-                break
-
-            # NOTE! returned item has been already been marked as
-            # "issued" by headhunter
+            item = next_held()
+            if item is None:
+                item = hunter.find_work()
+                if item is None:    # no issuable work available
+                    break
+
+                # NOTE! returned item has been already been marked as
+                # "issued" by headhunter
+
+                aw = manager.affine_worker(item.fqdn)
+                if aw is not None and aw.wactive and affinity_wait > 0:
+                    # Worker with a (possibly) open connection to
+                    # the host is busy: hold for a short while.
+                    held.append((time.monotonic() + affinity_wait, item))
+                    affinity_stat('held')
+                    continue
+
+            aw = manager.affine_worker(item.fqdn)
+            w = manager.find_available_worker(item.fqdn)
+            assert w is not None
+            if aw is None:
+                affinity_stat('none')  # no recent fetch from host
+            elif aw is w:
+                affinity_stat('hit')
+            else:
+                affinity_stat('miss')  # waited too long
+            manager.set_affinity(item.fqdn, w)
 
             feed_id = item.id
+            if controller.enabled():
+                if item.next_fetch_attempt:
+                    late = dt.datetime.utcnow() - item.next_fetch_attempt
+                    controller.delay(late.total_seconds())
+                item = item._replace(load_factor=controller.factor)
+
+            c0 = time.monotonic()
             with Session() as session:
                 # "queued" now means "currently being fetched"
+                # (creates FeedState row on first fetch)
                 res = session.execute(
-                    update(Feed)
-                    .where(Feed.id == feed_id)
-                    .values(queued=True))
+                    insert(FeedState)
+                    .values(feed_id=feed_id, queued=True)
+                    .on_conflict_do_update(
+                        index_elements=[FeedState.feed_id],
+                        set_={'queued': True}))
                 # print("UPDATED", res.rowcount)
                 session.commit()
+            controller.commit(time.monotonic() - c0)
 
             logger.info(
                 f"{w.n}: feed {item.id} srcid {item.sources_id} fqdn {item.fqdn}")
@@ -160,14 +312,32 @@ def main() -> None:
             # can be negative if woke up early and worked thru old wakeup time?
             # XXX add counter?
             stime = 0.5         # quick snooze just in case
+        if held:
+            # wake in time to hand off the oldest held Item
+            stime = min(stime, max(held[0][0] - time.monotonic(), 0.0))
+        if complete_deadline is not None:
+            # wake in time to write completions
+            stime = min(stime, max(complete_deadline - time.monotonic(), 0.0))
 
         # waits stime seconds, or until worker results are available,
         # will call back to fetch_done for each completed call.
-        manager.poll(stime)
+        poll(managers, stime)
+        start_writes()
+        check_load()
+
+        # write-behind: at most one transaction per complete_secs
+        if to_complete and complete_deadline is None:
+            complete_deadline = time.monotonic() + complete_secs
+        if complete_deadline is not None and time.monotonic() >= complete_deadline:
+            write_completed()
+            complete_deadline = None
 
     # here when feeds given command line: wait for completion
-    while manager.active_workers > 0:
-        manager.poll()
+    while (manager.active_workers > 0 or to_write or to_complete or
+           (writers and writers.active_workers > 0)):
+        poll(managers, complete_secs or None)
+        start_writes()
+        write_completed()
 
 
 if __name__ == '__main__':
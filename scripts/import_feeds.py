@@ -8,6 +8,7 @@ from sqlalchemy import text
 import fetcher.database.models as models
 from fetcher.config import conf
 from fetcher.database import Session, engine
+from fetcher.leveler import Leveler
 from fetcher.logargparse import LogArgumentParser
 
 DEFAULT_INTERVAL_MINS = conf.DEFAULT_INTERVAL_MINS
@@ -31,9 +32,11 @@ if __name__ == '__main__':
     with engine.begin() as conn:  # will automatically close
         logger.info(f"Clearing feeds")
         conn.execute(text("DELETE FROM feeds;"))
+        conn.execute(text("DELETE FROM feed_state;"))
         if args.delete_fetch_events:
             logger.info(f"Clearing fetch_events")
             conn.execute(text("DELETE FROM fetch_events;"))
+            conn.execute(text("DELETE FROM fetch_event_days;"))
         if args.delete_stories:
             logger.info(f"Clearing stories")
             conn.execute(text("DELETE FROM stories;"))
@@ -48,26 +51,34 @@ if __name__ == '__main__':
         input_file = open(filename)
     input_csv = csv.DictReader(input_file)
 
+    # feed tables cleared above: histogram starts empty
+    leveler = Leveler() if conf.SCHEDULE_LEVEL_PERCENT else None
+
     added = 0
     with Session.begin() as session:
         for row in input_csv:
             now = dt.datetime.utcnow()
-            # Pick random time within default fetch interval:
+            # Pick time within default fetch interval:
             # spreads out load, keeping queue short, and (hopefully)
             # avoiding hammering any site such that they give HTTP 429
             # (Too Many Requests) responses.
-            next_fetch = now + \
-                dt.timedelta(seconds=random() * DEFAULT_INTERVAL_MINS * 60)
+            if leveler:
+                # least loaded five minute slot
+                next_fetch = leveler.admit(now, DEFAULT_INTERVAL_MINS)
+            else:
+                next_fetch = now + \
+                    dt.timedelta(seconds=random() * DEFAULT_INTERVAL_MINS * 60)
             f = models.Feed(
                 id=int(row['id']),
                 url=row['url'],
                 sources_id=int(row['sources_id']),
                 name=row['name'],
                 active=True,
-                created_at=now,
-                next_fetch_attempt=next_fetch
+                created_at=now
             )
             session.add(f)
+            session.add(models.FeedState(feed_id=f.id,
+                                         next_fetch_attempt=next_fetch))
             added += 1
         session.commit()
     logger.info(f"imported {added} rows")
@@ -8,11 +8,11 @@ import logging
 import time
 from collections import Counter
 
-from sqlalchemy import Function, func, select
+from sqlalchemy import Function, case, func, select, text
 
 from fetcher.config import conf
 from fetcher.database import Session
-from fetcher.database.models import Feed, Story, StoryRef
+from fetcher.database.models import Feed, FeedState, Story, StoryRef
 from fetcher.logargparse import LogArgumentParser
 from fetcher.stats import Stats
 
@@ -27,14 +27,14 @@ sys_status_names: set[str] = set()
 
 def status_to_name(status: str) -> str:
     """
-    take Feed.system_status string, return counter label
+    take FeedState.system_status string, return counter label
     """
     toks = status.lower().split()
     return '-'.join(toks[:2])
 
 
 def get_sys_status_names() -> None:
-    query = select(func.distinct(Feed.system_status))
+    query = select(func.distinct(FeedState.system_status))
     with Session() as session:
         results = session.execute(query)
         for row in results:
@@ -45,10 +45,12 @@ def get_sys_status_names() -> None:
 def report_feeds_active(stats: Stats, hours: int = 24) -> None:
     start = dt.datetime.utcnow() - dt.timedelta(hours=hours)
     query = (
-        select(Feed.system_status,
+        select(FeedState.system_status,
                func.count(Feed.id),
                func.count(Feed.sources_id.distinct()))
-        .where(Feed.last_fetch_success >= start)
+        .select_from(Feed)
+        .join(FeedState, FeedState.feed_id == Feed.id)
+        .where(FeedState.last_fetch_success >= start)
         .group_by("system_status")
     )
 
@@ -121,6 +123,35 @@ def report_top_domain_stories(stats: Stats, days: int = TOP_SOURCE_DAYS) -> None
             break               # at most one row
 
 
+def report_conditional(stats: Stats) -> None:
+    """
+    report active feeds by conditional fetch trust
+    (see fetcher/conditional.py)
+    """
+    level = conf.HTTP_CONDITIONAL_TRUST
+    if not level:
+        return
+    trust = case((FeedState.http_trust >= level, 'trusted'),
+                 (FeedState.http_trust < 0, 'demoted'),
+                 else_='untrusted')
+    query = (
+        select(trust, func.count(Feed.id))
+        .select_from(Feed)
+        .join(FeedState, FeedState.feed_id == Feed.id)
+        .where(Feed.active.is_(True),
+               Feed.system_enabled.is_(True))
+        .group_by(trust)
+    )
+    counts: Counter[str] = Counter()
+    with Session() as session:
+        for state, count in session.execute(query):
+            counts[state] = count
+    for state in ('trusted', 'untrusted', 'demoted'):
+        logger.debug('feeds.conditional %s %d', state, counts[state])
+        stats.gauge('feeds.conditional', counts[state],
+                    labels=[('trust', state)])
+
+
 def report_stories(stats: Stats) -> None:
     """
     report maximum Story.id to be able to show
@@ -137,6 +168,25 @@ def report_stories(stats: Stats) -> None:
         g('stories.count', func.count(Story.id))
         g('story-refs.count', func.count(StoryRef.story_id))
 
+        # to watch size of dedup key indices (summed over partitions)
+        for index, size in session.execute(text(
+                "SELECT c.relname, SUM(pg_relation_size(t.relid))"
+                " FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid,"
+                "  LATERAL pg_partition_tree(i.indexrelid) t"
+                " WHERE i.indrelid = 'stories'::regclass"
+                " GROUP BY c.relname"
+                " UNION ALL"
+                # per-partition unique indices:
+                " SELECT CASE WHEN i.indisprimary THEN 'stories_pkey'"
+                "  ELSE 'unique_story_url_md5' END,"
+                "  SUM(pg_relation_size(i.indexrelid))"
+                " FROM pg_inherits p JOIN pg_index i ON i.indrelid = p.inhrelid"
+                " WHERE p.inhparent = 'stories'::regclass AND i.indisunique"
+                " GROUP BY 1")):
+            logger.debug("stories.index-bytes %s: %d", index, size)
+            stats.gauge('stories.index-bytes', size,
+                        labels=[('index', index)])
+
 
 if __name__ == '__main__':
     # prep file
@@ -150,4 +200,5 @@ if __name__ == '__main__':
         report_feeds_active(stats, 24)       # feeds active in last 24 hours
         report_top_domain_stories(stats)     # top domain story count
         report_stories(stats)
+        report_conditional(stats)
         time.sleep(args.interval - time.time() % args.interval)
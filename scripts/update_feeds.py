@@ -18,7 +18,9 @@ from sqlalchemy.sql.expression import delete, select
 import fetcher.database.property as prop
 from fetcher.config import conf
 from fetcher.database import Session, result_rowcount
-from fetcher.database.models import Feed, FetchEvent
+from fetcher.database.models import (Feed, FeedGeneration, FeedState,
+                                     FetchEvent, FetchEventDay, SeenEntries)
+from fetcher.leveler import Leveler
 from fetcher.stats import Stats
 
 
@@ -59,6 +61,12 @@ def run(*,
     batches: StatsCount = Counter()
     stats = Stats.get()         # get singleton
 
+    # spread first fetches of new feeds (else fetched when next ready)
+    leveler = None
+    if conf.SCHEDULE_LEVEL_PERCENT and not dry_run:
+        leveler = Leveler()
+        leveler.refresh()
+
     def batch_stat(stat: str) -> None:
         """
         call once per batch
@@ -209,6 +217,11 @@ def run(*,
                     if create:
                         inc('create')
                         session.add(f)
+                        if leveler:
+                            first = leveler.admit(dt.datetime.utcnow(),
+                                                  conf.DEFAULT_INTERVAL_MINS)
+                            session.add(FeedState(feed_id=iid,
+                                                  next_fetch_attempt=first))
                     else:
                         inc('update')
                     need_commit = True
@@ -256,11 +269,25 @@ def run(*,
                             Feed.id.in_(not_seen)))
                     inc('deleted', result_rowcount(res))
 
+                    session.execute(
+                        delete(FeedState).where(
+                            FeedState.feed_id.in_(not_seen)))
+
                     res = session.execute(
                         delete(FetchEvent).where(
                             FetchEvent.feed_id.in_(not_seen)))
                     logger.info("deleted %d fetch events",
                                 result_rowcount(res))
+                    session.execute(
+                        delete(FetchEventDay).where(
+                            FetchEventDay.feed_id.in_(not_seen)))
+
+                    session.execute(
+                        delete(SeenEntries).where(
+                            SeenEntries.feed_id.in_(not_seen)))
+                    session.execute(
+                        delete(FeedGeneration).where(
+                            FeedGeneration.feed_id.in_(not_seen)))
 
                     # leaving Stories in place, in case an active feed fetches
                     # dups
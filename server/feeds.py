@@ -2,12 +2,13 @@ import logging
 from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, update
+from sqlalchemy import literal, null, select, update
+from sqlalchemy.dialects.postgresql import insert
 
 import server.auth as auth
 from fetcher.database import result_rowcount
 from fetcher.database.asyncio import AsyncSession
-from fetcher.database.models import Feed, FetchEvent, Story
+from fetcher.database.models import Feed, FeedState, FetchEvent, Story
 from server.common import STORY_COLUMNS, STORY_LIMIT, STORY_ORDER
 from server.util import api_method
 
@@ -37,14 +38,23 @@ async def fetch_feed_soon(feed_id: int) -> int:
     # and call it here?  Need to lock row and make sure not queued first??
     # NOTE! isnot(True) may not work in DB's w/o bool type (eg MySQL)??
     async with AsyncSession() as session:
-        upd = update(Feed)\
-            .where(Feed.id == feed_id,
-                   Feed.queued.is_not(True))\
-            .values(next_fetch_attempt=None,  # ASAP
-                    last_fetch_failures=0,
-                    system_enabled=True)
-        result = await session.execute(upd)
+        # (creates FeedState row if feed never fetched)
+        ins = insert(FeedState)\
+            .from_select(['feed_id', 'next_fetch_attempt',
+                          'last_fetch_failures'],
+                         select(Feed.id, null(), literal(0))
+                         .where(Feed.id == feed_id))
+        ins = ins.on_conflict_do_update(
+            index_elements=[FeedState.feed_id],
+            set_={'next_fetch_attempt': None,  # ASAP
+                  'last_fetch_failures': 0},
+            where=FeedState.queued.is_not(True))
+        result = await session.execute(ins)
         count = result_rowcount(result)
+        if count:
+            await session.execute(update(Feed)
+                                  .where(Feed.id == feed_id)
+                                  .values(system_enabled=True))
         await session.commit()
     return int(count)
 
@@ -59,9 +69,11 @@ async def get_feed_history(
     async with AsyncSession() as session:
         query = select(FetchEvent).where(FetchEvent.feed_id == feed_id)
 
+        # (at most FETCH_EVENT_ROWS): most recent first
+        query = query.order_by(FetchEvent.seq.desc())
         if _limit:
             # if limit supplied return N most recent
-            query = query.order_by(FetchEvent.id.desc()).limit(_limit)
+            query = query.limit(_limit)
 
         results = await session.scalars(query)
         return [event.as_dict_public() for event in results]
@@ -71,11 +83,14 @@ async def get_feed_history(
 @api_method
 async def get_feed(feed_id: int) -> Optional[Dict]:
     async with AsyncSession() as session:
-        q = select(Feed).where(Feed.id == feed_id)
-        res = await session.scalars(q)
-        feed = res.one_or_none()
-        if feed:
-            return feed.as_dict_public()
+        q = select(Feed, FeedState)\
+            .outerjoin(FeedState, FeedState.feed_id == Feed.id)\
+            .where(Feed.id == feed_id)
+        res = await session.execute(q)
+        row = res.one_or_none()
+        if row:
+            feed: Feed = row.Feed
+            return feed.as_dict_with_state(row.FeedState)
         else:
             return None
 
@@ -3,13 +3,14 @@ from typing import Any, Dict, List
 
 import sqlalchemy.sql.functions as f
 from fastapi import APIRouter, Depends
-from sqlalchemy import Date, cast, select, text, update
+from sqlalchemy import Date, cast, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 
 import server.auth as auth
 from fetcher.database import result_rowcount
 from fetcher.database.asyncio import AsyncSession
-from fetcher.database.models import Feed, Story
+from fetcher.database.models import Feed, FeedState, Story
 from server.common import STORY_COLUMNS, STORY_LIMIT, STORY_ORDER
 from server.util import api_method
 
@@ -25,10 +26,11 @@ router = APIRouter(
 @api_method
 async def sources_feeds(sources_id: int) -> List[Dict]:
     async with AsyncSession() as session:
-        feeds = await session.scalars(
-            select(Feed)
+        rows = await session.execute(
+            select(Feed, FeedState)
+            .outerjoin(FeedState, FeedState.feed_id == Feed.id)
             .where(Feed.sources_id == sources_id))
-        return [feed.as_dict_public() for feed in feeds]
+        return [row.Feed.as_dict_with_state(row.FeedState) for row in rows]
 
 
 @router.post("/{sources_id}/fetch-soon",
@@ -65,11 +67,16 @@ async def fetch_source_feeds_soon(sources_id: int) -> int:
     # NOTE! isnot(True) may not work in DB's w/o bool type (eg MySQL)??
     async with AsyncSession() as session:
         # returns closed CursorResult:
+        # (creates FeedState rows for feeds never fetched)
+        ins = insert(FeedState)\
+            .from_select(['feed_id', 'next_fetch_attempt'],
+                         select(Feed.id, soon)
+                         .where(Feed.sources_id == sources_id))
         result = await session.execute(
-            update(Feed)
-            .where(Feed.sources_id == sources_id,
-                   Feed.queued.isnot(True))
-            .values(next_fetch_attempt=soon)
+            ins.on_conflict_do_update(
+                index_elements=[FeedState.feed_id],
+                set_={'next_fetch_attempt': ins.excluded.next_fetch_attempt},
+                where=FeedState.queued.isnot(True))
         )
         count = result_rowcount(result)
         await session.commit()